@@ -0,0 +1,105 @@
+"""Benchmark reading values of XML properties files.
+
+Measures the cost of converting text values with ``DatetimeHelper`` compared
+to the previous ``strptime`` based conversion and the parse throughput of
+``XMLProperties`` files with thousands of entries. Run with::
+
+    python benchmarks/datetime_helper.py
+"""
+from cone.app.model import XMLProperties
+from cone.app.model import xml_properties_cache
+from cone.app.utils import DatetimeHelper
+from datetime import datetime
+from datetime import timedelta
+import os
+import shutil
+import tempfile
+import timeit
+
+
+NUMBER = 100000
+ENTRIES = 5000
+FILE_NUMBER = 20
+
+
+def strptime_r_value(val):
+    # conversion used before ``parse_iso_datetime``
+    try:
+        return datetime.strptime(val, '%Y-%m-%dT%H:%M:%S')
+    except (ValueError, TypeError):
+        return val
+
+
+def measure(name, func, number=NUMBER):
+    duration = timeit.timeit(func, number=number)
+    print('{:<42} {:.1f} ns'.format(name, duration / number * 1e9))
+
+
+def values():
+    start = datetime(2020, 1, 1, 10, 15)
+    result = list()
+    for i in range(ENTRIES):
+        if i % 2:
+            result.append((start + timedelta(minutes=i)).isoformat())
+        else:
+            result.append(u'Value {}'.format(i))
+    return result
+
+
+def run():
+    helper = DatetimeHelper()
+    measure(
+        'strptime datetime',
+        lambda: strptime_r_value('2020-01-01T10:15:00')
+    )
+    measure('strptime text', lambda: strptime_r_value(u'Some text'))
+    measure(
+        'r_value datetime',
+        lambda: helper.r_value('2020-01-01T10:15:00')
+    )
+    measure(
+        'r_value datetime with microseconds and tz',
+        lambda: helper.r_value('2020-01-01T10:15:00.123456+02:00')
+    )
+    measure('r_value text', lambda: helper.r_value(u'Some text'))
+
+    vals = values()
+    number = NUMBER // ENTRIES
+    duration = timeit.timeit(lambda: helper.r_values(vals), number=number)
+    print('{:<42} {:.1f} ns'.format(
+        'r_values per value',
+        duration / (number * ENTRIES) * 1e9
+    ))
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tempdir, 'props.xml')
+        props = XMLProperties(path)
+        for i, value in enumerate(vals):
+            setattr(props, 'entry_{}'.format(i), value)
+        props()
+
+        def parse():
+            xml_properties_cache.invalidate()
+            XMLProperties(path)
+
+        duration = timeit.timeit(parse, number=FILE_NUMBER)
+        print('{:<42} {:.0f} entries/s'.format(
+            'XMLProperties parse',
+            ENTRIES * FILE_NUMBER / duration
+        ))
+        duration = timeit.timeit(
+            lambda: XMLProperties(path),
+            number=FILE_NUMBER
+        )
+        print('{:<42} {:.0f} entries/s'.format(
+            'XMLProperties cached',
+            ENTRIES * FILE_NUMBER / duration
+        ))
+    finally:
+        xml_properties_cache.invalidate()
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    run()
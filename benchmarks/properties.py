@@ -0,0 +1,57 @@
+"""Benchmark attribute access on ``cone.app.model.Properties`` objects.
+
+Measures the cost of reading declared fields, undeclared keys and mapping
+access on ``Properties``, ``Metadata`` and ``ProtectedProperties`` and prints
+the time per access. Run with::
+
+    python benchmarks/properties.py
+"""
+from cone.app import testing
+from cone.app.model import BaseNode
+from cone.app.model import Metadata
+from cone.app.model import Properties
+from cone.app.model import ProtectedProperties
+import timeit
+
+
+NUMBER = 1000000
+
+
+def measure(name, func):
+    duration = timeit.timeit(func, number=NUMBER)
+    print('{:<42} {:.1f} ns'.format(name, duration / NUMBER * 1e9))
+
+
+def run():
+    props = Properties()
+    props.in_navtree = True
+    props.custom = True
+    measure('Properties declared field', lambda: props.in_navtree)
+    measure('Properties undeclared key', lambda: props.custom)
+    measure('Properties missing key', lambda: props.inexistent)
+    measure('Properties.get', lambda: props.get('custom'))
+    measure('Properties.__getitem__', lambda: props['custom'])
+    measure('Properties.__contains__', lambda: 'custom' in props)
+
+    metadata = Metadata()
+    metadata.title = 'Title'
+    measure('Metadata declared field', lambda: metadata.title)
+
+    layer = testing.security
+    layer.setUp()
+    try:
+        layer.new_request()
+        protected = ProtectedProperties(BaseNode(), {'secret': ['view']})
+        protected.icon = 'icon'
+        protected.secret = 'secret'
+        with layer.authenticated('manager'):
+            measure('ProtectedProperties unprotected field',
+                    lambda: protected.icon)
+            measure('ProtectedProperties protected key',
+                    lambda: protected.secret)
+    finally:
+        layer.tearDown()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,99 @@
+"""Benchmark rendering of ``cone.app.browser.table.Table`` tiles.
+
+Renders a table tile on listings with 1k, 10k and 100k items and prints the
+average render time. Run with::
+
+    python benchmarks/table.py
+"""
+from cone.app import testing
+from cone.app.browser.table import RowData
+from cone.app.browser.table import Table
+from cone.app.model import BaseNode
+from cone.tile import render_tile
+from cone.tile import tile
+import timeit
+
+
+SIZES = [1000, 10000, 100000]
+REPEAT = 20
+
+
+class Item(object):
+
+    def __init__(self, index):
+        self.name = 'item-{}'.format(index)
+        self.title = 'Item {}'.format(index)
+
+
+def register_table():
+    @tile(name='benchmark_table', path='cone.app.browser:templates/table.pt')
+    class BenchmarkTable(Table):
+        table_id = 'benchmark_table'
+        table_tile_name = 'benchmark_table'
+        default_sort = 'title'
+        default_order = 'desc'
+        show_filter = True
+        col_defs = [{
+            'id': 'name',
+            'title': 'Name',
+            'sort_key': 'name',
+            'sort_title': 'Sort by name',
+            'content': 'string'
+        }, {
+            'id': 'title',
+            'title': 'Title',
+            'sort_key': 'title',
+            'sort_title': 'Sort by title',
+            'content': 'string'
+        }]
+
+        @property
+        def filtered_items(self):
+            term = self.filter_term
+            if not term:
+                return list(self.model.items)
+            return [item for item in self.model.items if term in item.title]
+
+        @property
+        def item_count(self):
+            return len(self.filtered_items)
+
+        def sorted_rows(self, start, end, sort, order):
+            rows = list()
+            for item in self.filtered_items[start:end]:
+                row = RowData()
+                row['name'] = item.name
+                row['title'] = item.title
+                rows.append(row)
+            return rows
+
+
+def run():
+    layer = testing.security
+    layer.setUp()
+    try:
+        with layer.hook_tile_reg():
+            register_table()
+        for size in SIZES:
+            model = BaseNode(name='container')
+            model.items = [Item(i) for i in range(size)]
+            request = layer.new_request()
+            request.params['b_page'] = str(size // 30)
+            request.params['term'] = 'Item'
+            with layer.authenticated('manager'):
+                # warm up template cache
+                render_tile(model, request, 'benchmark_table')
+                duration = timeit.timeit(
+                    lambda: render_tile(model, request, 'benchmark_table'),
+                    number=REPEAT
+                )
+            print('{:>7} items: {:.2f} ms'.format(
+                size,
+                duration / REPEAT * 1000
+            ))
+    finally:
+        layer.tearDown()
+
+
+if __name__ == '__main__':
+    run()
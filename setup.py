@@ -87,7 +87,10 @@ setup(
     entry_points="""\
     [paste.app_factory]
     main = cone.app:main
+    preload = cone.app:preload
     [paste.filter_app_factory]
     remote_addr = cone.app:make_remote_addr_middleware
+    [console_scripts]
+    cone_migrate_sqlugm = cone.app.sqlugm:migrate_main
     """
 )
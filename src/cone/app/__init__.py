@@ -1,27 +1,41 @@
 # -*- coding: utf-8 -*-
 from cone.app import browser
+from cone.app import model
+from cone.app import search
 from cone.app import security
+from cone.app import ugm
+from cone.app.browser import layout as browser_layout
+from cone.app.browser.ajax import FulltextLiveSearch
+from cone.app.browser.resources import CompressedStaticView
+from cone.app.browser.resources import merged_bundles
+from cone.app.browser.warmup import configure_template_cache
+from cone.app.browser.warmup import warmup_templates
 from cone.app.interfaces import ILayout
+from cone.app.interfaces import ILiveSearch
 from cone.app.model import AppRoot
 from cone.app.model import AppSettings
 from cone.app.model import Layout
 from cone.app.model import Properties
 from cone.app.ugm import ugm_backend
 from cone.app.utils import format_traceback
+from cone.app.utils import StartupProfiler
 from pyramid.authentication import AuthTktAuthenticationPolicy
 from pyramid.authorization import ACLAuthorizationPolicy
 from pyramid.config import Configurator
-from pyramid.static import static_view
+from pyramid.events import NewRequest
+from pyramid.settings import asbool
 from yafowil.resources import YafowilResources as YafowilResourcesBase
 from zope.component import adapter
 from zope.component import getGlobalSiteManager
 from zope.interface import implementer
 from zope.interface import Interface
+import gc
 import importlib
 import logging
 import pyramid_chameleon
 import pyramid_zcml
 import sys
+import threading
 
 
 logger = logging.getLogger('cone.app')
@@ -36,7 +50,11 @@ cfg.main_template = 'cone.app.browser:templates/main.pt'
 cfg.default_node_icon = 'glyphicon glyphicon-asterisk'
 
 # XXX: move resource registration to browser package
-# XXX: support developmenet and production mode
+
+# assets mode. either 'development' or 'production'. in production mode
+# minified assets are used if present and application relative JS and CSS
+# resources get delivered merged.
+cfg.assets_mode = 'development'
 
 # JS resources
 cfg.js = Properties()
@@ -52,8 +70,6 @@ cfg.js.protected = [
 
 # CSS Resources
 cfg.css = Properties()
-
-# development
 cfg.css.public = [
     'static/jqueryui/jquery-ui-1.10.3.custom.css',
     'static/bootstrap/css/bootstrap.css',
@@ -64,24 +80,11 @@ cfg.css.public = [
     'static/styles.css'
 ]
 
-# production
-# cfg.css.public = [
-#     'static/jqueryui/jquery-ui-1.10.3.custom.css',
-#     'static/bootstrap/css/bootstrap.min.css',
-#     'static/bootstrap/css/bootstrap-theme.min.css',
-#     'static/ionicons/css/ionicons.css',
-#     'static/typeahead/typeahead.css',
-#     '++resource++bdajax/bdajax_bs3.css',
-#     'static/styles.css'
-# ]
-
 cfg.css.protected = list()
 
 # JS and CSS Assets to publish merged
 cfg.merged = Properties()
 cfg.merged.js = Properties()
-
-# development
 cfg.merged.js.public = [
     (browser.static_resources, 'jquery-1.9.1.js'),
     (browser.static_resources, 'jquery.migrate-1.2.1.js'),
@@ -91,16 +94,6 @@ cfg.merged.js.public = [
     (browser.static_resources, 'cookie_functions.js')
 ]
 
-# production
-# cfg.merged.js.public = [
-#     (browser.static_resources, 'jquery-1.9.1.min.js'),
-#     (browser.static_resources, 'jquery.migrate-1.2.1.min.js'),
-#     (browser.static_resources, 'jqueryui/jquery-ui-1.10.3.custom.min.js'),
-#     (browser.static_resources, 'bootstrap/js/bootstrap.min.js'),
-#     (browser.static_resources, 'typeahead/typeahead.bundle.js'),
-#     (browser.static_resources, 'cookie_functions.js')
-# ]
-
 cfg.merged.js.protected = list()
 
 cfg.merged.css = Properties()
@@ -187,6 +180,19 @@ def register_main_hook(callback):
     main_hooks.append(callback)
 
 
+post_fork_hooks = list()
+
+
+def post_fork_hook(func):
+    """decorator to register post fork hook.
+
+    Decorated function gets called in worker processes after forking from
+    preloaded master process.
+    """
+    post_fork_hooks.append(func)
+    return func
+
+
 def get_root(environ=None):
     return root
 
@@ -220,7 +226,7 @@ class YafowilResources(YafowilResourcesBase):
 
     def configure_resource_directory(self, plugin_name, resourc_edir):
         app = sys.modules[__name__]
-        resources_view = static_view(resourc_edir, use_subpath=True)
+        resources_view = CompressedStaticView(resourc_edir, use_subpath=True)
         view_name = '%s_resources' % plugin_name.replace('.', '_')
         setattr(app, view_name, resources_view)
         view_path = 'cone.app.%s' % view_name
@@ -244,13 +250,100 @@ def configure_yafowil_addon_resources(config):
         cfg.css.public.insert(0, css)
 
 
+# profiler of recent application startup
+startup_profiler = None
+
+# startup tasks deferred to first request
+deferred_tasks = list()
+_deferred_lock = threading.RLock()
+_deferred_running = False
+
+
+def add_startup_task(name, task, deferred=False):
+    """Run startup task immediately or defer it to first request.
+    """
+    if deferred:
+        deferred_tasks.append((name, task))
+        return
+    with startup_profiler.phase(name):
+        task()
+
+
+def run_deferred_startup():
+    """Run startup tasks deferred by ``cone.deferred_startup`` setting.
+
+    Calls made while tasks are running return immediately. This happens if a
+    task issues subrequests, which trigger ``deferred_startup_subscriber``
+    again in the same thread.
+    """
+    global _deferred_running
+    with _deferred_lock:
+        if _deferred_running:
+            return
+        _deferred_running = True
+        try:
+            while deferred_tasks:
+                name, task = deferred_tasks.pop(0)
+                try:
+                    with startup_profiler.phase(name, deferred=True):
+                        task()
+                except Exception:
+                    msg = 'Deferred startup task {} failed:\n{}'.format(
+                        name,
+                        format_traceback()
+                    )
+                    logger.error(msg)
+        finally:
+            _deferred_running = False
+
+
+def deferred_startup_subscriber(event):
+    if deferred_tasks:
+        run_deferred_startup()
+
+
 def main(global_config, **settings):
     """Returns WSGI application.
     """
+    # set assets mode
+    cfg.assets_mode = settings.get('cone.assets_mode', 'development')
+
+    # persist compiled templates
+    template_cache_dir = settings.get('cone.template_cache_dir')
+    if template_cache_dir:
+        configure_template_cache(template_cache_dir)
+
     # set authentication related application properties
     security.ADMIN_USER = settings.get('cone.admin_user')
     security.ADMIN_PASSWORD = settings.get('cone.admin_password')
 
+    # set ACL cache scope
+    acl_cache = settings.get('cone.acl_cache')
+    security.ACL_CACHE = acl_cache if acl_cache in ['request', 'process'] \
+        else None
+    security.ACL_CACHE_TTL = int(settings.get('cone.acl_cache_ttl', 60))
+    security.invalidate_acl_cache()
+
+    # set timeout of process wide roles cache
+    security.ROLES_CACHE_TTL = int(settings.get('cone.roles_cache_ttl', 0))
+
+    # set timeout of principal cache
+    ugm.PRINCIPAL_CACHE_TTL = int(settings.get('cone.principal_cache_ttl', 0))
+
+    # set timeout of navigation cache
+    browser_layout.NAVIGATION_CACHE_TTL = int(
+        settings.get('cone.navigation_cache_ttl', 0)
+    )
+    if browser_layout.NAVIGATION_CACHE_TTL > 0:
+        browser_layout.enable_navigation_cache()
+    else:
+        browser_layout.invalidate_navigation_cache()
+
+    # set write delay of file based properties
+    model.PROPERTIES_WRITE_DELAY = float(
+        settings.get('cone.properties_write_delay', 0)
+    )
+
     auth_secret = settings.pop('cone.auth_secret', 'secret')
     auth_cookie_name = settings.pop('cone.auth_cookie_name', 'auth_tkt')
     auth_secure = settings.pop('cone.auth_secure', False)
@@ -281,6 +374,11 @@ def main(global_config, **settings):
 
     configure_root(settings)
 
+    # record startup phases
+    global startup_profiler
+    profiler = startup_profiler = StartupProfiler()
+    del deferred_tasks[:]
+
     if settings.get('testing.hook_global_registry'):
         globalreg = getGlobalSiteManager()
         config = Configurator(registry=globalreg)
@@ -303,6 +401,17 @@ def main(global_config, **settings):
     # register default layout adapter
     config.registry.registerAdapter(default_layout)
 
+    # enable fulltext index and register livesearch adapter using it
+    if asbool(settings.get('cone.fulltext_index', False)):
+        search.enable_fulltext_index(root)
+        config.registry.registerAdapter(
+            FulltextLiveSearch,
+            (Interface,),
+            ILiveSearch
+        )
+    else:
+        search.disable_fulltext_index()
+
     # add translation
     config.add_translation_dirs('cone.app:locale/')
 
@@ -319,10 +428,12 @@ def main(global_config, **settings):
     config.add_view(browser.static_resources, name='static')
 
     # scan browser package
-    config.scan(browser)
+    with profiler.phase('browser_scan'):
+        config.scan(browser)
 
     # load zcml
-    config.load_zcml('configure.zcml')
+    with profiler.phase('zcml', target='cone.app'):
+        config.load_zcml('configure.zcml')
 
     # read plugin configurator
     plugins = settings.get('cone.plugins', '')
@@ -330,7 +441,8 @@ def main(global_config, **settings):
     plugins = [pl for pl in plugins if pl and not pl.startswith('#')]
     for plugin in plugins:
         try:
-            importlib.import_module(plugin)
+            with profiler.phase('plugin_import', target=plugin):
+                importlib.import_module(plugin)
         except ImportError:
             msg = 'Cannot import plugin {}\n{}'.format(
                 plugin,
@@ -339,7 +451,8 @@ def main(global_config, **settings):
             logger.error(msg)
             continue
         try:
-            config.load_zcml('{}:configure.zcml'.format(plugin))
+            with profiler.phase('zcml', target=plugin):
+                config.load_zcml('{}:configure.zcml'.format(plugin))
         except IOError:  # pragma: no cover
             msg = 'No configure.zcml in {}'.format(plugin)
             logger.info(msg)
@@ -352,7 +465,9 @@ def main(global_config, **settings):
                 filtered_hooks.append(hook)
                 continue
     for hook in filtered_hooks:
-        hook(config, global_config, settings)
+        target = '{}.{}'.format(hook.__module__, hook.__name__)
+        with profiler.phase('main_hook', target=target):
+            hook(config, global_config, settings)
 
     # load and initialize UGM
     backend_name = settings.get('ugm.backend')
@@ -361,21 +476,102 @@ def main(global_config, **settings):
         backend_name = settings.get('cone.auth_impl')
     if backend_name:
         try:
-            ugm_backend.load(backend_name, settings)
-            ugm_backend.initialize()
+            with profiler.phase('ugm', target=backend_name):
+                ugm_backend.load(backend_name, settings)
+                ugm_backend.initialize()
+                security.invalidate_roles_cache()
+                ugm.invalidate_principal_cache()
         except Exception:  # pragma: no cover
             msg = 'Failed to create UGM backend:\n{}'.format(format_traceback())
             logger.error(msg)
 
     # register yafowil static resources
     # done after addon config - addon code may disable yafowil resource groups
-    configure_yafowil_addon_resources(config)
+    with profiler.phase('yafowil_resources'):
+        configure_yafowil_addon_resources(config)
+
+    # run deferred startup tasks on first request
+    deferred = asbool(settings.get('cone.deferred_startup', False))
+    if deferred:
+        config.add_subscriber(deferred_startup_subscriber, NewRequest)
 
     # end configuration
-    config.end()
+    with profiler.phase('config_end'):
+        config.end()
+
+    # create wsgi app
+    with profiler.phase('wsgi_app'):
+        app = config.make_wsgi_app()
+
+    # build merged asset bundles
+    # done after main hooks - plugins may register merged assets. the wsgi
+    # app is used to read application relative resources in production mode
+    merged_bundles.manifest_path = settings.get('cone.assets_manifest')
+
+    def build_merged_bundles():
+        merged_bundles.build(app)
+        if merged_bundles.manifest_path:
+            merged_bundles.write_manifest(merged_bundles.manifest_path)
+    add_startup_task('merged_bundles', build_merged_bundles, deferred)
+
+    # precompile templates of cone.app, plugins and registered tiles
+    if asbool(settings.get('cone.template_warmup', False)):
+        packages = ['cone.app'] + [pl for pl in plugins if pl in sys.modules]
+        registry = config.registry
+        add_startup_task(
+            'template_warmup',
+            lambda: warmup_templates(registry, packages),
+            deferred
+        )
+
+    # report startup profile
+    if asbool(settings.get('cone.startup_profile', False)):
+        profiler.log()
+    profile_dump = settings.get('cone.startup_profile_dump')
+    if profile_dump:
+        profiler.dump(profile_dump)
 
     # return wsgi app
-    return config.make_wsgi_app()
+    return app
+
+
+def preload(global_config, **settings):
+    """Returns WSGI application with all immutable setup done.
+
+    Intended to be called in the master process of a prefork server before
+    forking workers. Deferred startup tasks are executed and templates are
+    compiled, thus workers share the prepared state copy-on-write. Workers
+    must call ``post_fork`` after forking.
+    """
+    settings.setdefault('cone.template_warmup', 'true')
+    app = main(global_config, **settings)
+    run_deferred_startup()
+    gc.collect()
+    # keep garbage collector from touching shared pages in workers
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    return app
+
+
+def post_fork():
+    """Reinitialize per worker resources after forking from preloaded master
+    process.
+
+    Creates a new UGM instance, clears process wide caches and calls
+    registered post fork hooks.
+    """
+    if ugm_backend.factory:
+        try:
+            ugm_backend.initialize()
+        except Exception:  # pragma: no cover
+            msg = 'Failed to create UGM backend:\n{}'.format(
+                format_traceback()
+            )
+            logger.error(msg)
+    security.invalidate_roles_cache()
+    ugm.invalidate_principal_cache()
+    for hook in post_fork_hooks:
+        hook()
 
 
 def make_remote_addr_middleware(app, global_conf):
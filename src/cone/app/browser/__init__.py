@@ -1,17 +1,17 @@
 from cone.app.browser.actions import ActionContext
+from cone.app.browser.resources import CompressedStaticView
 from cone.tile import render_template_to_response
 from plumber import Behavior
 from plumber import default
 from plumber import plumb
 from pyramid.response import Response
-from pyramid.static import static_view
 from pyramid.view import view_config
 import cone.app
 import os
 import yafowil.loader
 
 
-static_resources = static_view('static', use_subpath=True)
+static_resources = CompressedStaticView('static', use_subpath=True)
 
 
 def render_main_template(model, request, contenttile='content'):
@@ -1,6 +1,10 @@
 from cone.app.browser.actions import ActionContext
 from cone.app.browser.utils import format_traceback
+from cone.app.browser.utils import make_url
 from cone.app.interfaces import ILiveSearch
+from cone.app.search import fulltext_index
+from cone.app.search import node_by_path
+from cone.app.security import PermissionChecker
 from cone.app.utils import safe_encode
 from cone.tile import Tile
 from cone.tile import render_tile
@@ -8,6 +12,7 @@ from cone.tile import tile
 from pyramid.exceptions import Forbidden
 from pyramid.response import Response
 from pyramid.view import view_config
+from zope.interface import implementer
 import json
 import logging
 
@@ -312,3 +317,32 @@ def livesearch(model, request):
     if not adapter:
         return list()
     return adapter.search(request, request.params['term'])
+
+
+@implementer(ILiveSearch)
+class FulltextLiveSearch(object):
+    """Livesearch adapter using the fulltext index.
+    """
+    limit = 10
+
+    def __init__(self, model):
+        self.model = model
+
+    def search(self, request, query):
+        index = fulltext_index
+        if index.root is None:
+            return list()
+        paths = index.search_words(query, sort_on='title')
+        permitted = PermissionChecker(request, 'view')
+        results = list()
+        for path in paths:
+            node = node_by_path(index.root, path)
+            if node is None or not permitted(node):
+                continue
+            results.append({
+                'value': node.metadata.title,
+                'target': make_url(request, node=node),
+            })
+            if len(results) >= self.limit:
+                break
+        return results
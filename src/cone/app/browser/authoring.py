@@ -15,6 +15,7 @@ from cone.app.model import AdapterNode
 from cone.app.model import BaseNode
 from cone.app.model import Properties
 from cone.app.model import get_node_info
+from cone.app.model import node_modified
 from cone.app.utils import app_config
 from cone.tile import Tile
 from cone.tile import render_template
@@ -438,6 +439,34 @@ class EditTile(_FormRenderingTile):
     form_tile_name = 'editform'
 
 
+def _triggered_action(widget, request):
+    for child in widget.values():
+        if child.attrs.get('action') \
+                and request.get('action.{}'.format(child.dottedpath)):
+            return child
+        action = _triggered_action(child, request)
+        if action is not None:
+            return action
+
+
+class NotifyModified(Behavior):
+    """Form behavior announcing modification of model on form continuation.
+
+    Modification is only announced if the triggered action has a handler and
+    is not skipped, i.e. the model has been saved successfully. Cancel actions
+    are ignored.
+    """
+
+    @plumb
+    def next(_next, self, request):
+        action = _triggered_action(self.form, request)
+        if action is not None \
+                and action.attrs.get('handler') \
+                and not action.attrs.get('skip'):
+            node_modified(self.model)
+        return _next(self, request)
+
+
 class EditFormHeading(FormHeading):
 
     @default
@@ -454,8 +483,11 @@ class EditFormHeading(FormHeading):
         return heading
 
 
+# ``NotifyModified`` must precede behaviors providing ``next``, otherwise its
+# plumbing instruction gets ignored.
 class ContentEditForm(EditFormHeading,
                       ContentForm,
+                      NotifyModified,
                       CameFromNext):
     """Form behavior rendering edit form to content area.
     """
@@ -481,7 +513,8 @@ class OverlayEditTile(_FormRenderingTile):
     form_tile_name = 'overlayeditform'
 
 
-class OverlayEditForm(OverlayForm,
+class OverlayEditForm(NotifyModified,
+                      OverlayForm,
                       EditFormHeading):
     """Edit form behavior rendering to overlay.
     """
@@ -13,6 +13,53 @@ from plumber import plumbing
 BATCH_RANGE = 8
 
 
+class BatchVocab(object):
+    """Lazy batch vocabulary.
+
+    Behaves like a list of page dicts, but pages get created on access. Thus
+    only the pages actually displayed are computed.
+    """
+
+    def __init__(self, count, factory, current=-1):
+        """Create batch vocabulary.
+
+        :param count: Number of pages.
+        :param factory: Callable accepting page index and returning page dict.
+        :param current: Index of current page or ``-1``.
+        """
+        self.count = count
+        self.factory = factory
+        self.current = current if 0 <= current < count else -1
+        self._pages = dict()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError('batch vocabulary index out of range')
+        page = self._pages.get(index)
+        if page is None:
+            page = self._pages[index] = self.factory(index)
+        return page
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+
 class Batch(Tile):
     """An abstract batch tile.
 
@@ -61,10 +108,28 @@ class Batch(Tile):
 
     @property
     def vocab(self):
-        """Batch vocabulary.
+        """Batch vocabulary. Either a list of page dicts or a
+        ``BatchVocab`` instance.
         """
         return []
 
+    def __call__(self, model, request):
+        # vocabulary gets evaluated once while rendering
+        self._vocab_memo = list()
+        try:
+            return super(Batch, self).__call__(model, request)
+        finally:
+            self._vocab_memo = None
+
+    @property
+    def _batch_vocab(self):
+        memo = getattr(self, '_vocab_memo', None)
+        if memo is None:
+            return self.vocab
+        if not memo:
+            memo.append(self.vocab)
+        return memo[0]
+
     @property
     def display(self):
         """Flag whether to display the batch.
@@ -81,7 +146,10 @@ class Batch(Tile):
     def currentpage(self):
         """Current page in batch.
         """
-        for page in self.vocab:
+        vocab = self._batch_vocab
+        if isinstance(vocab, BatchVocab):
+            return vocab[vocab.current] if vocab.current > -1 else None
+        for page in vocab:
             if page['current']:
                 return page
         return None
@@ -90,44 +158,47 @@ class Batch(Tile):
     def firstpage(self):
         """First page in batch.
         """
+        vocab = self._batch_vocab
         firstpage = None
-        for page in self.vocab:
+        for page in vocab:
             if page['visible']:
                 firstpage = page
                 break
-        if not firstpage and self.vocab:
-            firstpage = self.vocab[0]
+        if not firstpage and vocab:
+            firstpage = vocab[0]
         return firstpage
 
     @property
     def lastpage(self):
         """Last page in batch.
         """
+        vocab = self._batch_vocab
         lastpage = None
-        count = len(self.vocab)
+        count = len(vocab)
         while count > 0:
             count -= 1
-            page = self.vocab[count]
+            page = vocab[count]
             if page['visible']:
-                lastpage = self.vocab[count]
+                lastpage = vocab[count]
                 break
-        if not lastpage and self.vocab:
-            lastpage = self.vocab[len(self.vocab) - 1]
+        if not lastpage and vocab:
+            lastpage = vocab[len(vocab) - 1]
         return lastpage
 
     @property
     def prevpage(self):
         """Previous page in batch.
         """
+        vocab = self._batch_vocab
         prevpage = None
         position = self._position_of_current_in_vocab - 1
         while position >= 0:
-            page = self.vocab[position]
+            page = vocab[position]
             if page['visible']:
-                prevpage = self.vocab[position]
+                prevpage = vocab[position]
                 break
             position -= 1
-        if not prevpage and self.vocab:
+        if not prevpage and vocab:
             prevpage = self.dummypage
         return prevpage
 
@@ -135,16 +206,17 @@ class Batch(Tile):
     def nextpage(self):
         """Next page in batch.
         """
+        vocab = self._batch_vocab
         nextpage = self.dummypage
         position = self._position_of_current_in_vocab + 1
-        if position == 0 and self.vocab:
+        if position == 0 and vocab:
             return nextpage
-        if position == 0 and not self.vocab:
+        if position == 0 and not vocab:
             return None
-        while position < len(self.vocab):
-            page = self.vocab[position]
+        while position < len(vocab):
+            page = vocab[position]
             if page['visible']:
-                nextpage = self.vocab[position]
+                nextpage = vocab[position]
                 break
             position += 1
         return nextpage
@@ -165,12 +237,13 @@ class Batch(Tile):
     def pages(self):
         """Pages to display.
         """
+        vocab = self._batch_vocab
         pos = self._position_of_current_in_vocab
-        count = len(self.vocab)
+        count = len(vocab)
         start = max(pos - self._siderange - max(self._right_over_diff, 0), 0)
         end = min(pos + self._siderange + max(self._left_over_diff, 0) + 1,
                   count)
-        return self.vocab[start:end]
+        return vocab[start:end]
 
     @property
     def _siderange(self):
@@ -183,18 +256,22 @@ class Batch(Tile):
 
     @property
     def _right_over_diff(self):
+        vocab = self._batch_vocab
         position = self._position_of_current_in_vocab
-        count = len(self.vocab)
+        count = len(vocab)
         return position + self._siderange - count + 1
 
     @property
     def _position_of_current_in_vocab(self):
+        vocab = self._batch_vocab
+        if isinstance(vocab, BatchVocab):
+            return vocab.current
         # XXX: wildcard handling
         current = self.currentpage
         if current is None:
             return -1
         pointer = 0
-        for page in self.vocab:
+        for page in vocab:
             if page['page'] == current['page']:
                 return pointer
             pointer += 1
@@ -218,31 +295,31 @@ class BatchedItemsBatch(Batch):
     def display(self):
         """Flag whether to display the batch.
         """
-        return len(self.vocab) > 1
+        return len(self._batch_vocab) > 1
 
     @property
     def vocab(self):
         """Batch vocabulary.
         """
-        ret = list()
-        path = node_path(self.model)
+        path = node_path(self.model, self.request)
         count = self.parent.item_count
         slice_size = self.parent.slice_size
         pages = count // slice_size
         if count % slice_size != 0:
             pages += 1
         current = self.parent.current_page
-        for i in range(pages):
+
+        def create_page(i):
             href = self.parent.make_page_url(path, str(i), include_view=True)
             target = self.parent.make_page_url(path, str(i))
-            ret.append({
+            return {
                 'page': '%i' % (i + 1),
                 'current': current == i,
                 'visible': True,
                 'href': href,
                 'target': target
-            })
-        return ret
+            }
+        return BatchVocab(pages, create_page, current=current)
 
 
 @plumbing(RelatedViewConsumer)
@@ -11,8 +11,12 @@ from cone.app.browser.table import RowData
 from cone.app.browser.table import Table
 from cone.app.browser.utils import make_query
 from cone.app.browser.utils import make_url
+from cone.app.interfaces import IChildSortIndex
 from cone.app.interfaces import ICopySupport
 from cone.app.interfaces import IWorkflowState
+from cone.app.model import FAR_PAST
+from cone.app.search import fulltext_index
+from cone.app.security import PermissionChecker
 from cone.tile import Tile
 from cone.tile import tile
 from node.interfaces import ILeaf
@@ -20,15 +24,12 @@ from node.utils import instance_property
 from plumber import plumbing
 from pyramid.i18n import TranslationStringFactory
 from pyramid.view import view_config
-import datetime
+import heapq
 
 
 _ = TranslationStringFactory('cone.app')
 
 
-FAR_PAST = datetime.datetime(2000, 1, 1)
-
-
 class ContentsActionView(ActionView):
     title = ActionView.text
     text = None
@@ -125,9 +126,13 @@ class ContentsTile(Table):
         )
     }
     show_filter = True
+    use_child_sort_index = True
+    use_fulltext_index = True
 
     @property
     def item_count(self):
+        if self.lazy_listing:
+            return self.model.count(**self.lazy_listing_query())
         return len(self.filtered_children)
 
     @instance_property
@@ -152,10 +157,9 @@ class ContentsTile(Table):
         return row_data
 
     def sorted_rows(self, start, end, sort, order):
-        children = self.sorted_children(sort, order)
         rows = list()
         cut_urls = extract_copysupport_cookie(self.request, 'cut')
-        for child in children[start:end]:
+        for child in self.sliced_children(start, end, sort, order):
             row_data = self.row_data(child)
             target = make_url(self.request, node=child)
             if ICopySupport.providedBy(child):
@@ -183,9 +187,13 @@ class ContentsTile(Table):
         term = self.filter_term
         if term:
             term = term.lower()
+        permitted = PermissionChecker(self.request, 'view')
+        indexed = self.indexed_filtered_children(term)
+        if indexed is not None:
+            children = [node for node in indexed if permitted(node)]
+            self.request.environ['_filtered_children'] = children
+            return children
         for node in self.listable_children:
-            if not self.request.has_permission('view', node):
-                continue
             if term:
                 metadata = node.metadata
                 title = metadata.get('title')
@@ -194,10 +202,35 @@ class ContentsTile(Table):
                 creator = creator.lower() if creator else ''
                 if title.find(term) == -1 and creator.find(term) == -1:
                     continue
+            if not permitted(node):
+                continue
             children.append(node)
         self.request.environ['_filtered_children'] = children
         return children
 
+    def indexed_filtered_children(self, term):
+        """Return children matching term using the fulltext index or ``None``
+        if the fulltext index is not usable.
+        """
+        if not term or not self.use_fulltext_index:
+            return None
+        if fulltext_index.root is None:
+            return None
+        model = self.model
+        path = fulltext_index.path_for(model)
+        if path is None:
+            return None
+        matches = fulltext_index.search(
+            term,
+            fields=['title', 'creator'],
+            parent=path
+        )
+        names = set([match[-1] for match in matches])
+        return [
+            node for node in self.listable_children
+            if node.name in names
+        ]
+
     def sorted_children(self, sort, order):
         children = self.filtered_children
         if sort in self.sort_keys:
@@ -206,6 +239,114 @@ class ContentsTile(Table):
                 children.reverse()
         return children
 
+    def sliced_children(self, start, end, sort, order):
+        """Return sorted children from start to end.
+
+        Uses the child sort index of model if provided, otherwise only the
+        first ``end`` children get sorted.
+        """
+        if self.lazy_listing:
+            return self.lazy_children(start, end, sort, order)
+        if sort not in self.sort_keys:
+            return self.filtered_children[start:end]
+        model = self.model
+        if self.use_child_sort_index \
+                and not self.filter_term \
+                and not self.children_overridden \
+                and IChildSortIndex.providedBy(model) \
+                and sort in model.child_sort_keys:
+            return self.indexed_children(start, end, sort, order)
+        if end is None:
+            return self.sorted_children(sort, order)[start:end]
+        children = self.filtered_children
+        sort_key = self.sort_keys[sort]
+        if order == 'asc':
+            # equal to reversing the ascending sorted children
+            ordered = heapq.nlargest(
+                end,
+                enumerate(children),
+                key=lambda x: (sort_key(x[1]), x[0])
+            )
+            return [child for _, child in ordered][start:end]
+        return heapq.nsmallest(end, children, key=sort_key)[start:end]
+
+    def lazy_children(self, start, end, sort, order):
+        """Return children from start to end using the lazy listing of model.
+
+        If the model does not filter children by permission, children are
+        fetched from the beginning until ``end`` permitted children are
+        found, thus pages are complete. ``item_count`` is unfiltered in this
+        case and includes children not permitted to view.
+        """
+        if sort in self.sort_keys:
+            # children are sorted ascending for order ``desc``, see
+            # ``sorted_children``
+            order = 'asc' if order == 'desc' else 'desc'
+        else:
+            sort = order = None
+        model = self.model
+        query = self.lazy_listing_query(sort=sort, order=order)
+        permitted = PermissionChecker(self.request, 'view')
+        if self.permission_filtered:
+            children = model.slice(start, end, **query)
+            return [child for child in children if permitted(child)]
+        start = start or 0
+        children = list()
+        if end is not None and end <= start:
+            return children
+        count = 0
+        offset = 0
+        while True:
+            size = None if end is None else max(end - count, end - start)
+            stop = None if size is None else offset + size
+            fetched = model.slice(offset, stop, **query)
+            for child in fetched:
+                if not permitted(child):
+                    continue
+                if count >= start:
+                    children.append(child)
+                count += 1
+                if end is not None and count >= end:
+                    return children
+            if size is None or len(fetched) < size:
+                return children
+            offset += size
+
+    @property
+    def children_overridden(self):
+        """Flag whether ``listable_children`` or ``filtered_children`` are
+        customized by a subclass, thus the indices of model cannot be used.
+        """
+        cls = self.__class__
+        return cls.listable_children is not ContentsTile.listable_children \
+            or cls.filtered_children is not ContentsTile.filtered_children
+
+    def indexed_children(self, start, end, sort, order):
+        """Return children from start to end using the child sort index of
+        model.
+
+        Sorting all children is replaced by iterating the presorted index
+        until ``end`` permitted children are found, thus only those children
+        get loaded and permission checked. ``item_count`` of the batch still
+        needs ``filtered_children``, which permission checks all children.
+        """
+        model = self.model
+        permitted = PermissionChecker(self.request, 'view')
+        children = list()
+        start = start or 0
+        count = 0
+        reverse = order == 'asc'
+        for key in model.sorted_child_keys(sort, reverse=reverse):
+            if end is not None and count >= end:
+                break
+            child = model[key]
+            if not permitted(child):
+                continue
+            if count >= start:
+                children.append(child)
+            count += 1
+        return children
+
 
 @tile(name='listing', path='templates/listing.pt', permission='list')
 @plumbing(RelatedViewProvider)
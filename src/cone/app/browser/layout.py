@@ -7,20 +7,157 @@ from cone.app.browser.utils import node_icon
 from cone.app.browser.utils import node_path
 from cone.app.interfaces import IWorkflowState
 from cone.app.model import AppRoot
+from cone.app.security import acl_cache
+from cone.app.security import filter_permitted
 from cone.app.ugm import principal_data
 from cone.app.utils import safe_decode
 from cone.tile import Tile
 from cone.tile import render_template
 from cone.tile import render_tile
 from cone.tile import tile
+from collections import OrderedDict
+from node.interfaces import IChildFactory
+from node.interfaces import INode
+from node.interfaces import INodeAddedEvent
+from node.interfaces import INodeDetachedEvent
+from node.interfaces import INodeModifiedEvent
+from node.interfaces import INodeRemovedEvent
 from node.utils import LocationIterator
 from odict import odict
 from pyramid.i18n import TranslationStringFactory
+from zope.component import getSiteManager
+import itertools
+import threading
+import time
 
 
 _ = TranslationStringFactory('cone.app')
 
 
+# Timeout in seconds of the navigation cache. ``0`` disables the cache
+NAVIGATION_CACHE_TTL = 0
+NAVIGATION_CACHE_MAX_SIZE = 1000
+
+
+class NavigationCache(object):
+    """Process wide LRU cache for computed navigation fragments.
+
+    Cache keys contain the ACL cache version, thus workflow transitions and
+    sharing changes, which call ``invalidate_acl_cache``, implicitly
+    invalidate cached fragments. Structure changes are announced by node
+    lifecycle events, see ``enable_navigation_cache``.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.storage = OrderedDict()
+        self._lock = threading.Lock()
+        self._root_ids = itertools.count()
+
+    def root_id(self, root):
+        """Return identifier of root node, which is unique for the lifetime
+        of the process, other than ``id(root)``.
+        """
+        root_id = getattr(root, '_navigation_cache_id', None)
+        if root_id is None:
+            with self._lock:
+                root_id = root._navigation_cache_id = next(self._root_ids)
+        return root_id
+
+    @property
+    def enabled(self):
+        return NAVIGATION_CACHE_TTL > 0
+
+    def get(self, key):
+        """Return cached value for key or ``None``.
+        """
+        with self._lock:
+            entry = self.storage.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                return None
+            self.storage[key] = entry
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self.storage.pop(key, None)
+            while len(self.storage) >= NAVIGATION_CACHE_MAX_SIZE:
+                self.storage.popitem(last=False)
+            self.storage[key] = (time.time() + NAVIGATION_CACHE_TTL, value)
+
+    def cached(self, key, compute):
+        """Return cached value for key or compute and cache it.
+
+        :param key: Hashable cache key. Gets extended by ACL cache version.
+        :param compute: Callable computing the value.
+        """
+        if not self.enabled:
+            return compute()
+        key = key + (acl_cache.version,)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self.storage.clear()
+
+
+navigation_cache = NavigationCache()
+
+
+def invalidate_navigation_cache():
+    """Invalidate all cached navigation fragments.
+    """
+    navigation_cache.invalidate()
+
+
+def navigation_node_added_handler(node, event):
+    parent = event.newParent
+    if IChildFactory.providedBy(parent) and event.newName in parent.factories:
+        # child of factory node gets lazy loaded, no structure change
+        return
+    navigation_cache.invalidate()
+
+
+def navigation_node_changed_handler(node, event):
+    navigation_cache.invalidate()
+
+
+_navigation_handlers_registered = False
+
+
+def enable_navigation_cache():
+    """Register lifecycle event handlers invalidating the navigation cache
+    on node additions, removals and modifications.
+    """
+    global _navigation_handlers_registered
+    navigation_cache.invalidate()
+    if _navigation_handlers_registered:
+        return
+    registry = getSiteManager()
+    registry.registerHandler(
+        navigation_node_added_handler,
+        (INode, INodeAddedEvent)
+    )
+    for event_iface in [
+        INodeModifiedEvent,
+        INodeRemovedEvent,
+        INodeDetachedEvent
+    ]:
+        registry.registerHandler(
+            navigation_node_changed_handler,
+            (INode, event_iface)
+        )
+    _navigation_handlers_registered = True
+
+
 @tile(name='logo', path='templates/logo.pt', permission='login')
 class LogoTile(Tile):
     """Tile rendering the logo.
@@ -154,12 +291,47 @@ class MainMenu(Tile):
 
     * If ``default_content_tile`` is set on ``model.root.properties``, it is
       considered in target link creation.
+
+    Computed menu items get cached if navigation cache is enabled.
     """
 
     @property
     def menuitems(self):
+        if not navigation_cache.enabled:
+            return self.compute_menuitems()
+        return navigation_cache.cached(self.cache_key, self.compute_menuitems)
+
+    @property
+    def cache_key(self):
+        """Cache key of menu items. Contains the effective principals, the
+        selected path, the application URL, the locale, the root identifier,
+        the root child keys and the navigation cache version.
+
+        Children of root are not loaded for computing the key. Changes of menu
+        related properties or titles of root children are announced by
+        ``NodeModifiedEvent``, see ``cone.app.model.node_modified``, which
+        bumps the version. The version also prevents menu items computed
+        while invalidating from being used afterwards.
+        """
+        request = self.request
+        root = self.model.root
+        root_props = root.properties
+        return (
+            'mainmenu',
+            navigation_cache.root_id(root),
+            navigation_cache.version,
+            tuple(root.keys()),
+            tuple(node_path(self.model, request)[:2]),
+            tuple(sorted(request.effective_principals)),
+            request.application_url,
+            request.locale_name,
+            root_props.default_child,
+            root_props.mainmenu_empty_title
+        )
+
+    def compute_menuitems(self):
         ret = list()
-        path = node_path(self.model)
+        path = node_path(self.model, self.request)
         if path:
             curpath = path[0]
         else:
@@ -174,12 +346,9 @@ class MainMenu(Tile):
         # check wether to render mainmenu item title
         empty_title = root_props.mainmenu_empty_title
         # XXX: icons
-        for key in root.keys():
-            child = root[key]
+        for child in self.listed_children(root):
             props = child.properties
-            if self.ignore_node(child, props):
-                continue
-            selected = curpath == key
+            selected = curpath == child.name
             item = self.create_item(child, props, empty_title, selected)
             if props.mainmenu_display_children:
                 item['children'] = self.create_children(child, selected)
@@ -190,26 +359,29 @@ class MainMenu(Tile):
 
     def create_children(self, node, selected):
         children = list()
-        path = node_path(self.model)
+        path = node_path(self.model, self.request)
         if path and len(path) > 1 and path[0] == node.name:
             curpath = path[1]
         else:
             curpath = ''
-        for key in node.keys():
-            child = node[key]
+        for child in self.listed_children(node):
             props = child.properties
-            if self.ignore_node(child, props):
-                continue
-            selected = curpath == key
+            selected = curpath == child.name
             item = self.create_item(child, props, False, selected)
             children.append(item)
         return children
 
+    def listed_children(self, node):
+        children = list()
+        for key in node.keys():
+            child = node[key]
+            if not self.ignore_node(child, child.properties):
+                children.append(child)
+        return filter_permitted(self.request, 'view', children)
+
     def ignore_node(self, node, props):
         if props.skip_mainmenu:
             return True
-        if not self.request.has_permission('view', node):
-            return True
         return False
 
     def create_item(self, node, props, empty_title, selected):
@@ -340,12 +512,13 @@ class NavTree(Tile):
         if default_child:
             if not curpath:
                 curpath = model.properties.default_child
+        children = list()
         for key in model:
             node = model[key]
-            if not self.request.has_permission('view', node):
-                continue
-            if not node.properties.get('in_navtree'):
-                continue
+            if node.properties.get('in_navtree'):
+                children.append(node)
+        for node in filter_permitted(self.request, 'view', children):
+            key = node.name
             title = node.metadata.title
             if title:
                 title = safe_decode(title)
@@ -357,8 +530,8 @@ class NavTree(Tile):
             css = ''
             if IWorkflowState.providedBy(node):
                 css = 'state-%s' % node.state
-            child = self.navtreeitem(
-                title, url, target, node_path(node), icon, css)
+            item_path = node_path(node, self.request)
+            child = self.navtreeitem(title, url, target, item_path, icon, css)
             child['showchildren'] = curnode
             if curnode:
                 child['selected'] = True
@@ -367,7 +540,7 @@ class NavTree(Tile):
                 else:
                     self.fillchildren(node, path[1:], child)
             else:
-                selected_path = node_path(self.model)
+                selected_path = node_path(self.model, self.request)
                 if default_child:
                     selected_path.append(default_child.name)
                 selected = False
@@ -381,10 +554,34 @@ class NavTree(Tile):
         root = self.navtreeitem(None, None, None, '', None)
         model = self.navroot
         # XXX: default child
-        path = node_path(self.model)[len(node_path(model)):]
+        request = self.request
+        path = node_path(self.model, request)[len(node_path(model, request)):]
         self.fillchildren(model, path, root)
         return root
 
+    @property
+    def cache_key(self):
+        request = self.request
+        return (
+            'navtree',
+            tuple(node_path(self.navroot, request)),
+            tuple(node_path(self.model, request)),
+            tuple(sorted(request.effective_principals)),
+            request.application_url,
+            request.locale_name
+        )
+
+    @property
+    def rendered_navtree(self):
+        """Rendered navigation tree. Gets cached if navigation cache is
+        enabled.
+        """
+        def compute():
+            return self.rendertree(self.navtree()['children'])
+        if not navigation_cache.enabled:
+            return compute()
+        return navigation_cache.cached(self.cache_key, compute)
+
     def rendertree(self, children, level=1):
         return render_template(
             'cone.app.browser:templates/navtree_recue.pt',
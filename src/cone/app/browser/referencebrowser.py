@@ -237,9 +237,8 @@ class ReferenceListing(ContentsTile):
         return ReferencableChildrenLink(self.table_tile_name, self.table_id)
 
     def sorted_rows(self, start, end, sort, order):
-        children = self.sorted_children(sort, order)
         rows = list()
-        for child in children[start:end]:
+        for child in self.sliced_children(start, end, sort, order):
             row_data = RowData()
             row_data['actions'] = self.row_actions(child, self.request)
             row_data['title'] = \
@@ -1,11 +1,35 @@
 from cone.app.utils import app_config
+from cone.app.utils import file_stat
+from cone.app.utils import safe_decode
+from cone.app.utils import safe_encode
+from cone.app.utils import write_file_atomic
 from cone.tile import Tile
 from cone.tile import tile
+from io import BytesIO
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.request import Request
+from pyramid.static import static_view
 from pyramid.view import view_config
 from webob import Response
 import cone.app
+import gzip
+import hashlib
+import json
+import logging
 import os
 import pkg_resources
+import posixpath
+import re
+import threading
+
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+logger = logging.getLogger('cone.app')
 
 
 def is_remote_resource(resource):
@@ -14,6 +38,226 @@ def is_remote_resource(resource):
         or resource.startswith('//')
 
 
+###############################################################################
+# Precompression
+###############################################################################
+
+# Supported content encodings in order of preference
+CONTENT_ENCODINGS = ['br', 'gzip']
+
+# Content types considered for compression
+COMPRESSIBLE_CONTENT_TYPES = [
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+]
+
+# Brotli compression quality
+BROTLI_QUALITY = 9
+
+
+def gzip_compress(data):
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as file:
+        file.write(data)
+    return buffer.getvalue()
+
+
+def compress_data(data):
+    """Compress data with all available content encodings.
+
+    :param data: Bytes to compress.
+    :return: Dict containing compressed data by content encoding name.
+        Variants which are not smaller than the original data are omitted.
+    """
+    variants = dict()
+    if brotli is not None:  # pragma: no cover
+        variants['br'] = brotli.compress(data, quality=BROTLI_QUALITY)
+    variants['gzip'] = gzip_compress(data)
+    for encoding, compressed in list(variants.items()):
+        if len(compressed) >= len(data):
+            del variants[encoding]
+    return variants
+
+
+def accepted_encoding(request, encodings):
+    """Negotiate content encoding by ``Accept-Encoding`` header.
+
+    :param request: Current request.
+    :param encodings: Available content encodings.
+    :return: Name of preferred content encoding or ``None``.
+    """
+    header = request.headers.get('Accept-Encoding')
+    if not header:
+        return None
+    accepted = dict()
+    for value in header.split(','):
+        parts = value.split(';')
+        name = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    for encoding in CONTENT_ENCODINGS:
+        if encoding not in encodings:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressedStaticView(static_view):
+    """Static view delivering precompressed variants of compressible files.
+
+    Compressed variants get created once per file and kept in memory. A file
+    gets recompressed if it's modification time or size changes.
+    """
+    min_size = 1024
+
+    @property
+    def compressed(self):
+        return self.__dict__.setdefault('_compressed', dict())
+
+    def __call__(self, context, request):
+        response = super(CompressedStaticView, self).__call__(context, request)
+        if response.content_type not in COMPRESSIBLE_CONTENT_TYPES \
+                or response.content_encoding \
+                or response.status_code != 200:
+            return response
+        response.vary = ('Accept-Encoding',)
+        if not response.content_length \
+                or response.content_length < self.min_size:
+            return response
+        if self.use_subpath:
+            path = tuple(request.subpath)
+        else:
+            path = request.path_info
+        key = (path, response.last_modified, response.content_length)
+        variants = self.compressed.get(key)
+        if variants is None:
+            encoding = accepted_encoding(request, CONTENT_ENCODINGS)
+            if not encoding:
+                return response
+            variants = self.compressed[key] = compress_data(response.body)
+        encoding = accepted_encoding(request, variants)
+        if not encoding:
+            return response
+        app_iter = response.app_iter
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+        response.body = variants[encoding]
+        response.content_encoding = encoding
+        return response
+
+
+###############################################################################
+# Merged assets
+###############################################################################
+
+def minified_name(name):
+    """Return name of minified variant of asset, or ``None`` if name already
+    refers to a minified asset.
+    """
+    base, ext = os.path.splitext(name)
+    if base.endswith('.min'):
+        return None
+    return '{}.min{}'.format(base, ext)
+
+
+def read_file_asset(view, subpath, minified=False):
+    """Read asset file delivered by static view.
+
+    :param view: ``pyramid.static.static_view`` instance.
+    :param subpath: Path of the asset relative to static view docroot.
+    :param minified: Flag whether to read minified variant of asset if exists.
+    :return: File contents as string.
+    """
+    min_subpath = minified_name(subpath) if minified else None
+    if min_subpath and pkg_resources.resource_exists(
+        view.package_name,
+        os.path.join(view.docroot, min_subpath)
+    ):
+        subpath = min_subpath
+    path = pkg_resources.resource_filename(
+        view.package_name,
+        os.path.join(view.docroot, subpath)
+    )
+    with open(path, 'r') as asset:
+        return safe_decode(asset.read())
+
+
+def read_url_asset(router, path, minified=False):
+    """Read asset by application relative URL path.
+
+    The asset gets fetched by invoking a subrequest on the application.
+
+    :param router: ``pyramid.router.Router`` instance.
+    :param path: Application relative URL path of the asset.
+    :param minified: Flag whether to read minified variant of asset if exists.
+    :return: Asset contents as string or ``None`` if asset not found.
+    """
+    paths = [path]
+    min_path = minified_name(path) if minified else None
+    if min_path:
+        paths.insert(0, min_path)
+    for path in paths:
+        request = Request.blank('/{}'.format(path))
+        try:
+            response = router.invoke_subrequest(request)
+        except HTTPNotFound:
+            continue
+        if response.status_code == 200:
+            return safe_decode(response.body)
+    return None
+
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def rewrite_css_urls(data, base):
+    """Rewrite relative URLs in CSS data to be relative to application root.
+
+    :param data: CSS data as string.
+    :param base: Application relative URL path of the directory containing
+        the CSS file.
+    :return: CSS data with rewritten URLs.
+    """
+    def rewrite(match):
+        quote, url = match.group(1), match.group(2).strip()
+        if url.startswith('data:') \
+                or url.startswith('/') \
+                or url.startswith('#') \
+                or is_remote_resource(url):
+            return match.group(0)
+        url = posixpath.normpath(posixpath.join(base, url))
+        return 'url({0}{1}{0})'.format(quote, url)
+    return CSS_URL_PATTERN.sub(rewrite, data)
+
+
+def read_merged_assets(assets, minified=False):
+    """Read and concatenate asset files.
+
+    :param assets: List of ``(static_view, subpath)`` tuples.
+    :param minified: Flag whether to read minified variant of assets if exists.
+    :return: Concatenated file contents as string.
+    """
+    data = list()
+    for view, subpath in assets:
+        data.append(read_file_asset(view, subpath, minified=minified) + '\n\n')
+    return ''.join(data)
+
+
 class MergedAssets(object):
 
     def __init__(self, request):
@@ -27,15 +271,7 @@ class MergedAssets(object):
             assets = assets.public + assets.protected
         else:
             assets = assets.public
-        data = ''
-        for view, subpath in assets:
-            path = pkg_resources.resource_filename(
-                view.package_name,
-                os.path.join(view.docroot, subpath)
-            )
-            with open(path, 'r') as asset:
-                data += asset.read() + '\n\n'
-        return data
+        return read_merged_assets(assets)
 
     @property
     def merged_js(self):
@@ -50,28 +286,281 @@ class MergedAssets(object):
         return self.merged_assets(self.merged_print_css_assets)
 
 
+###############################################################################
+# Precomputed merged asset bundles
+###############################################################################
+
+# bundle name, ``cone.app.cfg.merged`` attribute name, ``cone.app.cfg``
+# attribute name of resources additionally bundled in production mode,
+# content type
+MERGED_BUNDLES = [
+    ('cone.js', 'js', 'js', 'application/javascript'),
+    ('cone.css', 'css', 'css', 'text/css'),
+    ('print.css', 'print_css', None, 'text/css'),
+]
+
+# Cache control header used if bundle gets requested with hash matching
+# version parameter.
+BUNDLE_CACHE_MAX_AGE = 31536000
+
+
+class MergedAssetBundle(object):
+    """Merged asset data computed once and identified by content hash.
+    """
+
+    def __init__(self, name, content_type, data, protected=False):
+        self.name = name
+        self.content_type = content_type
+        self.data = safe_encode(data)
+        self.protected = protected
+        self.hash = hashlib.md5(self.data).hexdigest()
+        self.encodings = compress_data(self.data)
+
+    @property
+    def etag(self):
+        return self.hash
+
+    def etag_for(self, encoding=None):
+        """Return etag for bundle variant by content encoding.
+        """
+        if not encoding:
+            return self.etag
+        return '{}-{}'.format(self.etag, encoding)
+
+    def data_for(self, encoding=None):
+        """Return bundle data by content encoding.
+        """
+        if not encoding:
+            return self.data
+        return self.encodings[encoding]
+
+
+class MergedAssetBundles(object):
+    """Registry of precomputed merged asset bundles.
+
+    Bundles get built once either explicitely on application startup via
+    ``build`` or lazily on first lookup. For each bundle a public and a
+    protected variant is created.
+
+    If ``cone.app.cfg.assets_mode`` is ``production``, minified variants of
+    assets are used if present and application relative resources from
+    ``cone.app.cfg.js`` and ``cone.app.cfg.css`` get bundled as well.
+
+    If ``manifest_path`` is set, bundle URLs are read from the JSON manifest
+    file, which gets reloaded if changed.
+    """
+
+    def __init__(self):
+        self.router = None
+        self.bundles = dict()
+        self.bundled = set()
+        self.manifest = dict()
+        self.manifest_path = None
+        self._file_manifest = (None, None)
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        return bool(self.bundles)
+
+    def build(self, router=None):
+        """Build merged asset bundles.
+
+        :param router: Optional ``pyramid.router.Router`` instance used to
+            read application relative resources in production mode.
+        """
+        if router is not None:
+            self.router = router
+        cfg = app_config()
+        production = cfg.assets_mode == 'production'
+        bundles = dict()
+        bundled = set()
+        manifest = dict(public=dict(), protected=dict())
+        for name, merged_name, resources_name, content_type in MERGED_BUNDLES:
+            assets = cfg.merged[merged_name]
+            merged_public = read_merged_assets(
+                assets.public,
+                minified=production
+            )
+            merged_protected = read_merged_assets(
+                assets.protected,
+                minified=production
+            )
+            resources_public = resources_protected = ''
+            if production and resources_name and self.router is not None:
+                resources = cfg[resources_name]
+                css = content_type == 'text/css'
+                resources_public = self.read_resources(
+                    resources['public'],
+                    css,
+                    bundled
+                )
+                resources_protected = self.read_resources(
+                    resources['protected'],
+                    css,
+                    bundled
+                )
+            public = MergedAssetBundle(
+                name,
+                content_type,
+                merged_public + resources_public
+            )
+            protected = MergedAssetBundle(
+                name,
+                content_type,
+                merged_public + merged_protected +
+                resources_public + resources_protected,
+                protected=True
+            )
+            for bundle in (public, protected):
+                bundles[(name, bundle.protected)] = bundle
+                variant = 'protected' if bundle.protected else 'public'
+                manifest[variant][name] = '{}?v={}'.format(name, bundle.hash)
+        self.bundles = bundles
+        self.bundled = bundled
+        self.manifest = manifest
+
+    def read_resources(self, resources, css, bundled):
+        data = list()
+        for resource in resources:
+            if is_remote_resource(resource):
+                continue
+            asset = read_url_asset(self.router, resource, minified=True)
+            if asset is None:
+                logger.warning('Cannot bundle resource {}'.format(resource))
+                continue
+            if css:
+                asset = rewrite_css_urls(asset, posixpath.dirname(resource))
+            bundled.add(resource)
+            data.append(asset + '\n\n')
+        return ''.join(data)
+
+    def write_manifest(self, path):
+        """Write JSON manifest containing bundle URLs by name.
+        """
+        self.ensure_built()
+        data = json.dumps(self.manifest, indent=2, sort_keys=True)
+        write_file_atomic(path, safe_encode(data))
+
+    def read_manifest(self):
+        """Return manifest read from ``manifest_path``. Fall back to manifest
+        of built bundles if no manifest path is set or file not exists.
+        """
+        path = self.manifest_path
+        stat = file_stat(path) if path else None
+        if stat is None:
+            self.ensure_built()
+            return self.manifest
+        cached_stat, manifest = self._file_manifest
+        if stat != cached_stat:
+            with open(path) as file:
+                manifest = json.load(file)
+            self._file_manifest = (stat, manifest)
+        return manifest
+
+    def bundle_url(self, name, protected=False):
+        """Return URL of bundle relative to application root.
+        """
+        variant = 'protected' if protected else 'public'
+        url = self.read_manifest().get(variant, dict()).get(name)
+        if url is None:
+            self.ensure_built()
+            url = self.manifest[variant][name]
+        return url
+
+    def clear(self):
+        self.bundles = dict()
+        self.bundled = set()
+        self.manifest = dict()
+        self._file_manifest = (None, None)
+
+    def ensure_built(self):
+        if not self.built:
+            with self._lock:
+                if not self.built:
+                    self.build()
+
+    def is_bundled(self, resource):
+        self.ensure_built()
+        return resource in self.bundled
+
+    def lookup(self, name, protected=False):
+        self.ensure_built()
+        return self.bundles[(name, protected)]
+
+    def for_request(self, request, name):
+        return self.lookup(name, bool(request.authenticated_userid))
+
+
+merged_bundles = MergedAssetBundles()
+
+
+def etag_matches(request, etag):
+    """Check whether ``If-None-Match`` header of request matches etag.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    for value in header.split(','):
+        value = value.strip()
+        if value == '*':
+            return True
+        if value.startswith('W/'):
+            value = value[2:]
+        if value.strip('"') == etag:
+            return True
+    return False
+
+
+def merged_bundle_response(request, name):
+    """Create response for merged asset bundle by name.
+
+    Responds with ``304 Not Modified`` if client already holds the current
+    bundle version. If bundle is requested with ``v`` parameter matching the
+    bundle hash, the response is considered immutable and cached long-lived.
+    Precompressed bundle data is delivered if accepted by the client.
+    """
+    bundle = merged_bundles.for_request(request, name)
+    encoding = accepted_encoding(request, bundle.encodings)
+    etag = bundle.etag_for(encoding)
+    response = Response()
+    if bundle.protected:
+        cache_control = 'private'
+    else:
+        cache_control = 'public'
+    if request.params.get('v') == bundle.hash:
+        cache_control = '{}, max-age={}, immutable'.format(
+            cache_control,
+            BUNDLE_CACHE_MAX_AGE
+        )
+    else:
+        cache_control = '{}, no-cache'.format(cache_control)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['ETag'] = '"{}"'.format(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if etag_matches(request, etag):
+        response.status_code = 304
+        return response
+    response.body = bundle.data_for(encoding)
+    response.headers['Content-Type'] = bundle.content_type
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
 @view_config(name='cone.js')
 def cone_js(model, request):
-    assets = MergedAssets(request)
-    response = Response(assets.merged_js)
-    response.headers['Content-Type'] = 'application/javascript'
-    return response
+    return merged_bundle_response(request, 'cone.js')
 
 
 @view_config(name='cone.css')
 def cone_css(model, request):
-    assets = MergedAssets(request)
-    response = Response(assets.merged_css)
-    response.headers['Content-Type'] = 'text/css'
-    return response
+    return merged_bundle_response(request, 'cone.css')
 
 
 @view_config(name='print.css')
 def print_css(model, request):
-    assets = MergedAssets(request)
-    response = Response(assets.merged_print_css)
-    response.headers['Content-Type'] = 'text/css'
-    return response
+    return merged_bundle_response(request, 'print.css')
 
 
 @tile(name='resources', path='templates/resources.pt', permission='login')
@@ -96,14 +585,34 @@ class Resources(Tile):
 
     def resources(self, reg):
         ret = list()
-        for res in reg['public']:
-            ret.append(self.resource_url(res))
+        resources = reg['public']
         if self.authenticated:
-            for res in reg['protected']:
-                ret.append(self.resource_url(res))
+            resources = resources + reg['protected']
+        for res in resources:
+            if merged_bundles.is_bundled(res):
+                continue
+            ret.append(self.resource_url(res))
         return ret
 
     def resource_url(self, resource):
         if is_remote_resource(resource):
             return resource
         return '{}/{}'.format(self.request.application_url, resource)
+
+    def merged_url(self, name):
+        return '{}/{}'.format(
+            self.request.application_url,
+            merged_bundles.bundle_url(name, bool(self.authenticated))
+        )
+
+    @property
+    def merged_js_url(self):
+        return self.merged_url('cone.js')
+
+    @property
+    def merged_css_url(self):
+        return self.merged_url('cone.css')
+
+    @property
+    def merged_print_css_url(self):
+        return self.merged_url('print.css')
@@ -4,6 +4,7 @@ from cone.app.browser import render_main_template
 from cone.app.browser.ajax import ajax_message
 from cone.app.browser.table import RowData
 from cone.app.browser.table import Table
+from cone.app.ugm import principals_by_ids
 from cone.tile import Tile
 from cone.tile import tile
 from plumber import plumbing
@@ -103,8 +104,10 @@ class SharingTable(Table):
         ids = sorted(principal_ids)
         if order == 'desc':
             ids.reverse()
-        for principal_id in ids[start:end]:
-            principal = security.principal_by_id(principal_id)
+        ids = ids[start:end]
+        principals = principals_by_ids(ids)
+        for principal_id in ids:
+            principal = principals.get(principal_id)
             if not principal:
                 logger.warning('principal %s not found' % principal_id)
                 continue
@@ -117,7 +120,7 @@ class SharingTable(Table):
                     title = principal.attrs.get(USER_TITLE_ATTR, default)
             row_data = RowData()
             row_data['principal'] = title
-            ugm_roles = principal.roles
+            ugm_roles = list(principal.roles)
             local_roles = principal_roles.get(principal_id, list())
             if inheritance:
                 for role in model.aggregated_roles_for(principal_id):
@@ -156,10 +159,12 @@ class AddPrincipalRole(Tile):
             roles = model.principal_roles
             if principal_id not in roles:
                 model.principal_roles[principal_id] = [role]
+                security.invalidate_acl_cache()
                 return u''
             existing = set(model.principal_roles[principal_id])
             existing.add(role)
             model.principal_roles[principal_id] = list(existing)
+            security.invalidate_acl_cache()
         except Exception as e:
             logger.error(e)
             localizer = get_localizer(self.request)
@@ -192,6 +197,7 @@ class RemovePrincipalRole(Tile):
                 del model.principal_roles[principal_id]
             else:
                 model.principal_roles[principal_id] = existing
+            security.invalidate_acl_cache()
         except Exception as e:
             logger.error(e)
             localizer = get_localizer(self.request)
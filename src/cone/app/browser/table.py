@@ -1,12 +1,15 @@
 from cone.app import compat
 from cone.app.browser import RelatedViewConsumer
 from cone.app.browser.batch import Batch
+from cone.app.browser.batch import BatchVocab
 from cone.app.browser.utils import format_date
 from cone.app.browser.utils import make_query
 from cone.app.browser.utils import make_url
 from cone.app.browser.utils import node_path
 from cone.app.browser.utils import safe_decode
+from cone.app.interfaces import ILazyListing
 from cone.tile import Tile
+from node.utils import instance_property
 from plumber import plumbing
 
 
@@ -18,6 +21,67 @@ class RowData(dict):
         self.css = css
 
 
+class TableRenderContext(object):
+    """Values of a table tile computed once per rendering.
+
+    Values are read lazily from the related table tile, thus subclasses
+    overriding ``slicesize``, ``sort_column``, ``sort_order``, ``filter_term``
+    or ``item_count`` are considered.
+    """
+
+    def __init__(self, table_tile):
+        self.table_tile = table_tile
+
+    @instance_property
+    def slicesize(self):
+        return self.table_tile.slicesize
+
+    @instance_property
+    def sort_column(self):
+        return self.table_tile.sort_column
+
+    @instance_property
+    def sort_order(self):
+        return self.table_tile.sort_order
+
+    @instance_property
+    def filter_term(self):
+        return self.table_tile.filter_term
+
+    @instance_property
+    def item_count(self):
+        return self.table_tile.item_count
+
+    @instance_property
+    def current_page(self):
+        return self.table_tile.request.params.get('b_page', '0')
+
+    @instance_property
+    def slice(self):
+        """Current slice as (start, end) tuple.
+        """
+        start = int(self.current_page) * self.slicesize
+        return start, start + self.slicesize
+
+    @instance_property
+    def whitelist_params(self):
+        """Query parameters from ``query_whitelist``.
+        """
+        params = self.table_tile.request.params
+        return dict([
+            (param, params.get(param, ''))
+            for param in self.table_tile.query_whitelist
+        ])
+
+    @instance_property
+    def table_slice(self):
+        return TableSlice(
+            self.table_tile,
+            self.table_tile.model,
+            self.table_tile.request
+        )
+
+
 @plumbing(RelatedViewConsumer)
 class Table(Tile):
     """Abstract table tile. Provides rendering of sortable, batched tables.
@@ -47,9 +111,28 @@ class Table(Tile):
     table_length_size = 'col-xs-4 col-sm3'
     table_filter_size = 'col-xs-3'
 
+    def __call__(self, model, request):
+        # render context is shared while rendering
+        self._render_context_memo = list()
+        try:
+            return super(Table, self).__call__(model, request)
+        finally:
+            self._render_context_memo = None
+
+    @property
+    def render_context(self):
+        """``TableRenderContext`` instance. Computed once while rendering.
+        """
+        memo = getattr(self, '_render_context_memo', None)
+        if memo is None:
+            return TableRenderContext(self)
+        if not memo:
+            memo.append(TableRenderContext(self))
+        return memo[0]
+
     @property
     def slice(self):
-        return TableSlice(self, self.model, self.request)
+        return self.render_context.table_slice
 
     @property
     def batch(self):
@@ -69,18 +152,20 @@ class Table(Tile):
 
     @property
     def slice_target(self):
+        render_context = self.render_context
         return self.make_url({
-            'sort': self.sort_column,
-            'order': self.sort_order,
-            'term': self.filter_term,
+            'sort': render_context.sort_column,
+            'order': render_context.sort_order,
+            'term': render_context.filter_term,
         })
 
     @property
     def filter_target(self):
+        render_context = self.render_context
         return self.make_url({
-            'sort': self.sort_column,
-            'order': self.sort_order,
-            'size': self.slicesize,
+            'sort': render_context.sort_column,
+            'order': render_context.sort_order,
+            'size': render_context.slicesize,
         })
 
     @property
@@ -104,7 +189,7 @@ class Table(Tile):
     def sort_index(self):
         """Index of recent sort column.
         """
-        col = self.sort_column
+        col = self.render_context.sort_column
         idx = 0
         for col_def in self.col_defs:
             key = col_def.get('sort_key')
@@ -118,9 +203,7 @@ class Table(Tile):
         :param params: Dictionary with query parameters.
         :return: Query as string.
         """
-        p = dict()
-        for param in self.query_whitelist:
-            p[param] = self.request.params.get(param, '')
+        p = dict(self.render_context.whitelist_params)
         p.update(params)
         return make_query(**p)
 
@@ -145,31 +228,66 @@ class Table(Tile):
         return format_date(dt)
 
     def th_defs(self, sortkey):
-        cur_sort = self.sort_column
-        cur_order = self.sort_order
+        render_context = self.render_context
+        cur_sort = render_context.sort_column
+        cur_order = render_context.sort_order
         selected = cur_sort == sortkey
         alter = selected and cur_order == 'desc'
         order = alter and 'asc' or 'desc'
         params = {
-            'b_page': self.request.params.get('b_page', '0'),
+            'b_page': render_context.current_page,
             'sort': sortkey,
             'order': order,
-            'size': self.slicesize,
-            'term': self.filter_term,
+            'size': render_context.slicesize,
+            'term': render_context.filter_term,
         }
         url = self.make_url(params)
         css = selected and order or ''
         return css, url
 
+    @property
+    def lazy_listing(self):
+        """Flag whether model provides ``ILazyListing``.
+        """
+        return ILazyListing.providedBy(getattr(self, 'model', None))
+
+    @property
+    def permission_filtered(self):
+        """Flag whether lazy listing of model filters children by permission.
+        """
+        return self.lazy_listing \
+            and bool(getattr(self.model, 'permission_filtered', False))
+
+    def lazy_listing_query(self, **kw):
+        """Return keyword arguments for ``count`` and ``slice`` of lazy
+        listing model.
+        """
+        kw['term'] = self.filter_term
+        if self.permission_filtered:
+            kw['principals'] = self.request.effective_principals
+        return kw
+
     @property
     def item_count(self):
+        if self.lazy_listing:
+            return self.model.count(**self.lazy_listing_query())
         raise NotImplementedError("Abstract table does not implement "
                                   "``item_count``.")
 
     def sorted_rows(self, start, end, sort, order):
+        if self.lazy_listing:
+            children = self.model.slice(
+                start, end,
+                **self.lazy_listing_query(sort=sort, order=order)
+            )
+            return [self.row_data(child) for child in children]
         raise NotImplementedError("Abstract table does not implement "
                                   "``sorted_rows``.")
 
+    def row_data(self, node):
+        raise NotImplementedError("Abstract table does not implement "
+                                  "``row_data``.")
+
 
 class TableSlice(object):
 
@@ -180,18 +298,16 @@ class TableSlice(object):
 
     @property
     def slice(self):
-        current = int(self.request.params.get('b_page', '0'))
-        start = current * self.table_tile.slicesize
-        end = start + self.table_tile.slicesize
-        return start, end
+        return self.table_tile.render_context.slice
 
     @property
     def rows(self):
-        start, end = self.slice
+        render_context = self.table_tile.render_context
+        start, end = render_context.slice
         return self.table_tile.sorted_rows(
             start, end,
-            self.table_tile.sort_column,
-            self.table_tile.sort_order)
+            render_context.sort_column,
+            render_context.sort_order)
 
 
 class TableBatch(Batch):
@@ -205,27 +321,27 @@ class TableBatch(Batch):
 
     @property
     def display(self):
-        return len(self.vocab) > 1
+        return len(self._batch_vocab) > 1
 
     @property
     def vocab(self):
-        ret = list()
-        path = node_path(self.model)
-        count = self.table_tile.item_count
-        slicesize = self.table_tile.slicesize
+        path = node_path(self.model, self.request)
+        render_context = self.table_tile.render_context
+        count = render_context.item_count
+        slicesize = render_context.slicesize
         pages = count // slicesize
         if count % slicesize != 0:
             pages += 1
-        current = self.request.params.get('b_page', '0')
+        current = render_context.current_page
         params = {
-            'sort': self.table_tile.sort_column,
-            'order': self.table_tile.sort_order,
+            'sort': render_context.sort_column,
+            'order': render_context.sort_order,
             'size': slicesize,
-            'term': self.table_tile.filter_term,
+            'term': render_context.filter_term,
         }
-        for term in self.table_tile.query_whitelist:
-            params[term] = self.request.params.get(term, '')
-        for i in range(pages):
+        params.update(render_context.whitelist_params)
+
+        def create_page(i):
             params['b_page'] = str(i)
             query = make_query(**params)
             url = make_url(
@@ -234,10 +350,13 @@ class TableBatch(Batch):
                 # resource=self.related_view,
                 query=query
             )
-            ret.append({
+            return {
                 'page': '%i' % (i + 1),
                 'current': current == str(i),
                 'visible': True,
                 'url': url,
-            })
-        return ret
+            }
+        position = int(current) if current.isdigit() else -1
+        if str(position) != current:
+            position = -1
+        return BatchVocab(pages, create_page, current=position)
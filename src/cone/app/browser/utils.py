@@ -4,6 +4,7 @@ from cone.app.utils import format_traceback as _format_traceback
 from cone.app.utils import safe_encode
 from cone.app.utils import safe_decode
 from pyramid.i18n import TranslationStringFactory
+from pyramid.threadlocal import get_current_request
 import copy
 import datetime
 import re
@@ -17,9 +18,60 @@ def authenticated(request):
     return request.authenticated_userid
 
 
-def node_path(node):
+# Request environ key of node path cache
+NODE_PATH_CACHE_KEY = 'cone.app.node_paths'
+
+
+def _path_storage(request):
+    environ = getattr(request, 'environ', None)
+    if environ is None:
+        return None
+    return environ.setdefault(NODE_PATH_CACHE_KEY, dict())
+
+
+def _cached_paths(node, storage):
+    """Return tuple containing decoded and quoted path of node.
+
+    Cache entries are validated against name and parent of node and against
+    the cached paths of parent, thus renamed or moved nodes and their
+    descendants get recomputed.
+    """
+    parent = node.__parent__
+    if parent is None:
+        parent_paths = ((), ())
+    else:
+        parent_paths = _cached_paths(parent, storage)
+    name = node.__name__
+    entry = storage.get(id(node))
+    if entry is not None \
+            and entry[0] is node \
+            and entry[1] == name \
+            and entry[2] is parent_paths:
+        return entry[3]
+    if name is None:
+        paths = parent_paths
+    else:
+        name = safe_decode(name)
+        paths = (
+            parent_paths[0] + (name,),
+            parent_paths[1] + (compat.quote(safe_encode(name)),)
+        )
+    storage[id(node)] = (node, node.__name__, parent_paths, paths)
+    return paths
+
+
+def node_path(node, request=None):
+    """Return list of decoded path elements of node.
+
+    Paths are cached for the lifetime of the request.
+    """
     # XXX: implement in ``BaseNode``.
-    return [safe_decode(p) for p in node.path if p is not None]
+    if request is None:
+        request = get_current_request()
+    storage = _path_storage(request)
+    if storage is None or not hasattr(node, '__parent__'):
+        return [safe_decode(p) for p in node.path if p is not None]
+    return list(_cached_paths(node, storage)[0])
 
 
 # B/C, removed as of cone.app 1.1
@@ -57,11 +109,17 @@ def make_url(request, path=None, node=None, resource=None, query=None):
         path = []
     else:
         path = copy.copy(path)
-    if node is not None:
-        path = node_path(node)
-    if resource is not None:
-        path.append(resource)
-    path = [compat.quote(safe_encode(it)) for it in path]
+    storage = _path_storage(request) if node is not None else None
+    if storage is not None and hasattr(node, '__parent__'):
+        path = list(_cached_paths(node, storage)[1])
+        if resource is not None:
+            path.append(compat.quote(safe_encode(resource)))
+    else:
+        if node is not None:
+            path = node_path(node)
+        if resource is not None:
+            path.append(resource)
+        path = [compat.quote(safe_encode(it)) for it in path]
     url = '{}/{}'.format(request.application_url, '/'.join(path))
     if not query:
         return url
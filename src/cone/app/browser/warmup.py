@@ -0,0 +1,106 @@
+from chameleon.loader import ModuleLoader
+from chameleon.template import BaseTemplate
+from collections import OrderedDict
+from cone.app.utils import format_traceback
+from cone.tile import ITile
+from pyramid.renderers import RendererHelper
+from pyramid_chameleon.renderer import template_renderer_factory
+from pyramid_chameleon.zpt import ZPTTemplateRenderer
+import importlib
+import logging
+import os
+import time
+
+
+logger = logging.getLogger('cone.app')
+
+
+def configure_template_cache(directory):
+    """Persist compiled templates as python modules in directory.
+
+    Compiled modules are named by template path and content digest, thus the
+    directory can be shared between workers and deployments.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    BaseTemplate.loader = ModuleLoader(directory, False)
+
+
+def package_templates(package):
+    """Return sorted list of asset specs of all page templates contained in
+    package.
+    """
+    module = importlib.import_module(package)
+    base = os.path.dirname(os.path.abspath(module.__file__))
+    specs = list()
+    for directory, dirnames, filenames in os.walk(base):
+        dirnames[:] = [name for name in dirnames if name != 'tests']
+        for filename in filenames:
+            if not filename.endswith('.pt'):
+                continue
+            path = os.path.relpath(os.path.join(directory, filename), base)
+            specs.append('{}:{}'.format(package, path.replace(os.sep, '/')))
+    return sorted(specs)
+
+
+def tile_templates(registry):
+    """Return sorted list of template paths of registered tiles.
+    """
+    paths = set()
+    for registration in registry.registeredAdapters():
+        if registration.provided is not ITile:
+            continue
+        # secured tiles are wrapped
+        factory = registration.factory
+        factory = getattr(factory, '__call_permissive__', factory)
+        path = getattr(factory, 'path', None)
+        if path:
+            paths.add(path)
+    return sorted(paths)
+
+
+def warmup_templates(registry, packages=None):
+    """Compile templates of registered tiles and all templates contained in
+    packages.
+
+    :param registry: Application registry.
+    :param packages: List of package names to search for templates. Defaults
+        to ``['cone.app']``.
+    :return: ``OrderedDict`` containing template path and compile time in
+        seconds.
+    """
+    if packages is None:
+        packages = ['cone.app']
+    paths = list()
+    for package in packages:
+        try:
+            paths.extend(package_templates(package))
+        except ImportError:
+            logger.error('Cannot warmup templates of {}'.format(package))
+    for path in tile_templates(registry):
+        if path not in paths:
+            paths.append(path)
+    timings = OrderedDict()
+    for path in paths:
+        start = time.time()
+        try:
+            info = RendererHelper(name=path, registry=registry)
+            renderer = template_renderer_factory(info, ZPTTemplateRenderer)
+            renderer.template.cook_check()
+        except Exception:
+            msg = 'Failed to compile template {}:\n{}'.format(
+                path,
+                format_traceback()
+            )
+            logger.error(msg)
+            continue
+        timings[path] = time.time() - start
+        logger.info('Compiled template {} in {:.3f}s'.format(
+            path,
+            timings[path]
+        ))
+    logger.info('Compiled {} templates in {:.3f}s'.format(
+        len(timings),
+        sum(timings.values())
+    ))
+    return timings
@@ -1,11 +1,13 @@
 try:  # pragma: no cover
     from urllib2 import quote
     from urllib2 import unquote
+    from StringIO import StringIO
     import ConfigParser as configparser
     import urlparse
 except ImportError:  # pragma: no cover
     from urllib.parse import quote
     from urllib.parse import unquote
+    from io import StringIO
     import configparser
     import urllib.parse as urlparse
 import sys
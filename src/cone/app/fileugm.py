@@ -0,0 +1,436 @@
+from cone.app.utils import file_stat
+from cone.app.utils import write_file_atomic
+from contextlib import contextmanager
+from node.compat import UNICODE_TYPE
+from node.ext.ugm import file
+from node.utils import UNSET
+from odict import odict
+import base64
+import os
+
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+ENCODING = file.ENCODING
+
+# Number of journal entries after which a storage file gets compacted
+JOURNAL_COMPACT_THRESHOLD = 1000
+
+
+def encode_value(value):
+    if isinstance(value, UNICODE_TYPE):
+        return value.encode(ENCODING)
+    if value is None or value is UNSET:
+        return b''
+    return b'b64:' + base64.b64encode(value)
+
+
+def decode_value(value):
+    if value.startswith(b'b64:'):
+        return base64.b64decode(value[4:])
+    return value.decode(ENCODING)
+
+
+class ChangeTrackingOdict(odict):
+    """Ordered dict remembering keys changed since last write.
+    """
+
+    def __init__(self, data=()):
+        self.changed = set()
+        super(ChangeTrackingOdict, self).__init__(data)
+
+    def __setitem__(self, key, value):
+        super(ChangeTrackingOdict, self).__setitem__(key, value)
+        self.changed.add(key)
+
+    def __delitem__(self, key):
+        super(ChangeTrackingOdict, self).__delitem__(key)
+        self.changed.add(key)
+
+    def clear(self):
+        self.changed.update(self.keys())
+        super(ChangeTrackingOdict, self).clear()
+
+
+class JournalFileStorage(object):
+    """Mixin for ``node.ext.ugm.file.FileStorage`` based nodes persisting only
+    changed entries.
+
+    If ``journal`` is set, changes are appended to a journal file next to the
+    storage file, which gets compacted into the storage file after
+    ``compact_threshold`` entries. Otherwise the storage file gets rewritten
+    if changed. Files are replaced atomically.
+    """
+    journal = True
+    compact_threshold = JOURNAL_COMPACT_THRESHOLD
+    _file_stat = None
+    _journal_offset = 0
+    _journal_entries = 0
+
+    @property
+    def journal_path(self):
+        return '{}.journal'.format(self.file_path)
+
+    @property
+    def storage(self):
+        if self._storage_data is None:
+            self._storage_data = ChangeTrackingOdict()
+            self._file_stat = None
+            self._journal_offset = 0
+            self._journal_entries = 0
+            if self.file_path:
+                self.read_file()
+        return self._storage_data
+
+    def read_file(self):
+        data = self._storage_data
+        delimiter = self._delimiter
+        if os.path.isfile(self.file_path):
+            with open(self.file_path, 'rb') as f:
+                self._file_stat = file_stat(self.file_path)
+                for line in f:
+                    idx = line.find(delimiter)
+                    if idx == -1:
+                        # malformed line, ignore
+                        continue
+                    key = line[:idx].decode(ENCODING)
+                    value = line[idx + len(delimiter):].strip(b'\n')
+                    data[key] = decode_value(value)
+        if self.journal:
+            self._read_journal()
+        data.changed.clear()
+
+    def write_file(self):
+        data = self._storage_data
+        if data is None:
+            if self.file_path and not os.path.exists(self.file_path):
+                with open(self.file_path, 'wb') as f:
+                    f.write(b'')
+            return
+        if not data.changed:
+            return
+        if not self.journal:
+            self._write_storage_file()
+            data.changed.clear()
+            self.storage_changed()
+            return
+        with self._locked_journal() as f:
+            if file_stat(self.file_path) != self._file_stat:
+                # storage file compacted by another process
+                data = self._reload()
+            else:
+                self._read_journal()
+            delimiter = self._delimiter
+            lines = list()
+            for key in sorted(data.changed):
+                if key in data:
+                    lines.append(b'+' + delimiter.join([
+                        key.encode(ENCODING),
+                        encode_value(data[key])
+                    ]) + b'\n')
+                else:
+                    lines.append(b'-' + key.encode(ENCODING) + b'\n')
+            f.write(b''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_offset = f.tell()
+            self._journal_entries += len(lines)
+            data.changed.clear()
+            if self._journal_entries > self.compact_threshold:
+                self._compact(f)
+        self.storage_changed()
+
+    def compact(self):
+        """Write storage file and truncate journal.
+        """
+        self.write_file()
+        with self._locked_journal() as f:
+            self._compact(f)
+
+    def sync(self):
+        """Apply changes persisted by other processes.
+
+        Only appended journal entries are read unless the storage file has
+        been compacted meanwhile.
+        """
+        if self._storage_data is None:
+            return
+        if file_stat(self.file_path) != self._file_stat:
+            self._reload()
+            self.storage_changed()
+            return
+        if self.journal:
+            entries = self._journal_entries
+            self._read_journal()
+            if self._journal_entries != entries:
+                self.storage_changed()
+
+    def invalidate(self, key=None):
+        self.sync()
+
+    def storage_changed(self):
+        """Gets called after changes have been written or changes of other
+        processes have been read.
+        """
+
+    @property
+    def _delimiter(self):
+        delimiter = self.delimiter
+        if isinstance(delimiter, UNICODE_TYPE):
+            delimiter = delimiter.encode(ENCODING)
+        return delimiter
+
+    @contextmanager
+    def _locked_journal(self):
+        with open(self.journal_path, 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _read_journal(self):
+        path = self.journal_path
+        if not os.path.isfile(path):
+            return
+        data = self._storage_data
+        # keep local changes not written yet
+        pending = set(data.changed)
+        delimiter = self._delimiter
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self._journal_offset:
+                # journal truncated, storage file gets reloaded
+                self._file_stat = None
+                return
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # incomplete entry, gets read on next sync
+                    break
+                self._journal_offset += len(line)
+                self._journal_entries += 1
+                op, entry = line[:1], line[1:-1]
+                if op == b'+':
+                    idx = entry.find(delimiter)
+                    if idx == -1:
+                        continue
+                    key = entry[:idx].decode(ENCODING)
+                    if key not in pending:
+                        data[key] = decode_value(entry[idx + len(delimiter):])
+                elif op == b'-':
+                    key = entry.decode(ENCODING)
+                    if key not in pending and key in data:
+                        del data[key]
+        data.changed = pending
+
+    def _reload(self):
+        data = self._storage_data
+        pending = list()
+        for key in data.changed:
+            pending.append((key, data[key] if key in data else UNSET))
+        self._storage_data = None
+        data = self.storage
+        for key, value in pending:
+            if value is UNSET:
+                if key in data:
+                    del data[key]
+                else:
+                    data.changed.add(key)
+            else:
+                data[key] = value
+        return data
+
+    def _write_storage_file(self):
+        delimiter = self._delimiter
+        lines = list()
+        for key, value in self._storage_data.items():
+            lines.append(delimiter.join([
+                key.encode(ENCODING),
+                encode_value(value)
+            ]) + b'\n')
+        write_file_atomic(self.file_path, b''.join(lines))
+        self._file_stat = file_stat(self.file_path)
+
+    def _compact(self, journal):
+        self._write_storage_file()
+        journal.truncate(0)
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+
+class UserAttributes(JournalFileStorage, file.UserAttributes):
+    journal = False
+
+
+class GroupAttributes(JournalFileStorage, file.GroupAttributes):
+    journal = False
+
+
+class RoleAttributes(JournalFileStorage, file.FileAttributes):
+    delimiter = '::'
+
+    def storage_changed(self):
+        self.parent.principals_changed()
+
+
+class User(file.User):
+
+    def attributes_factory(self, name=None, parent=None):
+        user_data_dir = os.path.join(parent.data_directory, 'users')
+        if not os.path.exists(user_data_dir):
+            os.makedirs(user_data_dir)
+        user_data_path = os.path.join(user_data_dir, parent.name)
+        return UserAttributes(name, parent, user_data_path)
+
+
+class Group(file.Group):
+
+    def attributes_factory(self, name=None, parent=None):
+        group_data_dir = os.path.join(parent.data_directory, 'groups')
+        if not os.path.exists(group_data_dir):
+            os.makedirs(group_data_dir)
+        group_data_path = os.path.join(group_data_dir, parent.name)
+        return GroupAttributes(name, parent, group_data_path)
+
+
+class PrincipalsMixin(JournalFileStorage):
+    """Mixin for users and groups containers.
+    """
+    principal_factory = None
+
+    def __getitem__(self, key):
+        # access storage, if key not contained, KeyError is raised
+        self.storage[key]
+        try:
+            return self._mem_storage[key]
+        except KeyError:
+            principal = self._mem_storage[key] = self.principal_factory(
+                name=key,
+                parent=self,
+                data_directory=self.data_directory
+            )
+            return principal
+
+    def __call__(self, from_parent=False):
+        # only write principals which have been accessed
+        self.write_file()
+        for principal in list(self._mem_storage.values()):
+            principal.attrs()
+        self._remove_principal_data()
+        if not from_parent:
+            self.parent.attrs()
+            other = self.parent.groups \
+                if self.name == 'users' else self.parent.users
+            other(from_parent=True)
+
+    def create(self, id, **kw):
+        principal = self.principal_factory(
+            name=id,
+            parent=self,
+            data_directory=self.data_directory
+        )
+        for k, v in kw.items():
+            principal.attrs[k] = v
+        self[id] = principal
+        return principal
+
+    def invalidate(self, key=None):
+        if key is None:
+            # principal attributes are read again on access
+            self._mem_storage.clear()
+        else:
+            self._mem_storage.pop(key, None)
+        self.sync()
+
+    def storage_changed(self):
+        self.parent.principals_changed()
+
+
+class Users(PrincipalsMixin, file.Users):
+    principal_factory = User
+
+    def _remove_principal_data(self):
+        for user_id in self._user_data_to_remove:
+            path = os.path.join(self.data_directory, 'users', user_id)
+            if os.path.exists(path):
+                os.remove(path)
+        self._user_data_to_remove = list()
+
+
+class Groups(PrincipalsMixin, file.Groups):
+    principal_factory = Group
+
+    def _remove_principal_data(self):
+        for group_id in self._group_data_to_remove:
+            path = os.path.join(self.data_directory, 'groups', group_id)
+            if os.path.exists(path):
+                os.remove(path)
+        self._group_data_to_remove = list()
+
+
+class Ugm(file.Ugm):
+    """File based UGM implementation persisting changes incremental.
+
+    Users, groups and roles are kept in memory once read. Changes get
+    appended to journal files instead of rewriting entire files, thus writing
+    is proportional to the size of the change. ``invalidate`` only reads
+    journal entries appended by other processes.
+
+    ``on_change`` gets called without arguments after changed users, groups
+    or roles have been written or read from journal files.
+    """
+    on_change = None
+
+    def __init__(self, name=None, parent=None, users_file=None,
+                 groups_file=None, roles_file=None, data_directory=None,
+                 compact_threshold=JOURNAL_COMPACT_THRESHOLD):
+        super(Ugm, self).__init__(
+            name=name,
+            parent=parent,
+            users_file=users_file,
+            groups_file=groups_file,
+            roles_file=roles_file,
+            data_directory=data_directory
+        )
+        self.compact_threshold = compact_threshold
+
+    def __getitem__(self, key):
+        if key not in self.storage:
+            self._chk_key(key)
+            if key == 'users':
+                principals = Users(
+                    file_path=self.users_file,
+                    data_directory=self.data_directory
+                )
+            else:
+                principals = Groups(
+                    file_path=self.groups_file,
+                    data_directory=self.data_directory
+                )
+            principals.compact_threshold = self.compact_threshold
+            self[key] = principals
+        return self.storage[key]
+
+    def attributes_factory(self, name=None, parent=None):
+        attrs = RoleAttributes(name, parent, parent.roles_file)
+        attrs.compact_threshold = self.compact_threshold
+        return attrs
+
+    def invalidate(self, key=None):
+        if key is not None:
+            if key in self.storage:
+                self.storage[key].invalidate()
+            return
+        for principals in self.storage.values():
+            principals.invalidate()
+        self.attrs.invalidate()
+
+    def principals_changed(self):
+        if self.on_change is not None:
+            self.on_change()
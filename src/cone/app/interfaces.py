@@ -137,6 +137,54 @@ class ICopySupport(INode):
     supports_paste = Attribute(u"Supports paste")
 
 
+class IChildSortIndex(INode):
+    """Sorted indices of children.
+    """
+    child_sort_keys = Attribute(u"Dict containing sort key functions for "
+                                u"children by sort name.")
+
+    def sorted_child_keys(sort, reverse=False):
+        """Return iterator of child keys sorted by sort name.
+        """
+
+    def reindex_child(name):
+        """Update indices for child by name. Must be called if child data
+        relevant for sorting changes.
+        """
+
+    def unindex_child(name):
+        """Remove child by name from indices.
+        """
+
+    def rebuild_child_sort_index():
+        """Rebuild indices for all children.
+        """
+
+
+class ILazyListing(INode):
+    """Listing of children which gets paged, sorted and filtered by the node
+    itself. Used by table tiles instead of loading all children, thus
+    backends can push paging, sorting and filtering down.
+    """
+
+    permission_filtered = Attribute(
+        u"Optional flag whether ``count`` and ``slice`` only consider "
+        u"children viewable by ``principals``, which get passed as keyword "
+        u"argument containing the effective principals of the request"
+    )
+
+    def count(term=None, principals=None):
+        """Return number of listable children, optionally filtered by term.
+        """
+
+    def slice(start, end, sort=None, order=None, term=None, principals=None):
+        """Return list of listable children from start to end.
+
+        ``sort`` is the name of the sort key, ``order`` either ``asc`` or
+        ``desc``. If ``term`` given, children get filtered by term.
+        """
+
+
 class IUUIDAsName(IUUIDAware):
     """Exposes ``self.uuid`` as ``self.__name__``. Considers key changes in
     node trees at copy time.
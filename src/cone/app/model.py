@@ -1,8 +1,10 @@
 from cone.app.compat import configparser
 from cone.app.compat import IS_PY2
 from cone.app.compat import ITER_TYPES
+from cone.app.compat import StringIO
 from cone.app.interfaces import IAdapterNode
 from cone.app.interfaces import IApplicationNode
+from cone.app.interfaces import IChildSortIndex
 from cone.app.interfaces import ICopySupport
 from cone.app.interfaces import IFactoryNode
 from cone.app.interfaces import ILayout
@@ -11,10 +13,13 @@ from cone.app.interfaces import INodeInfo
 from cone.app.interfaces import IProperties
 from cone.app.interfaces import IUUIDAsName
 from cone.app.security import acl_registry
+from cone.app.security import has_permission
 from cone.app.utils import app_config
 from cone.app.utils import DatetimeHelper
+from cone.app.utils import file_stat
 from cone.app.utils import safe_decode
 from cone.app.utils import safe_encode
+from cone.app.utils import write_file_atomic
 from node.behaviors import Adopt
 from node.behaviors import AsAttrAccess
 from node.behaviors import Attributes
@@ -27,6 +32,7 @@ from node.behaviors import Nodify
 from node.behaviors import OdictStorage
 from node.behaviors import UUIDAware
 from node.behaviors import VolatileStorageInvalidate
+from node.events import NodeModifiedEvent
 from node.interfaces import IOrdered
 from node.interfaces import IUUIDAware
 from node.utils import instance_property
@@ -34,6 +40,7 @@ from odict import odict
 from plumber import Behavior
 from plumber import default
 from plumber import finalize
+from plumber import plumb
 from plumber import plumbing
 from pyramid.i18n import TranslationStringFactory
 from pyramid.security import ALL_PERMISSIONS
@@ -42,9 +49,14 @@ from pyramid.security import Deny
 from pyramid.security import Everyone
 from pyramid.threadlocal import get_current_registry
 from pyramid.threadlocal import get_current_request
+from zope.component.event import objectEventNotify
 from zope.interface import implementer
+import atexit
+import bisect
+import datetime
 import logging
 import os
+import threading
 
 
 logger = logging.getLogger('cone.app')
@@ -285,9 +297,212 @@ class CopySupport(Behavior):
     supports_paste = default(True)
 
 
+FAR_PAST = datetime.datetime(2000, 1, 1)
+
+
+# Lock for building and updating child sort indices
+_child_sort_lock = threading.RLock()
+
+
+@implementer(IChildSortIndex)
+class ChildSortIndex(Behavior):
+    """Plumbing behavior maintaining sorted indices of children.
+
+    Indices get built on first access and are updated when children get added
+    or deleted. If sort relevant data of a child changes, ``node_modified``
+    must be called with the child, which is done by the edit forms.
+
+    Indices are kept on the node instance, thus they only pay off for
+    persistent container nodes shared between requests. Nodes created per
+    request rebuild the indices on each request.
+    """
+    child_sort_keys = default({
+        'title': lambda x: (x.metadata.title or '').lower(),
+        'creator': lambda x: (x.metadata.creator or '').lower(),
+        'created': lambda x: x.metadata.created or FAR_PAST,
+        'modified': lambda x: x.metadata.modified or FAR_PAST,
+    })
+
+    @plumb
+    def __setitem__(_next, self, key, value):
+        _next(self, key, value)
+        if getattr(self, '_child_sort_index', None) is not None:
+            self.reindex_child(key)
+
+    @plumb
+    def __delitem__(_next, self, key):
+        _next(self, key)
+        if getattr(self, '_child_sort_index', None) is not None:
+            self.unindex_child(key)
+
+    @default
+    def rebuild_child_sort_index(self):
+        with _child_sort_lock:
+            index = dict([(sort, list()) for sort in self.child_sort_keys])
+            values = dict()
+            for key, child in self.items():
+                values[key] = self._child_sort_entries(key, child)
+            for entries in values.values():
+                for sort, entry in entries.items():
+                    index[sort].append(entry)
+            for entries in index.values():
+                entries.sort()
+            self._child_sort_values = values
+            self._child_sort_index = index
+
+    @default
+    def reindex_child(self, name):
+        with _child_sort_lock:
+            if getattr(self, '_child_sort_index', None) is None:
+                return
+            self.unindex_child(name)
+            entries = self._child_sort_entries(name, self[name])
+            self._child_sort_values[name] = entries
+            for sort, entry in entries.items():
+                bisect.insort(self._child_sort_index[sort], entry)
+
+    @default
+    def unindex_child(self, name):
+        with _child_sort_lock:
+            if getattr(self, '_child_sort_index', None) is None:
+                return
+            entries = self._child_sort_values.pop(name, None)
+            if entries is None:
+                return
+            for sort, entry in entries.items():
+                index = self._child_sort_index[sort]
+                position = bisect.bisect_left(index, entry)
+                if position < len(index) and index[position] == entry:
+                    del index[position]
+
+    @default
+    def sorted_child_keys(self, sort, reverse=False):
+        with _child_sort_lock:
+            if getattr(self, '_child_sort_index', None) is None:
+                self.rebuild_child_sort_index()
+            # copy keys, index may change while iterating
+            keys = [entry[1] for entry in self._child_sort_index[sort]]
+        if reverse:
+            keys.reverse()
+        return iter(keys)
+
+    @default
+    def _child_sort_entries(self, key, child):
+        return dict([
+            (sort, (sort_key(child), key))
+            for sort, sort_key in self.child_sort_keys.items()
+        ])
+
+
+def node_modified(node):
+    """Announce modification of node.
+
+    Reindexes node in the child sort index of its parent and notifies
+    ``NodeModifiedEvent``, which updates the fulltext index and invalidates
+    the navigation cache if enabled.
+    """
+    parent = node.parent
+    if parent is not None and IChildSortIndex.providedBy(parent):
+        parent.reindex_child(node.name)
+    objectEventNotify(NodeModifiedEvent(node))
+
+
+def _data_getattr(self, key):
+    if key == '_data':
+        # data not initialized yet, e.g. while unpickling
+        raise AttributeError(key)
+    return self._data.get(key)
+
+
+class _field(property):
+    """Marker for descriptors compiled by ``PropertiesType``.
+    """
+
+
+def _data_field(name):
+    def get(self):
+        return self._data.get(name)
+    return _field(get)
+
+
+def _delegating_field(name):
+    def get(self):
+        return self.__getattr__(name)
+    return _field(get)
+
+
+def _defined_attribute(cls, name):
+    """Return ``True`` if name is explicitly defined on cls or its bases.
+    """
+    for base in cls.__mro__:
+        if name in base.__dict__:
+            return not isinstance(base.__dict__[name], _field)
+    return False
+
+
+class PropertiesType(type):
+    """Compiles names declared in ``fields`` of properties classes and their
+    bases to class level descriptors.
+
+    Reading declared fields skips the failing instance attribute lookup
+    preceding ``__getattr__``. Classes overriding ``__getattr__`` get
+    descriptors delegating to it, thus access semantics are kept.
+    """
+
+    def __init__(cls, name, bases, dct):
+        super(PropertiesType, cls).__init__(name, bases, dct)
+        fields = set()
+        for base in cls.__mro__:
+            fields.update(base.__dict__.get('fields', ()))
+        getattr_ = None
+        for base in cls.__mro__:
+            if '__getattr__' in base.__dict__:
+                getattr_ = base.__dict__['__getattr__']
+                break
+        if getattr_ is _data_getattr:
+            field_factory = _data_field
+        else:
+            field_factory = _delegating_field
+        for field in fields:
+            # explicitly defined attributes win, also if inherited
+            if not _defined_attribute(cls, field):
+                setattr(cls, field, field_factory(field))
+
+
+PropertiesBase = PropertiesType('PropertiesBase', (object,), {
+    '__slots__': ()
+})
+
+
 @implementer(IProperties)
-class Properties(object):
-    # XXX: extend by schema
+class Properties(PropertiesBase):
+    """Attribute access to a data dict.
+
+    Names declared in ``fields`` are compiled to descriptors by
+    ``PropertiesType``. All other names fall back to ``__getattr__``.
+    """
+    __slots__ = ('_data',)
+    fields = (
+        'action_add_reference',
+        'action_delete',
+        'action_delete_children',
+        'action_delete_tile',
+        'action_edit',
+        'action_list',
+        'action_up',
+        'action_up_tile',
+        'action_view',
+        'default_child',
+        'default_content_tile',
+        'hide_if_default',
+        'icon',
+        'in_navtree',
+        'is_navroot',
+        'leaf',
+        'mainmenu_display_children',
+        'mainmenu_empty_title',
+        'skip_mainmenu',
+    )
 
     def __init__(self, data=None):
         if data is None:
@@ -295,31 +510,49 @@ class Properties(object):
         object.__setattr__(self, '_data', data)
 
     def _get_data(self):
-        return object.__getattribute__(self, '_data')
+        return self._data
 
     def __setitem__(self, key, value):
         setattr(self, key, value)
 
     def __getitem__(self, key):
-        return self._get_data()[key]
+        return self._data[key]
 
     def get(self, key, default=None):
-        return self._get_data().get(key, default)
+        return self._data.get(key, default)
 
     def __contains__(self, key):
-        return key in self._get_data()
+        return key in self._data
 
-    def __getattr__(self, key):
-        return self._get_data().get(key)
+    __getattr__ = _data_getattr
 
     def __setattr__(self, key, value):
-        self._get_data()[key] = value
+        self._data[key] = value
 
     def keys(self):
-        return self._get_data().keys()
+        return self._data.keys()
+
+    def __getstate__(self):
+        state = dict()
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                try:
+                    state[name] = object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
+        try:
+            state.update(object.__getattribute__(self, '__dict__'))
+        except AttributeError:
+            pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
 
 
 class ProtectedProperties(Properties):
+    __slots__ = ('_context', '_permissions')
 
     def __init__(self, context, permissions, data=None):
         """
@@ -342,7 +575,7 @@ class ProtectedProperties(Properties):
             return True
         request = get_current_request()
         for permission in required:
-            if request.has_permission(permission, context):
+            if has_permission(request, permission, context):
                 return True
         return False
 
@@ -374,6 +607,7 @@ class ProtectedProperties(Properties):
 
 @implementer(ILayout)
 class Layout(Properties):
+    __slots__ = ()
 
     def __init__(self, model=None):
         super(Layout, self).__init__()
@@ -382,12 +616,162 @@ class Layout(Properties):
 
 @implementer(IMetadata)
 class Metadata(Properties):
-    pass
+    __slots__ = ()
+    fields = (
+        'created',
+        'creator',
+        'description',
+        'modified',
+        'title',
+    )
 
 
 @implementer(INodeInfo)
 class NodeInfo(Properties):
-    pass
+    __slots__ = ()
+    fields = (
+        'addables',
+        'description',
+        'factory',
+        'icon',
+        'node',
+        'title',
+    )
+
+
+# Delay in seconds for coalescing writes of file based properties. ``0``
+# writes immediately. Pending writes are only visible in the process which
+# made them, other processes read the outdated file until written
+PROPERTIES_WRITE_DELAY = 0
+
+
+class PropertiesWriter(object):
+    """Writer for files of file based properties.
+
+    Files are written atomically. If ``PROPERTIES_WRITE_DELAY`` is set,
+    writing is deferred and multiple writes to the same file within the delay
+    are coalesced to a single write of the latest data. Data failed to write
+    is kept pending and written again on next flush.
+    """
+
+    def __init__(self):
+        self.pending = odict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def write(self, path, data):
+        """Write data to file at path.
+
+        :param path: Path of the file to write.
+        :param data: Bytes to write.
+        """
+        delay = PROPERTIES_WRITE_DELAY
+        if not delay:
+            with self._flush_lock:
+                with self._lock:
+                    self.pending.pop(path, None)
+                write_file_atomic(path, data)
+            return
+        with self._lock:
+            self.pending[path] = data
+            self._schedule(delay)
+
+    def read(self, path):
+        """Return data pending to be written to path or ``None``.
+        """
+        with self._lock:
+            return self.pending.get(path)
+
+    def flush(self, raise_errors=False):
+        """Write all pending data.
+
+        Failures get logged and the failed data is kept pending. If
+        ``raise_errors`` is set, the first failure is raised after all
+        pending data has been tried to write.
+        """
+        errors = list()
+        with self._flush_lock:
+            with self._lock:
+                timer = self._timer
+                self._timer = None
+                pending = list(self.pending.items())
+            if timer is not None:
+                timer.cancel()
+            for path, data in pending:
+                try:
+                    write_file_atomic(path, data)
+                except Exception as e:
+                    logger.error(
+                        'Failed to write properties file {}: {}'.format(
+                            path, e
+                        )
+                    )
+                    errors.append(e)
+                    continue
+                # pending data is removed after writing, thus readers never
+                # see outdated files. Data written meanwhile is kept
+                with self._lock:
+                    if self.pending.get(path) is data:
+                        del self.pending[path]
+            if errors and PROPERTIES_WRITE_DELAY:
+                # retry failed writes after delay
+                with self._lock:
+                    self._schedule(PROPERTIES_WRITE_DELAY)
+        if errors and raise_errors:
+            raise errors[0]
+
+    def _schedule(self, delay):
+        # expects ``_lock`` to be acquired
+        if self._timer is None:
+            timer = self._timer = threading.Timer(delay, self.flush)
+            timer.daemon = True
+            timer.start()
+
+
+properties_writer = PropertiesWriter()
+atexit.register(properties_writer.flush)
+
+
+def flush_properties():
+    """Write pending changes of file based properties. Raises the first write
+    failure, failed changes are kept pending.
+    """
+    properties_writer.flush(raise_errors=True)
+
+
+PARSED_FILE_CACHE_MAX_SIZE = 1000
+
+
+class ParsedFileCache(object):
+    """Process wide cache for parsed properties files.
+
+    Entries are validated by inode, size and modification time of the file,
+    thus external changes to the files are recognized. Cached objects are
+    shared and must not be modified.
+    """
+
+    def __init__(self):
+        self.storage = dict()
+
+    def get(self, path, stat):
+        entry = self.storage.get(path)
+        if entry is not None and entry[0] == stat:
+            return entry[1]
+        return None
+
+    def set(self, path, stat, data):
+        storage = self.storage
+        if len(storage) >= PARSED_FILE_CACHE_MAX_SIZE:
+            storage.clear()
+        storage[path] = (stat, data)
+
+    def invalidate(self):
+        self.storage = dict()
+
+
+xml_properties_cache = ParsedFileCache()
+config_properties_cache = ParsedFileCache()
 
 
 class XMLProperties(Properties):
@@ -400,9 +784,8 @@ class XMLProperties(Properties):
         self._init()
 
     def __call__(self):
-        file = open(object.__getattribute__(self, '_path'), 'wb')
-        file.write(self._xml_repr())
-        file.close()
+        path = object.__getattribute__(self, '_path')
+        properties_writer.write(path, self._xml_repr())
 
     def __delitem__(self, name):
         data = object.__getattribute__(self, '_data')
@@ -420,15 +803,37 @@ class XMLProperties(Properties):
     #     object.__setattr__(self, '_path', path)
 
     def _init(self):
-        dth = DatetimeHelper()
         path = object.__getattribute__(self, '_path')
-        if not path or not os.path.exists(path):
+        if not path:
             return
-        file = open(path, 'r')
-        tree = etree.parse(file)
-        file.close()
-        root = tree.getroot()
+        pending = properties_writer.read(path)
+        if pending is not None:
+            parsed = self._parse(etree.fromstring(pending))
+        else:
+            stat = file_stat(path)
+            if stat is None:
+                return
+            parsed = xml_properties_cache.get(path, stat)
+            if parsed is None:
+                with open(path, 'rb') as file:
+                    tree = etree.parse(file)
+                parsed = self._parse(tree.getroot())
+                xml_properties_cache.set(path, stat, parsed)
         data = object.__getattribute__(self, '_data')
+        for key, value in parsed.items():
+            # parsed data is shared, copy mutable values
+            if isinstance(value, list):
+                value = list(value)
+            elif isinstance(value, odict):
+                value = odict(value.items())
+            data[key] = value
+
+    def _parse(self, root):
+        dth = DatetimeHelper()
+        data = odict()
+        # text values get converted in bulk
+        keys = list()
+        values = list()
         for elem in root.getchildren():
             children = elem.getchildren()
             if children:
@@ -441,19 +846,18 @@ class XMLProperties(Properties):
                         val[entry_elems[0].text] = entry_elems[1].text
                 # case list like
                 else:
-                    val = list()
-                    for subelem in children:
-                        value = subelem.text
-                        if not value:
-                            value = ''
-                        val.append(dth.r_value(value.strip()))
+                    val = dth.r_values([
+                        (subelem.text or '').strip() for subelem in children
+                    ])
                 data[elem.tag] = val
             else:
-                value = elem.text
-                if not value:
-                    value = ''
-                data[elem.tag] = dth.r_value(value.strip())
-        file.close()
+                # reserve position
+                data[elem.tag] = None
+                keys.append(elem.tag)
+                values.append((elem.text or '').strip())
+        for key, value in zip(keys, dth.r_values(values)):
+            data[key] = value
+        return data
 
     def _xml_repr(self):
         dth = DatetimeHelper()
@@ -497,35 +901,35 @@ class ConfigProperties(Properties):
 
     def __call__(self):
         path = object.__getattribute__(self, '_path')
-        config = self.config()
-        mode = 'wb' if IS_PY2 else 'w'
-        with open(path, mode) as configfile:
-            config.write(configfile)
+        configfile = StringIO()
+        self._read_config().write(configfile)
+        data = safe_encode(configfile.getvalue(), encoding=self.encoding)
+        properties_writer.write(path, data)
 
     def __getitem__(self, key):
         try:
-            value = self.config().get(self.properties_section, key)
+            value = self._read_config().get(self.properties_section, key)
             return safe_decode(value, encoding=self.encoding)
         except configparser.NoOptionError:
             raise KeyError(key)
 
     def get(self, key, default=None):
         try:
-            value = self.config().get(self.properties_section, key)
+            value = self._read_config().get(self.properties_section, key)
             return safe_decode(value, encoding=self.encoding)
         except configparser.NoOptionError:
             return default
 
     def __contains__(self, key):
         try:
-            self.config().get(self.properties_section, key)
+            self._read_config().get(self.properties_section, key)
             return True
         except configparser.NoOptionError:
             return False
 
     def __getattr__(self, name):
         try:
-            value = self.config().get(self.properties_section, name)
+            value = self._read_config().get(self.properties_section, name)
             return safe_decode(value, encoding=self.encoding)
         except configparser.NoOptionError:
             return None
@@ -535,29 +939,65 @@ class ConfigProperties(Properties):
         self.config().set(self.properties_section, name, value)
 
     def __delitem__(self, name):
-        config = self.config()
         try:
-            config.get(self.properties_section, name)
+            self._read_config().get(self.properties_section, name)
         except configparser.NoOptionError:
             raise KeyError(u"property %s does not exist" % name)
-        config.remove_option(self.properties_section, name)
+        self.config().remove_option(self.properties_section, name)
 
     def config(self):
+        """Return ``ConfigParser`` instance of this properties.
+
+        Parsed config files are shared among instances and get copied on
+        first write access, thus changes are private to this instance.
+        """
+        config = self._read_config()
+        if object.__getattribute__(self, '_config_shared'):
+            configfile = StringIO()
+            config.write(configfile)
+            config = self._parse_config(configfile.getvalue())
+            object.__setattr__(self, '_config', config)
+            object.__setattr__(self, '_config_shared', False)
+        return config
+
+    def _read_config(self):
         try:
             return object.__getattribute__(self, '_config')
         except AttributeError:
             pass
-        config = configparser.ConfigParser()
+        shared = False
         path = object.__getattribute__(self, '_path')
-        if os.path.exists(path):
-            config.read(path)
+        pending = properties_writer.read(path)
+        if pending is not None:
+            config = self._parse_config(pending)
         else:
-            config.add_section(self.properties_section)
+            stat = file_stat(path)
+            if stat is None:
+                config = configparser.ConfigParser()
+                config.add_section(self.properties_section)
+            else:
+                config = config_properties_cache.get(path, stat)
+                if config is None:
+                    config = configparser.ConfigParser()
+                    config.read(path)
+                    config_properties_cache.set(path, stat, config)
+                shared = True
         object.__setattr__(self, '_config', config)
-        return object.__getattribute__(self, '_config')
+        object.__setattr__(self, '_config_shared', shared)
+        return config
+
+    def _parse_config(self, data):
+        config = configparser.ConfigParser()
+        if IS_PY2:
+            config.readfp(StringIO(data))
+        else:
+            config.read_string(safe_decode(data, self.encoding))
+        return config
 
     def _init(self):
         data = object.__getattribute__(self, '_data')
+        if not data:
+            return
         config = self.config()
         for key, value in data.items():
             value = safe_encode(value, encoding=self.encoding) if IS_PY2 else str(value)
@@ -0,0 +1,274 @@
+from cone.app.utils import safe_decode
+from node.interfaces import INode
+from node.interfaces import INodeAddedEvent
+from node.interfaces import INodeDetachedEvent
+from node.interfaces import INodeModifiedEvent
+from node.interfaces import INodeRemovedEvent
+from zope.component import getSiteManager
+import threading
+
+
+FULLTEXT_FIELDS = ['title', 'description', 'creator']
+NGRAM_SIZE = 3
+
+
+def ngrams(value):
+    """Return set of n-grams contained in value.
+    """
+    return set([
+        value[i:i + NGRAM_SIZE]
+        for i in range(len(value) - NGRAM_SIZE + 1)
+    ])
+
+
+def node_by_path(root, path):
+    """Return node by path relative to root or ``None`` if not found.
+    """
+    node = root
+    try:
+        for name in path:
+            node = node[name]
+    except KeyError:
+        return None
+    return node
+
+
+class FulltextIndex(object):
+    """In-process inverted index over metadata of application model nodes.
+
+    Indexed metadata values are split into n-grams. Searching for a term
+    intersects the n-gram postings of the term and verifies the remaining
+    candidates by substring matching. Documents are identified by node path
+    relative to root.
+    """
+
+    def __init__(self, fields=FULLTEXT_FIELDS):
+        self.fields = fields
+        self.root = None
+        self.built = False
+        self.clear()
+        self._lock = threading.RLock()
+
+    def clear(self):
+        self.docs = dict()
+        self.postings = dict()
+        self.children = dict()
+        self.built = False
+
+    def path_for(self, node):
+        """Return path of node relative to root or ``None`` if node is not
+        contained in the tree of root.
+        """
+        path = list()
+        while node is not None:
+            if node is self.root:
+                return tuple(reversed(path))
+            path.append(node.name)
+            node = node.parent
+        return None
+
+    def build(self, root=None):
+        """Build index for all nodes of the tree of root.
+        """
+        with self._lock:
+            if root is not None:
+                self.root = root
+            self.clear()
+            stack = [((), self.root)]
+            while stack:
+                path, node = stack.pop()
+                if path:
+                    self._index(path, node)
+                for name, child in node.items():
+                    stack.append((path + (name,), child))
+            self.built = True
+
+    def ensure_built(self):
+        if not self.built and self.root is not None:
+            self.build()
+
+    def index(self, node, recursive=False):
+        """Index or reindex node and optionally its descendants.
+        """
+        with self._lock:
+            path = self.path_for(node)
+            if not path:
+                return
+            stack = [(path, node)]
+            while stack:
+                path, node = stack.pop()
+                self._unindex(path)
+                self._index(path, node)
+                if recursive:
+                    for name, child in node.items():
+                        stack.append((path + (name,), child))
+
+    def unindex(self, node, path=None):
+        """Remove node and its descendants from index.
+        """
+        with self._lock:
+            if path is None:
+                path = self.path_for(node)
+            if not path:
+                return
+            for descendant in self._descendants(path):
+                self._unindex(descendant)
+
+    def search(self, term, fields=None, parent=None):
+        """Return set of paths of nodes whose metadata contain term.
+
+        :param term: Search term. Gets lowercased.
+        :param fields: Metadata fields to search in. Defaults to all indexed
+            fields.
+        :param parent: Optional path of parent node. If given, only direct
+            children of parent are searched.
+        """
+        fields = fields if fields is not None else self.fields
+        term = safe_decode(term).lower()
+        with self._lock:
+            self.ensure_built()
+            candidates = None
+            if parent is not None:
+                candidates = self.children.get(tuple(parent), set())
+            postings = [
+                self.postings.get(gram, set()) for gram in ngrams(term)
+            ]
+            for posting in sorted(postings, key=len):
+                if candidates is None:
+                    candidates = posting
+                else:
+                    candidates = candidates & posting
+                if not candidates:
+                    return set()
+            if candidates is None:
+                candidates = self.docs.keys()
+            elif len(term) == NGRAM_SIZE and list(fields) == self.fields:
+                # postings of term are exact matches
+                return set(candidates)
+            docs = self.docs
+            return set([
+                path for path in candidates
+                if any(term in docs[path][field] for field in fields)
+            ])
+
+    def search_words(self, query, fields=None, sort_on=None):
+        """Return set of paths of nodes whose metadata contain all words of
+        query.
+
+        :param sort_on: Optional indexed field. If given, a list of paths
+            sorted by field value and path is returned.
+        """
+        with self._lock:
+            result = None
+            for word in safe_decode(query).split():
+                paths = self.search(word, fields=fields)
+                result = paths if result is None else result & paths
+                if not result:
+                    break
+            result = result if result else set()
+            if sort_on is None:
+                return result
+            # sort keys are read while holding the lock, docs may get
+            # unindexed concurrently
+            docs = self.docs
+            return sorted(result, key=lambda x: (docs[x][sort_on], x))
+
+    def doc(self, path):
+        return self.docs.get(tuple(path))
+
+    def _index(self, path, node):
+        metadata = node.metadata
+        doc = dict()
+        grams = set()
+        for field in self.fields:
+            value = metadata.get(field)
+            value = safe_decode(value).lower() if value else u''
+            doc[field] = value
+            grams.update(ngrams(value))
+        doc['grams'] = grams
+        self.docs[path] = doc
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(path)
+        self.children.setdefault(path[:-1], set()).add(path)
+
+    def _unindex(self, path):
+        doc = self.docs.pop(path, None)
+        if doc is None:
+            return
+        for gram in doc['grams']:
+            posting = self.postings.get(gram)
+            if posting is None:
+                continue
+            posting.discard(path)
+            if not posting:
+                del self.postings[gram]
+        siblings = self.children.get(path[:-1])
+        if siblings is not None:
+            siblings.discard(path)
+            if not siblings:
+                del self.children[path[:-1]]
+
+    def _descendants(self, path):
+        paths = [path]
+        stack = [path]
+        while stack:
+            for child in self.children.get(stack.pop(), ()):
+                paths.append(child)
+                stack.append(child)
+        return paths
+
+
+fulltext_index = FulltextIndex()
+
+
+def node_added_handler(node, event):
+    if fulltext_index.built:
+        fulltext_index.index(node, recursive=True)
+
+
+def node_modified_handler(node, event):
+    if fulltext_index.built:
+        fulltext_index.index(node)
+
+
+def node_removed_handler(node, event):
+    if not fulltext_index.built:
+        return
+    parent_path = fulltext_index.path_for(event.oldParent)
+    if parent_path is not None:
+        fulltext_index.unindex(node, path=parent_path + (event.oldName,))
+
+
+_handlers_registered = False
+
+
+def enable_fulltext_index(root):
+    """Enable fulltext index for tree of root.
+
+    Registers lifecycle event handlers keeping the index up to date. The
+    index gets built on first search.
+    """
+    global _handlers_registered
+    fulltext_index.root = root
+    fulltext_index.clear()
+    if _handlers_registered:
+        return
+    registry = getSiteManager()
+    registry.registerHandler(node_added_handler, (INode, INodeAddedEvent))
+    registry.registerHandler(
+        node_modified_handler,
+        (INode, INodeModifiedEvent)
+    )
+    registry.registerHandler(node_removed_handler, (INode, INodeRemovedEvent))
+    registry.registerHandler(
+        node_removed_handler,
+        (INode, INodeDetachedEvent)
+    )
+    _handlers_registered = True
+
+
+def disable_fulltext_index():
+    """Disable fulltext index.
+    """
+    fulltext_index.root = None
+    fulltext_index.clear()
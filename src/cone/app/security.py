@@ -1,18 +1,25 @@
 from cone.app.interfaces import IOwnerSupport
 from cone.app.interfaces import IPrincipalACL
+from cone.app.ugm import principals_by_ids
 from cone.app.ugm import ugm_backend
 from plumber import Behavior
 from plumber import default
 from plumber import plumb
+from pyramid.authorization import ACLAuthorizationPolicy
 from pyramid.i18n import TranslationStringFactory
+from pyramid.interfaces import IAuthenticationPolicy
+from pyramid.interfaces import IAuthorizationPolicy
 from pyramid.security import ALL_PERMISSIONS
 from pyramid.security import Allow
 from pyramid.security import Deny
 from pyramid.security import Everyone
 from pyramid.security import remember
 from pyramid.threadlocal import get_current_request
+from pyramid.util import is_nonstr_iter
 from zope.interface import implementer
 import logging
+import threading
+import time
 
 
 logger = logging.getLogger('cone.app')
@@ -111,17 +118,10 @@ def authenticated_user(request):
 
 
 def principal_by_id(principal_id):
-    ugm = ugm_backend.ugm
-    try:
-        if principal_id.startswith('group:'):
-            principal = ugm.groups.get(principal_id[6:])
-        else:
-            principal = ugm.users.get(principal_id)
-        if not principal:
-            return None
-        return principal
-    except Exception:
+    if not principal_id:
         return None
+    principals = principals_by_ids([principal_id], log_errors=False)
+    return principals.get(principal_id)
 
 
 def search_for_principals(term):
@@ -139,6 +139,79 @@ def search_for_principals(term):
 
 ROLES_CACHE_KEY = 'cone.app.user.roles'
 
+# Timeout in seconds of process wide roles cache. ``0`` disables the cache
+ROLES_CACHE_TTL = 0
+ROLES_CACHE_MAX_SIZE = 10000
+
+
+class RolesCache(object):
+    """Process wide cache for aggregated roles and groups of users.
+
+    Entries expire after ``ROLES_CACHE_TTL`` seconds. Changes to user roles or
+    group memberships must be announced by calling ``invalidate_roles_cache``.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.storage = dict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Return cached roles for user or ``None``.
+        """
+        if not ROLES_CACHE_TTL:
+            return None
+        with self._lock:
+            entry = self.storage.get(name)
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            return None
+
+    def set(self, name, roles):
+        """Cache roles for user.
+        """
+        if not ROLES_CACHE_TTL:
+            return
+        with self._lock:
+            storage = self.storage
+            now = time.time()
+            if name not in storage and len(storage) >= ROLES_CACHE_MAX_SIZE:
+                for key, entry in list(storage.items()):
+                    if entry[0] <= now:
+                        del storage[key]
+                if len(storage) >= ROLES_CACHE_MAX_SIZE:
+                    storage.clear()
+            storage[name] = (now + ROLES_CACHE_TTL, tuple(roles))
+
+    def invalidate(self, name=None):
+        """Invalidate cached roles for user or all users if name is ``None``.
+        """
+        with self._lock:
+            if name is None:
+                self.storage = dict()
+            else:
+                self.storage.pop(name, None)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.storage),
+        }
+
+
+roles_cache = RolesCache()
+
+
+def invalidate_roles_cache(name=None):
+    """Invalidate cached roles of user by name or of all users.
+    """
+    roles_cache.invalidate(name=name)
+
 
 def groups_callback(name, request):
     """Collect and return roles and groups for user.
@@ -152,6 +225,10 @@ def groups_callback(name, request):
     if name == ADMIN_USER:
         roles = environ[ROLES_CACHE_KEY] = [u'role:manager']
         return roles
+    roles = roles_cache.get(name)
+    if roles is not None:
+        environ[ROLES_CACHE_KEY] = roles
+        return roles
     ugm = ugm_backend.ugm
     user = None
     try:
@@ -168,6 +245,7 @@ def groups_callback(name, request):
             for role in group.roles:
                 aggregated.add('role:%s' % role)
         roles = environ[ROLES_CACHE_KEY] = list(aggregated)
+        roles_cache.set(name, roles)
     # XXX: this function is expected to return None if no roles?
     #      owner support not works if None returned
     # if not roles:
@@ -175,6 +253,202 @@ def groups_callback(name, request):
     return roles
 
 
+# ACL cache scope. Either ``None`` (disabled), ``request`` or ``process``
+ACL_CACHE = None
+ACL_CACHE_KEY = 'cone.app.acl'
+ACL_CACHE_MAX_SIZE = 10000
+
+# Timeout in seconds of entries in process wide ACL cache
+ACL_CACHE_TTL = 60
+
+
+class ACLCache(object):
+    """Cache for computed ACLs of ``PrincipalACL`` and ``OwnerSupport`` nodes.
+
+    Cached ACLs are keyed by node class, node path and owner if node provides
+    ``IOwnerSupport``, thus owner changes need no invalidation. Depending on
+    ``ACL_CACHE``, the cache lives for the lifetime of the current request or
+    is shared process wide. Changes to principal roles or workflow state must
+    be announced by calling ``invalidate_acl_cache``, which bumps the cache
+    version.
+
+    Invalidation only affects the current process. Process wide entries
+    therefore expire after ``ACL_CACHE_TTL`` seconds, which bounds how long
+    other worker processes and unannounced changes serve outdated ACLs.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.process_cache = dict()
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self.process_cache = dict()
+
+    def storage(self):
+        if ACL_CACHE == 'process':
+            return self.process_cache
+        if ACL_CACHE != 'request':
+            return None
+        request = get_current_request()
+        if request is None:
+            return None
+        environ = request.environ
+        version, storage = environ.get(ACL_CACHE_KEY, (None, None))
+        if version != self.version:
+            storage = dict()
+            environ[ACL_CACHE_KEY] = (self.version, storage)
+        return storage
+
+    def cached(self, node, name, compute):
+        """Return cached ACL for node or compute and cache it.
+
+        :param node: Node the ACL belongs to.
+        :param name: Name of the ACL computation.
+        :param compute: Callable computing the ACL.
+        """
+        storage = self.storage()
+        if storage is None:
+            return compute()
+        owner = node.owner if IOwnerSupport.providedBy(node) else None
+        key = (name, node.__class__, tuple(node.path), owner)
+        now = time.time()
+        entry = storage.get(key)
+        if entry is not None and (entry[0] is None or entry[0] > now):
+            return entry[1]
+        acl = compute()
+        if len(storage) >= ACL_CACHE_MAX_SIZE:
+            storage.clear()
+        # request scoped entries live as long as the request
+        expires = now + ACL_CACHE_TTL if ACL_CACHE == 'process' else None
+        storage[key] = (expires, acl)
+        return acl
+
+
+acl_cache = ACLCache()
+
+
+def invalidate_acl_cache():
+    """Invalidate all cached ACLs.
+    """
+    acl_cache.invalidate()
+
+
+class PermissionChecker(object):
+    """Check a permission for many nodes of the same request.
+
+    Effective principals are resolved once and the ACL evaluation result of
+    each location in the node lineage is memoized, thus checking siblings only
+    evaluates the ACL's of the siblings themselves. Checker instances are
+    meant to be short living, e.g. for the duration of rendering a listing.
+    """
+
+    def __init__(self, request, permission):
+        self.request = request
+        self.permission = permission
+        registry = request.registry
+        self.authn_policy = registry.queryUtility(IAuthenticationPolicy)
+        self.authz_policy = registry.queryUtility(IAuthorizationPolicy)
+        self.principals = None
+        if self.authn_policy is not None:
+            self.principals = set(
+                self.authn_policy.effective_principals(request)
+            )
+        # id(location) -> (location, result). The location is kept to ensure
+        # its id is not reused while the checker is alive
+        self.results = dict()
+
+    def acl_result(self, location):
+        """Return ``True`` if ACL of location allows the permission,
+        ``False`` if it denies and ``None`` if ACL does not decide.
+        """
+        try:
+            acl = location.__acl__
+        except AttributeError:
+            return None
+        if acl and callable(acl):
+            acl = acl()
+        principals = self.principals
+        permission = self.permission
+        for ace_action, ace_principal, ace_permissions in acl:
+            if ace_principal not in principals:
+                continue
+            if not is_nonstr_iter(ace_permissions):
+                ace_permissions = [ace_permissions]
+            if permission in ace_permissions:
+                return ace_action == Allow
+        return None
+
+    def permits(self, location):
+        results = self.results
+        unresolved = list()
+        permitted = False
+        while location is not None:
+            entry = results.get(id(location))
+            if entry is not None:
+                permitted = entry[1]
+                break
+            unresolved.append(location)
+            result = self.acl_result(location)
+            if result is not None:
+                permitted = result
+                break
+            location = getattr(location, '__parent__', None)
+        # all visited locations up to the deciding one share the result
+        for location in unresolved:
+            results[id(location)] = (location, permitted)
+        return permitted
+
+    def __call__(self, node):
+        if self.authn_policy is None:
+            return True
+        if not isinstance(self.authz_policy, ACLAuthorizationPolicy):
+            return self.request.has_permission(self.permission, node)
+        return self.permits(node)
+
+
+def filter_permitted(request, permission, nodes):
+    """Return list of nodes the permission is granted for.
+
+    :param request: The current request.
+    :param permission: The permission to check.
+    :param nodes: Iterable of nodes.
+    """
+    checker = PermissionChecker(request, permission)
+    return [node for node in nodes if checker(node)]
+
+
+PERMISSION_CACHE_KEY = 'cone.app.permissions'
+
+
+def has_permission(request, permission, context):
+    """Check permission on context memoized for the lifetime of request.
+
+    Memoized results get discarded if ``invalidate_acl_cache`` is called.
+
+    :param request: The current request.
+    :param permission: The permission to check.
+    :param context: The context to check the permission on.
+    """
+    environ = getattr(request, 'environ', None)
+    if environ is None:
+        return bool(request.has_permission(permission, context))
+    version, storage = environ.get(PERMISSION_CACHE_KEY, (None, None))
+    if version != acl_cache.version:
+        storage = dict()
+        environ[PERMISSION_CACHE_KEY] = (acl_cache.version, storage)
+    # (id(context), permission) -> (context, result). The context is kept to
+    # ensure its id is not reused while the request is alive
+    key = (id(context), permission)
+    entry = storage.get(key)
+    if entry is None:
+        result = bool(request.has_permission(permission, context))
+        entry = storage[key] = (context, result)
+    return entry[1]
+
+
 class ACLRegistry(dict):
 
     def register(self, acl, obj=None, node_info_name=''):
@@ -202,12 +476,14 @@ class OwnerSupport(Behavior):
     @plumb
     @property
     def __acl__(_next, self):
-        acl = _next(self)
-        if self.owner:
-            for ace in acl:
-                if ace[1] == 'role:owner':
-                    return [(Allow, self.owner, ace[2])] + acl
-        return acl
+        def compute():
+            acl = _next(self)
+            if self.owner:
+                for ace in acl:
+                    if ace[1] == 'role:owner':
+                        return [(Allow, self.owner, ace[2])] + acl
+            return acl
+        return acl_cache.cached(self, 'owner', compute)
 
     @property
     def owner(self):
@@ -259,20 +535,24 @@ class PrincipalACL(Behavior):
     @plumb
     @property
     def __acl__(_next, self):
-        base_acl = _next(self)
-        acl = list()
-        if self.role_inheritance:
-            principal_roles = self.aggregated_roles
-        else:
-            principal_roles = self.principal_roles
-        for id, roles in principal_roles.items():
-            aggregated = set()
-            for role in roles:
-                aggregated.update(self._permissions_for_role(base_acl, role))
-            acl.append((Allow, id, list(aggregated)))
-        for ace in base_acl:
-            acl.append(ace)
-        return acl
+        def compute():
+            base_acl = _next(self)
+            acl = list()
+            if self.role_inheritance:
+                principal_roles = self.aggregated_roles
+            else:
+                principal_roles = self.principal_roles
+            for id, roles in principal_roles.items():
+                aggregated = set()
+                for role in roles:
+                    aggregated.update(
+                        self._permissions_for_role(base_acl, role)
+                    )
+                acl.append((Allow, id, list(aggregated)))
+            for ace in base_acl:
+                acl.append(ace)
+            return acl
+        return acl_cache.cached(self, 'principal', compute)
 
     @default
     def _permissions_for_role(self, acl, role):
@@ -0,0 +1,762 @@
+from cone.app.fileugm import ChangeTrackingOdict
+from node.behaviors import Adopt
+from node.behaviors import Attributes
+from node.behaviors import DefaultInit
+from node.behaviors import NodeChildValidate
+from node.behaviors import Nodespaces
+from node.behaviors import Nodify
+from node.behaviors import OdictStorage
+from node.behaviors import Storage
+from node.compat import UNICODE_TYPE
+from node.ext.ugm import Group as BaseGroupBehavior
+from node.ext.ugm import Groups as BaseGroupsBehavior
+from node.ext.ugm import Ugm as BaseUgmBehavior
+from node.ext.ugm import User as BaseUserBehavior
+from node.ext.ugm import Users as BaseUsersBehavior
+from plumber import override
+from plumber import plumbing
+import argparse
+import base64
+import hashlib
+import os
+import sqlite3
+import threading
+
+
+ENCODING = 'utf-8'
+SALT_LEN = 8
+
+# Maximum number of keys per query, below the SQLite host parameter limit
+QUERY_CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS principals (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    password TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS attributes (
+    attr_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    principal_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value,
+    UNIQUE (kind, principal_id, name)
+);
+CREATE INDEX IF NOT EXISTS attributes_value
+    ON attributes (kind, name, value);
+CREATE TABLE IF NOT EXISTS memberships (
+    group_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (group_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS memberships_user
+    ON memberships (user_id, group_id);
+CREATE TABLE IF NOT EXISTS roles (
+    kind TEXT NOT NULL,
+    principal_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    PRIMARY KEY (kind, principal_id, role)
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS attributes_fts USING fts5(
+    value,
+    content='attributes',
+    content_rowid='attr_id',
+    tokenize='trigram case_sensitive 1'
+);
+CREATE TRIGGER IF NOT EXISTS attributes_ai AFTER INSERT ON attributes BEGIN
+    INSERT INTO attributes_fts(rowid, value) VALUES (new.attr_id, new.value);
+END;
+CREATE TRIGGER IF NOT EXISTS attributes_ad AFTER DELETE ON attributes BEGIN
+    INSERT INTO attributes_fts(attributes_fts, rowid, value)
+        VALUES ('delete', old.attr_id, old.value);
+END;
+CREATE TRIGGER IF NOT EXISTS attributes_au AFTER UPDATE ON attributes BEGIN
+    INSERT INTO attributes_fts(attributes_fts, rowid, value)
+        VALUES ('delete', old.attr_id, old.value);
+    INSERT INTO attributes_fts(rowid, value) VALUES (new.attr_id, new.value);
+END;
+"""
+
+
+def hash_password(password, salt=None):
+    """Return salted password hash as used by ``node.ext.ugm.file``.
+    """
+    if salt is None:
+        salt = os.urandom(SALT_LEN)
+    if isinstance(password, UNICODE_TYPE):
+        password = password.encode(ENCODING)
+    hashed = base64.b64encode(hashlib.sha256(password + salt).digest() + salt)
+    return hashed.decode()
+
+
+def check_password(password, hashed):
+    salt = base64.b64decode(hashed)[-SALT_LEN:]
+    return hash_password(password, salt) == hashed
+
+
+def glob_pattern(term):
+    """Convert search term to GLOB pattern.
+
+    Only leading and trailing ``*`` are considered wildcards, like in
+    ``node.ext.ugm.file``. Returns ``None`` if term cannot match anything.
+    """
+    if term == '*':
+        return '*'
+    if not len(term.strip('*')):
+        return None
+    leading = term.startswith('*')
+    trailing = term.endswith('*')
+    term = term[1 if leading else 0:-1 if trailing else None]
+    term = ''.join([
+        '[{}]'.format(char) if char in '*?[' else char for char in term
+    ])
+    return '{}{}{}'.format(
+        '*' if leading else '',
+        term,
+        '*' if trailing else ''
+    )
+
+
+class ConnectionPool(object):
+    """Provide one SQLite connection per thread and process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pid = os.getpid()
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        if self._pid != os.getpid():
+            # connections must not be shared with forked processes
+            self._pid = os.getpid()
+            self._local = threading.local()
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class PrincipalAttributesStorage(Storage):
+    allow_non_node_childs = override(True)
+
+    @override
+    def __init__(self, name=None, parent=None):
+        self.__name__ = name
+        self.__parent__ = parent
+        self._storage_data = None
+
+    @override
+    @property
+    def storage(self):
+        if self._storage_data is None:
+            principal = self.parent
+            cursor = principal.connection.execute(
+                'SELECT name, value FROM attributes '
+                'WHERE kind = ? AND principal_id = ? ORDER BY attr_id',
+                (principal.parent.kind, principal.name)
+            )
+            self._storage_data = ChangeTrackingOdict(cursor.fetchall())
+            self._storage_data.changed.clear()
+        return self._storage_data
+
+    @override
+    def __getitem__(self, key):
+        # provide id attribute expected by cone.ugm
+        if key == 'id':
+            return self.parent.name
+        return self.storage[key]
+
+    @override
+    def __call__(self):
+        data = self._storage_data
+        if data is None or not data.changed:
+            return
+        principal = self.parent
+        kind = principal.parent.kind
+        with principal.connection as connection:
+            for key in sorted(data.changed):
+                if key not in data:
+                    connection.execute(
+                        'DELETE FROM attributes '
+                        'WHERE kind = ? AND principal_id = ? AND name = ?',
+                        (kind, principal.name, key)
+                    )
+                    continue
+                params = (data[key], kind, principal.name, key)
+                cursor = connection.execute(
+                    'UPDATE attributes SET value = ? '
+                    'WHERE kind = ? AND principal_id = ? AND name = ?',
+                    params
+                )
+                if not cursor.rowcount:
+                    connection.execute(
+                        'INSERT INTO attributes '
+                        '(value, kind, principal_id, name) '
+                        'VALUES (?, ?, ?, ?)',
+                        params
+                    )
+        data.changed.clear()
+
+    @override
+    def invalidate(self, key=None):
+        self._storage_data = None
+
+
+@plumbing(
+    NodeChildValidate,
+    Adopt,
+    Nodify,
+    PrincipalAttributesStorage)
+class PrincipalAttributes(object):
+    pass
+
+
+class PrincipalMixin(object):
+    """Common implementation of SQL based users and groups.
+    """
+
+    def __init__(self, name=None, parent=None):
+        self.__name__ = name
+        self.__parent__ = parent
+
+    def attributes_factory(self, name=None, parent=None):
+        return PrincipalAttributes(name=name, parent=parent)
+
+    @property
+    def connection(self):
+        return self.parent.connection
+
+    @property
+    def ugm(self):
+        return self.parent.parent
+
+    @property
+    def roles(self):
+        return self.ugm.roles(self)
+
+    def add_role(self, role):
+        self.ugm.add_role(role, self)
+
+    def remove_role(self, role):
+        self.ugm.remove_role(role, self)
+
+    def __call__(self, from_parent=False):
+        self.attrs()
+
+
+@plumbing(
+    BaseUserBehavior,
+    Nodespaces,
+    Attributes,
+    Nodify)
+class User(PrincipalMixin):
+
+    @property
+    def groups(self):
+        groups = self.ugm.groups
+        return [groups.principal(group_id) for group_id in self.group_ids]
+
+    @property
+    def group_ids(self):
+        cursor = self.connection.execute(
+            'SELECT group_id FROM memberships '
+            'WHERE user_id = ? ORDER BY group_id',
+            (self.name,)
+        )
+        return [row[0] for row in cursor]
+
+
+@plumbing(
+    BaseGroupBehavior,
+    Nodespaces,
+    Attributes,
+    Nodify)
+class Group(PrincipalMixin):
+
+    def __getitem__(self, key):
+        if key not in self.member_ids:
+            raise KeyError(key)
+        return self.ugm.users.principal(key)
+
+    def __delitem__(self, key):
+        with self.connection as connection:
+            cursor = connection.execute(
+                'DELETE FROM memberships WHERE group_id = ? AND user_id = ?',
+                (self.name, key)
+            )
+            if not cursor.rowcount:
+                raise KeyError(key)
+        self.ugm.principals_changed()
+
+    def __iter__(self):
+        return iter(self.member_ids)
+
+    def add(self, id):
+        # raises KeyError if user not exists
+        self.ugm.users[id]
+        with self.connection as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO memberships (group_id, user_id) '
+                'VALUES (?, ?)',
+                (self.name, id)
+            )
+        self.ugm.principals_changed()
+
+    @property
+    def users(self):
+        users = self.ugm.users
+        return [users.principal(user_id) for user_id in self.member_ids]
+
+    @property
+    def member_ids(self):
+        cursor = self.connection.execute(
+            'SELECT user_id FROM memberships '
+            'WHERE group_id = ? ORDER BY user_id',
+            (self.name,)
+        )
+        return [row[0] for row in cursor]
+
+
+class PrincipalsMixin(object):
+    """Common implementation of SQL based users and groups containers.
+
+    Principals, memberships and roles are written immediately, principal
+    attributes when calling the principal or container.
+    """
+    kind = None
+
+    def __init__(self, name=None, parent=None):
+        self.__name__ = name
+        self.__parent__ = parent
+        self._mem_storage = dict()
+
+    @property
+    def connection(self):
+        return self.parent.connection
+
+    def principal(self, key):
+        """Return principal by key without checking existence.
+        """
+        try:
+            return self._mem_storage[key]
+        except KeyError:
+            principal = self._mem_storage[key] = self.principal_factory(
+                name=key,
+                parent=self
+            )
+            return principal
+
+    def __getitem__(self, key):
+        cursor = self.connection.execute(
+            'SELECT 1 FROM principals WHERE kind = ? AND id = ?',
+            (self.kind, key)
+        )
+        if cursor.fetchone() is None:
+            raise KeyError(key)
+        return self.principal(key)
+
+    def get_many(self, keys):
+        """Return dict of existing principals by key with one query per
+        ``QUERY_CHUNK_SIZE`` keys.
+        """
+        keys = list(keys)
+        found = dict()
+        for i in range(0, len(keys), QUERY_CHUNK_SIZE):
+            chunk = keys[i:i + QUERY_CHUNK_SIZE]
+            query = 'SELECT id FROM principals WHERE kind = ? AND id IN ({})'
+            cursor = self.connection.execute(
+                query.format(', '.join(['?'] * len(chunk))),
+                [self.kind] + chunk
+            )
+            for row in cursor:
+                found[row[0]] = self.principal(row[0])
+        return found
+
+    def __setitem__(self, key, value):
+        with self.connection as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO principals (kind, id) VALUES (?, ?)',
+                (self.kind, key)
+            )
+        self._mem_storage[key] = value
+
+    def __delitem__(self, key):
+        # raises KeyError if principal not exists
+        self[key]
+        with self.connection as connection:
+            for statement in self._delete_statements:
+                connection.execute(statement, (self.kind, key))
+            connection.execute(
+                'DELETE FROM memberships WHERE {} = ?'.format(
+                    'user_id' if self.kind == 'user' else 'group_id'
+                ),
+                (key,)
+            )
+        self._mem_storage.pop(key, None)
+        self.parent.principals_changed()
+
+    _delete_statements = [
+        'DELETE FROM principals WHERE kind = ? AND id = ?',
+        'DELETE FROM attributes WHERE kind = ? AND principal_id = ?',
+        'DELETE FROM roles WHERE kind = ? AND principal_id = ?'
+    ]
+
+    def __iter__(self):
+        cursor = self.connection.execute(
+            'SELECT id FROM principals WHERE kind = ? ORDER BY id',
+            (self.kind,)
+        )
+        for row in cursor.fetchall():
+            yield row[0]
+
+    def __len__(self):
+        cursor = self.connection.execute(
+            'SELECT COUNT(*) FROM principals WHERE kind = ?',
+            (self.kind,)
+        )
+        return cursor.fetchone()[0]
+
+    def __call__(self, from_parent=False):
+        for principal in list(self._mem_storage.values()):
+            principal(from_parent=True)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._mem_storage.clear()
+        else:
+            self._mem_storage.pop(key, None)
+
+    def create(self, id, **kw):
+        principal = self.principal_factory(name=id, parent=self)
+        self[id] = principal
+        for k, v in kw.items():
+            principal.attrs[k] = v
+        principal()
+        return principal
+
+    def search(self, criteria=None, attrlist=None,
+               exact_match=False, or_search=False):
+        """Search principals by criteria.
+
+        Supports the same term syntax as ``node.ext.ugm.file``. Matching is
+        done by the database using indexes.
+        """
+        conditions = list()
+        params = [self.kind]
+        for key, term in (criteria or dict()).items():
+            pattern = glob_pattern(term)
+            if pattern is None:
+                conditions.append('0')
+            elif key == 'id':
+                conditions.append('p.id GLOB ?')
+                params.append(pattern)
+            elif self.parent.fts:
+                # lookup matching attributes via full text index. unary plus
+                # prevents using the attributes index on kind and name
+                conditions.append(
+                    'p.id IN (SELECT principal_id FROM attributes '
+                    'WHERE attr_id IN (SELECT rowid FROM attributes_fts '
+                    'WHERE attributes_fts.value GLOB ?) '
+                    'AND +kind = ? AND +name = ? AND value != \'\')'
+                )
+                params += [pattern, self.kind, key]
+            else:
+                conditions.append(
+                    'p.id IN (SELECT principal_id FROM attributes '
+                    'WHERE kind = ? AND name = ? AND value != \'\' '
+                    'AND value GLOB ?)'
+                )
+                params += [self.kind, key, pattern]
+        query = 'SELECT p.id FROM principals p WHERE p.kind = ?'
+        if conditions:
+            query += ' AND ({})'.format(
+                (' OR ' if or_search else ' AND ').join(conditions)
+            )
+        query += ' ORDER BY p.id'
+        ids = [row[0] for row in self.connection.execute(query, params)]
+        if exact_match and len(ids) > 1:
+            raise ValueError('Exact match asked but result not unique')
+        if exact_match and len(ids) == 0:
+            raise ValueError('Exact match asked but result length is zero')
+        if not attrlist:
+            return ids
+        ret = list()
+        for id in ids:
+            attrs = self.principal(id).attrs
+            pdata = dict()
+            for key in attrlist:
+                pdata[key] = attrs.get(key, '')
+            ret.append((id, pdata))
+        return ret
+
+
+@plumbing(
+    BaseUsersBehavior,
+    Nodespaces,
+    Adopt,
+    Attributes,
+    Nodify)
+class Users(PrincipalsMixin):
+    kind = 'user'
+    principal_factory = User
+
+    def id_for_login(self, login):
+        return login
+
+    def authenticate(self, id=None, pw=None):
+        cursor = self.connection.execute(
+            'SELECT password FROM principals WHERE kind = ? AND id = ?',
+            (self.kind, id)
+        )
+        row = cursor.fetchone()
+        # cannot authenticate user with unset password
+        if row is None or not row[0]:
+            return False
+        return check_password(pw, row[0])
+
+    def passwd(self, id, oldpw, newpw):
+        cursor = self.connection.execute(
+            'SELECT password FROM principals WHERE kind = ? AND id = ?',
+            (self.kind, id)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError(u"User with id '{}' does not exist.".format(id))
+        if oldpw is not None:
+            if not row[0] or not check_password(oldpw, row[0]):
+                raise ValueError('Old password does not match.')
+        with self.connection as connection:
+            connection.execute(
+                'UPDATE principals SET password = ? WHERE kind = ? AND id = ?',
+                (hash_password(newpw), self.kind, id)
+            )
+
+
+@plumbing(
+    BaseGroupsBehavior,
+    Nodespaces,
+    Adopt,
+    Attributes,
+    Nodify)
+class Groups(PrincipalsMixin):
+    kind = 'group'
+    principal_factory = Group
+
+
+@plumbing(
+    BaseUgmBehavior,
+    NodeChildValidate,
+    Nodespaces,
+    Adopt,
+    DefaultInit,
+    Nodify,
+    OdictStorage)
+class Ugm(object):
+    """SQLite based UGM implementation.
+
+    Users, groups, memberships, roles and principal attributes are stored in
+    indexed tables. Attribute search uses a trigram full text index if
+    supported by the SQLite library.
+
+    ``on_change`` gets called without arguments after memberships or roles
+    have been changed or principals have been deleted.
+    """
+    on_change = None
+
+    def __init__(self, name=None, parent=None, database=None):
+        self.__name__ = name
+        self.__parent__ = parent
+        self.database = database
+        self.pool = ConnectionPool(database)
+        self.fts = False
+        self.create_schema()
+
+    def create_schema(self):
+        with self.connection as connection:
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:  # pragma: no cover
+                # FTS5 or trigram tokenizer not available
+                self.fts = False
+
+    @property
+    def connection(self):
+        return self.pool.connection
+
+    def __getitem__(self, key):
+        if key not in self.storage:
+            if key == 'users':
+                self['users'] = Users()
+            elif key == 'groups':
+                self['groups'] = Groups()
+        return self.storage[key]
+
+    def __setitem__(self, key, value):
+        if key not in ['users', 'groups']:
+            raise KeyError(key)
+        self.storage[key] = value
+
+    def __delitem__(self, key):
+        raise NotImplementedError('Operation forbidden on this node.')
+
+    def __iter__(self):
+        return iter(['users', 'groups'])
+
+    def __call__(self):
+        self.users(from_parent=True)
+        self.groups(from_parent=True)
+
+    def invalidate(self, key=None):
+        for name in [key] if key else list(self.storage.keys()):
+            if name in self.storage:
+                self.storage[name].invalidate()
+
+    @property
+    def users(self):
+        return self['users']
+
+    @property
+    def groups(self):
+        return self['groups']
+
+    def roles(self, principal):
+        cursor = self.connection.execute(
+            'SELECT role FROM roles WHERE kind = ? AND principal_id = ? '
+            'ORDER BY role',
+            (principal.parent.kind, principal.name)
+        )
+        return [row[0] for row in cursor]
+
+    def add_role(self, role, principal):
+        with self.connection as connection:
+            try:
+                connection.execute(
+                    'INSERT INTO roles (kind, principal_id, role) '
+                    'VALUES (?, ?, ?)',
+                    (principal.parent.kind, principal.name, role)
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(
+                    u"Principal already has role '{}'".format(role)
+                )
+        self.principals_changed()
+
+    def remove_role(self, role, principal):
+        with self.connection as connection:
+            cursor = connection.execute(
+                'DELETE FROM roles '
+                'WHERE kind = ? AND principal_id = ? AND role = ?',
+                (principal.parent.kind, principal.name, role)
+            )
+            if not cursor.rowcount:
+                raise ValueError(
+                    u"Principal does not has role '{}'".format(role)
+                )
+        self.principals_changed()
+
+    def principals_changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+
+def migrate_file_ugm(source, target):
+    """Copy users, groups, memberships, roles and principal attributes from
+    ``node.ext.ugm.file.Ugm`` instance ``source`` to SQL ``Ugm`` instance
+    ``target``.
+
+    Password hashes are copied as is, since both implementations use the same
+    hashing scheme.
+    """
+    principals = list()
+    attributes = list()
+    memberships = list()
+    roles = list()
+    for kind, container in [('user', source.users), ('group', source.groups)]:
+        for id, value in container.storage.items():
+            password = value if kind == 'user' else ''
+            principals.append((kind, id, password or ''))
+            for name, attr in container[id].attrs.storage.items():
+                attributes.append((kind, id, name, attr))
+            if kind == 'group':
+                for user_id in value.split(u','):
+                    if user_id:
+                        memberships.append((id, user_id))
+    for id, value in source.attrs.items():
+        kind = 'user'
+        if id.startswith('group:'):
+            kind = 'group'
+            id = id[6:]
+        for role in value.split(u','):
+            if role:
+                roles.append((kind, id, role))
+    with target.connection as connection:
+        connection.executemany(
+            'INSERT OR REPLACE INTO principals (kind, id, password) '
+            'VALUES (?, ?, ?)',
+            principals
+        )
+        connection.executemany(
+            'DELETE FROM attributes '
+            'WHERE kind = ? AND principal_id = ? AND name = ?',
+            [attr[:3] for attr in attributes]
+        )
+        connection.executemany(
+            'INSERT INTO attributes (kind, principal_id, name, value) '
+            'VALUES (?, ?, ?, ?)',
+            attributes
+        )
+        connection.executemany(
+            'INSERT OR IGNORE INTO memberships (group_id, user_id) '
+            'VALUES (?, ?)',
+            memberships
+        )
+        connection.executemany(
+            'INSERT OR IGNORE INTO roles (kind, principal_id, role) '
+            'VALUES (?, ?, ?)',
+            roles
+        )
+    target.invalidate()
+    return len(principals)
+
+
+def migrate_main(argv=None):
+    """Console script migrating file based UGM data to SQLite database.
+    """
+    from node.ext.ugm.file import Ugm as FileUgm
+    parser = argparse.ArgumentParser(
+        description='Migrate file based UGM data to SQLite database.'
+    )
+    parser.add_argument('--users-file', required=True)
+    parser.add_argument('--groups-file', required=True)
+    parser.add_argument('--roles-file', required=True)
+    parser.add_argument('--datadir', required=True)
+    parser.add_argument('database')
+    args = parser.parse_args(argv)
+    source = FileUgm(
+        name='ugm',
+        users_file=args.users_file,
+        groups_file=args.groups_file,
+        roles_file=args.roles_file,
+        data_directory=args.datadir
+    )
+    target = Ugm(name='ugm', database=args.database)
+    count = migrate_file_ugm(source, target)
+    print('Migrated {} principals to {}'.format(count, args.database))
@@ -1,5 +1,6 @@
 from cone.app import model
 from cone.app.security import authenticate
+from cone.app.security import PERMISSION_CACHE_KEY
 from cone.tile.tests import DummyVenusian
 from contextlib import contextmanager
 from pyramid.security import AuthenticationAPIMixin
@@ -104,6 +105,7 @@ class Security(object):
             for key in self.auth_env_keys:
                 if key in environ:
                     del environ[key]
+            environ.pop(PERMISSION_CACHE_KEY, None)
 
     @contextmanager
     def authenticated(self, login, password=None):
@@ -6,8 +6,11 @@ def test_suite():
     from cone.app.tests import test_testing
 
     from cone.app.tests import test_app
+    from cone.app.tests import test_fileugm
     from cone.app.tests import test_model
+    from cone.app.tests import test_search
     from cone.app.tests import test_security
+    from cone.app.tests import test_sqlugm
     from cone.app.tests import test_ugm
     from cone.app.tests import test_utils
     from cone.app.tests import test_workflow
@@ -30,6 +33,7 @@ def test_suite():
     from cone.app.tests import test_browser_sharing
     from cone.app.tests import test_browser_table
     from cone.app.tests import test_browser_utils
+    from cone.app.tests import test_browser_warmup
     from cone.app.tests import test_browser_workflow
 
     suite = unittest.TestSuite()
@@ -37,8 +41,11 @@ def test_suite():
     suite.addTest(unittest.findTestCases(test_testing))
 
     suite.addTest(unittest.findTestCases(test_app))
+    suite.addTest(unittest.findTestCases(test_fileugm))
     suite.addTest(unittest.findTestCases(test_model))
+    suite.addTest(unittest.findTestCases(test_search))
     suite.addTest(unittest.findTestCases(test_security))
+    suite.addTest(unittest.findTestCases(test_sqlugm))
     suite.addTest(unittest.findTestCases(test_ugm))
     suite.addTest(unittest.findTestCases(test_utils))
     suite.addTest(unittest.findTestCases(test_workflow))
@@ -61,6 +68,7 @@ def test_suite():
     suite.addTest(unittest.findTestCases(test_browser_sharing))
     suite.addTest(unittest.findTestCases(test_browser_table))
     suite.addTest(unittest.findTestCases(test_browser_utils))
+    suite.addTest(unittest.findTestCases(test_browser_warmup))
     suite.addTest(unittest.findTestCases(test_browser_workflow))
 
     return suite
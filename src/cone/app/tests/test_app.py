@@ -1,6 +1,8 @@
 from cone.app import main_hook
 from cone.app import make_remote_addr_middleware
+from cone.app.browser.resources import merged_bundles
 from cone.app.model import BaseNode
+from cone.app.ugm import ugm_backend
 from node.tests import NodeTestCase
 from pyramid.authentication import AuthTktAuthenticationPolicy
 from pyramid.authorization import ACLAuthorizationPolicy
@@ -9,6 +11,12 @@ from pyramid.static import static_view
 from yafowil import resources
 from yafowil.base import factory as yafowil_factory
 import cone.app
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
 
 
 class TestApp(NodeTestCase):
@@ -136,6 +144,162 @@ class TestApp(NodeTestCase):
         del yafowil_factory._themes['default'][yafowil_addon_name]
         del cone.app.yafowil_addon_resources
 
+    def test_deferred_startup(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            dump_path = os.path.join(tempdir, 'startup.json')
+            settings = {
+                'cone.admin_user': 'admin',
+                'cone.admin_password': 'admin',
+                'cone.auth_secret': '12345',
+                'cone.deferred_startup': 'true',
+                'cone.startup_profile': 'true',
+                'cone.startup_profile_dump': dump_path
+            }
+            router = cone.app.main({}, **settings)
+            self.assertTrue(isinstance(router, Router))
+
+            # Startup profile gets written
+            with open(dump_path) as f:
+                data = json.load(f)
+            names = [phase['name'] for phase in data['phases']]
+            self.assertTrue('browser_scan' in names)
+            self.assertTrue('zcml' in names)
+            self.assertFalse('merged_bundles' in names)
+        finally:
+            shutil.rmtree(tempdir)
+
+        # Merged bundles get build deferred
+        self.assertEqual(
+            [name for name, task in cone.app.deferred_tasks],
+            ['merged_bundles']
+        )
+        cone.app.run_deferred_startup()
+        self.assertEqual(cone.app.deferred_tasks, [])
+        phase = cone.app.startup_profiler.phases[-1]
+        self.assertEqual(phase['name'], 'merged_bundles')
+        self.assertTrue(phase['deferred'])
+
+        # Failing deferred tasks get logged
+        def failing_task():
+            raise Exception('Failed')
+
+        cone.app.add_startup_task('failing', failing_task, deferred=True)
+        cone.app.run_deferred_startup()
+        self.assertEqual(cone.app.deferred_tasks, [])
+
+        # Without deferred startup, tasks are executed immediately
+        called = []
+        cone.app.add_startup_task('task', lambda: called.append(True))
+        self.assertEqual(called, [True])
+
+    def test_preload(self):
+        freeze_origin = getattr(gc, 'freeze', None)
+        frozen = []
+        gc.freeze = lambda: frozen.append(True)
+
+        ugm_name = ugm_backend.name
+        ugm_factory = ugm_backend.factory
+        ugm_origin = ugm_backend.ugm
+        tempdir = tempfile.mkdtemp()
+        try:
+            settings = {
+                'cone.admin_user': 'admin',
+                'cone.admin_password': 'admin',
+                'cone.auth_secret': '12345',
+                'cone.deferred_startup': 'true',
+                'ugm.backend': 'file',
+                'ugm.users_file': os.path.join(tempdir, 'users'),
+                'ugm.groups_file': os.path.join(tempdir, 'groups'),
+                'ugm.roles_file': os.path.join(tempdir, 'roles'),
+                'ugm.datadir': os.path.join(tempdir, 'data')
+            }
+            router = cone.app.preload({}, **settings)
+            self.assertTrue(isinstance(router, Router))
+            self.assertEqual(frozen, [True])
+
+            # Deferred startup tasks are executed and templates compiled
+            self.assertEqual(cone.app.deferred_tasks, [])
+            names = [p['name'] for p in cone.app.startup_profiler.phases]
+            self.assertTrue('merged_bundles' in names)
+            self.assertTrue('template_warmup' in names)
+
+            # Post fork creates new UGM instance and calls post fork hooks
+            hooks = dict(called=0)
+
+            @cone.app.post_fork_hook
+            def custom_post_fork_hook():
+                hooks['called'] += 1
+
+            ugm = ugm_backend.ugm
+            cone.app.post_fork()
+            self.assertFalse(ugm_backend.ugm is ugm)
+            self.assertEqual(hooks['called'], 1)
+            cone.app.post_fork_hooks.remove(custom_post_fork_hook)
+        finally:
+            shutil.rmtree(tempdir)
+            ugm_backend.name = ugm_name
+            ugm_backend.factory = ugm_factory
+            ugm_backend.ugm = ugm_origin
+            if freeze_origin is not None:
+                gc.freeze = freeze_origin
+            else:
+                del gc.freeze
+
+    def test_deferred_startup_production_mode(self):
+        # Merged bundles are read via subrequests in production mode, which
+        # trigger the deferred startup subscriber while tasks are running
+        freeze_origin = getattr(gc, 'freeze', None)
+        gc.freeze = lambda: None
+        settings = {
+            'cone.admin_user': 'admin',
+            'cone.admin_password': 'admin',
+            'cone.auth_secret': '12345',
+            'cone.deferred_startup': 'true',
+            'cone.assets_mode': 'production'
+        }
+        result = dict()
+
+        def run(func):
+            thread = threading.Thread(target=func)
+            thread.daemon = True
+            thread.start()
+            thread.join(60)
+            return thread.is_alive()
+
+        def run_preload():
+            result['router'] = cone.app.preload({}, **settings)
+
+        def run_first_request():
+            cone.app.deferred_startup_subscriber(None)
+
+        try:
+            # Preload returns
+            self.assertFalse(run(run_preload))
+            self.assertTrue(isinstance(result['router'], Router))
+            self.assertEqual(cone.app.deferred_tasks, [])
+            self.assertTrue(merged_bundles.is_bundled('static/public.js'))
+
+            # First request after main returns
+            settings['cone.template_warmup'] = 'true'
+            cone.app.main({}, **settings)
+            self.assertEqual(
+                [name for name, task in cone.app.deferred_tasks],
+                ['merged_bundles', 'template_warmup']
+            )
+            self.assertFalse(run(run_first_request))
+            self.assertEqual(cone.app.deferred_tasks, [])
+            names = [p['name'] for p in cone.app.startup_profiler.phases]
+            self.assertTrue('merged_bundles' in names)
+            self.assertTrue('template_warmup' in names)
+        finally:
+            cone.app.cfg.assets_mode = 'development'
+            merged_bundles.build()
+            if freeze_origin is not None:
+                gc.freeze = freeze_origin
+            else:
+                del gc.freeze
+
     def test_remote_addr_middleware(self):
         # Remote address middleware
         class DummyApp(object):
@@ -11,13 +11,20 @@ from cone.app.browser.ajax import AjaxFormContinue
 from cone.app.browser.ajax import AjaxMessage
 from cone.app.browser.ajax import AjaxOverlay
 from cone.app.browser.ajax import AjaxPath
+from cone.app.browser.ajax import FulltextLiveSearch
 from cone.app.browser.ajax import livesearch
 from cone.app.browser.ajax import render_ajax_form
 from cone.app.browser.form import Form
 from cone.app.interfaces import ILiveSearch
+from cone.app.model import BaseNode
+from cone.app.search import disable_fulltext_index
+from cone.app.search import enable_fulltext_index
 from cone.tile import Tile
 from cone.tile import tile
 from cone.tile.tests import TileTestCase
+from pyramid.security import ALL_PERMISSIONS
+from pyramid.security import Deny
+from pyramid.security import Everyone
 from yafowil.base import factory
 from zope.component import adapter
 from zope.interface import implementer
@@ -25,6 +32,10 @@ from zope.interface import Interface
 import json
 
 
+class DeniedNode(BaseNode):
+    __acl__ = [(Deny, Everyone, ALL_PERMISSIONS)]
+
+
 class TestBrowserAjax(TileTestCase):
     layer = testing.security
 
@@ -437,3 +448,39 @@ class TestBrowserAjax(TileTestCase):
         registry.registerAdapter(LiveSearch)
 
         self.assertEqual(livesearch(root, request), [{'value': 'Value'}])
+
+    def test_FulltextLiveSearch(self):
+        model = BaseNode(name='root')
+        for i in range(15):
+            child = model['child_{}'.format(i)] = BaseNode()
+            child.metadata.title = 'Child {:02d}'.format(i)
+        model['child_0'] = DeniedNode()
+        model['child_0'].metadata.title = 'Child 00'
+        adapter = FulltextLiveSearch(model)
+        request = self.layer.new_request()
+
+        # Fulltext index not enabled
+        self.assertEqual(adapter.search(request, 'child'), [])
+
+        enable_fulltext_index(model)
+        try:
+            # Unauthenticated
+            self.assertEqual(adapter.search(request, 'child'), [])
+
+            with self.layer.authenticated('max'):
+                request = self.layer.new_request()
+                res = adapter.search(request, 'child')
+                self.assertEqual(len(res), 10)
+                self.assertEqual(res[0], {
+                    'value': 'Child 01',
+                    'target': 'http://example.com/root/child_1'
+                })
+                self.assertEqual(res[-1]['value'], 'Child 10')
+                res = adapter.search(request, 'child 14')
+                self.assertEqual(res, [{
+                    'value': 'Child 14',
+                    'target': 'http://example.com/root/child_14'
+                }])
+                self.assertEqual(adapter.search(request, 'child 00'), [])
+        finally:
+            disable_fulltext_index()
@@ -24,6 +24,7 @@ from cone.app.browser.authoring import render_form
 from cone.app.browser.form import Form
 from cone.app.model import AdapterNode
 from cone.app.model import BaseNode
+from cone.app.model import ChildSortIndex
 from cone.app.model import get_node_info
 from cone.app.model import node_info
 from cone.app.model import NodeInfo
@@ -31,9 +32,12 @@ from cone.app.model import register_node_info
 from cone.tile import render_tile
 from cone.tile import tile
 from cone.tile.tests import TileTestCase
+from node.interfaces import INode
+from node.interfaces import INodeModifiedEvent
 from plumber import plumbing
 from webob.exc import HTTPFound
 from yafowil.base import factory
+from zope.component import getSiteManager
 from zope.interface import implementer
 from zope.interface import Interface
 
@@ -795,6 +799,93 @@ class TestBrowserAuthoring(TileTestCase):
 
         self.assertTrue(res.find('parent.bdajax.render_ajax_form') != -1)
 
+    def test_NotifyModified(self):
+        @plumbing(ChildSortIndex)
+        class Folder(BaseNode):
+            pass
+
+        class Document(BaseNode):
+            pass
+
+        with self.layer.hook_tile_reg():
+            @tile(name='editform', interface=Document)
+            @plumbing(ContentEditForm)
+            class DocumentEditForm(Form):
+                def prepare(self):
+                    form = factory(
+                        u'form',
+                        name='editform',
+                        props={
+                            'action': self.nodeurl
+                        })
+                    form['update'] = factory(
+                        'submit',
+                        props={
+                            'action': 'update',
+                            'expression': True,
+                            'handler': self.update,
+                            'next': self.next,
+                            'label': 'Update',
+                        })
+                    form['cancel'] = factory(
+                        'submit',
+                        props={
+                            'action': 'cancel',
+                            'expression': True,
+                            'skip': True,
+                            'next': self.next,
+                            'label': 'Cancel',
+                        })
+                    self.form = form
+
+                def update(self, widget, data):
+                    fetch = self.request.params.get
+                    self.model.metadata.title = fetch('editform.title')
+
+        folder = Folder()
+        for name in ['a', 'b', 'c']:
+            folder[name] = Document()
+            folder[name].metadata.title = name
+        self.assertEqual(
+            list(folder.sorted_child_keys('title')),
+            ['a', 'b', 'c']
+        )
+
+        modified = list()
+
+        def modified_handler(node, event):
+            modified.append(node.name)
+
+        registry = getSiteManager()
+        registry.registerHandler(
+            modified_handler,
+            (INode, INodeModifiedEvent)
+        )
+        try:
+            with self.layer.authenticated('editor'):
+                # Cancel does not announce modification
+                request = self.layer.new_request()
+                request.params['action.editform.cancel'] = '1'
+                render_tile(folder['a'], request, 'edit')
+                self.assertEqual(modified, [])
+
+                request = self.layer.new_request()
+                request.params['action.editform.update'] = '1'
+                request.params['editform.title'] = 'z'
+                render_tile(folder['a'], request, 'edit')
+        finally:
+            registry.unregisterHandler(
+                modified_handler,
+                (INode, INodeModifiedEvent)
+            )
+
+        # Modified event is notified and child sort index of parent updated
+        self.assertEqual(modified, ['a'])
+        self.assertEqual(
+            list(folder.sorted_child_keys('title')),
+            ['b', 'c', 'a']
+        )
+
     def test_deleting(self):
         class CallableNode(BaseNode):
             def __call__(self):
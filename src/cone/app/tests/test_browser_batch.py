@@ -3,6 +3,7 @@ from cone.app.browser import set_related_view
 from cone.app.browser.batch import Batch
 from cone.app.browser.batch import BatchedItems
 from cone.app.browser.batch import BatchedItemsBatch
+from cone.app.browser.batch import BatchVocab
 from cone.app.browser.utils import make_query
 from cone.app.browser.utils import make_url
 from cone.app.browser.utils import node_path
@@ -402,6 +403,92 @@ class TestBrowserBatch(TileTestCase):
         expected = 'ajax:target="http://example.com/?b_page=2"'
         self.assertTrue(res.find(expected) > -1)
 
+    def test_BatchVocab(self):
+        created = list()
+
+        def create_page(i):
+            created.append(i)
+            return {
+                'page': '%i' % (i + 1),
+                'current': i == 5,
+                'visible': True
+            }
+
+        vocab = BatchVocab(10000, create_page, current=5)
+        self.assertEqual(len(vocab), 10000)
+        self.assertTrue(bool(vocab))
+        self.assertEqual(vocab.current, 5)
+
+        # Pages are created on access and memoized
+        self.assertEqual(vocab[0]['page'], '1')
+        self.assertEqual(vocab[-1]['page'], '10000')
+        self.assertEqual(vocab[0]['page'], '1')
+        self.assertEqual(created, [0, 9999])
+        self.assertEqual(
+            [page['page'] for page in vocab[3:6]],
+            ['4', '5', '6']
+        )
+        self.assertEqual(created, [0, 9999, 3, 4, 5])
+        with self.assertRaises(IndexError):
+            vocab[10000]
+
+        # Current out of range
+        self.assertEqual(BatchVocab(3, create_page, current=3).current, -1)
+
+        # Compares equal to list of pages
+        vocab = BatchVocab(2, create_page)
+        self.assertEqual(vocab, [
+            {'page': '1', 'current': False, 'visible': True},
+            {'page': '2', 'current': False, 'visible': True}
+        ])
+        self.assertEqual(BatchVocab(0, create_page), [])
+
+    def test_windowed_batch_tile(self):
+        created = list()
+
+        with self.layer.hook_tile_reg():
+            @tile(name='windowedbatch')
+            class WindowedBatch(Batch):
+                vocab_calls = 0
+
+                @property
+                def vocab(self):
+                    WindowedBatch.vocab_calls += 1
+                    current = int(self.request.params.get('b_page', '0'))
+
+                    def create_page(i):
+                        created.append(i)
+                        return {
+                            'page': '%i' % (i + 1),
+                            'current': current == i,
+                            'visible': True,
+                            'href': 'http://example.com/?b_page=%i' % i,
+                            'target': 'http://example.com/?b_page=%i' % i
+                        }
+                    return BatchVocab(10000, create_page, current=current)
+
+        with self.layer.authenticated('max'):
+            model = BaseNode()
+            request = self.layer.new_request()
+            request.params['b_page'] = '5000'
+            res = render_tile(model, request, 'windowedbatch')
+
+        # Vocabulary gets evaluated once per rendering
+        self.assertEqual(WindowedBatch.vocab_calls, 1)
+
+        # Only first, last, previous, next and pages in batch range are
+        # created
+        self.assertEqual(
+            sorted(created),
+            [0] + list(range(4996, 5005)) + [9999]
+        )
+        expected = 'href="http://example.com/?b_page=5004"'
+        self.assertTrue(res.find(expected) > -1)
+        expected = 'href="http://example.com/?b_page=5005"'
+        self.assertFalse(res.find(expected) > -1)
+        expected = 'href="http://example.com/?b_page=9999"'
+        self.assertTrue(res.find(expected) > -1)
+
     def test_bc_batch_tile(self):
         # Test B/C batch vocab rendering::
 
@@ -6,33 +6,72 @@ from cone.app.browser.contents import ContentsViewLink
 from cone.app.browser.contents import listing
 from cone.app.browser.table import TableSlice
 from cone.app.browser.utils import make_url
+from cone.app.interfaces import ILazyListing
 from cone.app.model import BaseNode
+from cone.app.model import ChildSortIndex
 from cone.app.model import node_info
+from cone.app.model import node_modified
+from cone.app.search import disable_fulltext_index
+from cone.app.search import enable_fulltext_index
+from cone.app.search import fulltext_index
 from cone.app.testing.mock import CopySupportNode
 from cone.app.testing.mock import WorkflowNode
+from cone.app.utils import DatetimeHelper
 from cone.tile import render_tile
 from cone.tile.tests import TileTestCase
 from datetime import datetime
 from datetime import timedelta
+from plumber import plumbing
 from pyramid.exceptions import HTTPForbidden
 from pyramid.security import ACLDenied
 from pyramid.security import ALL_PERMISSIONS
 from pyramid.security import Deny
 from pyramid.security import Everyone
+from zope.interface import implementer
 
 
 class NeverShownChild(BaseNode):
     __acl__ = [(Deny, Everyone, ALL_PERMISSIONS)]
 
 
+@plumbing(ChildSortIndex)
+class IndexedNode(BaseNode):
+    pass
+
+
+@implementer(ILazyListing)
+class LazyListingNode(BaseNode):
+
+    def count(self, term=None):
+        self.calls.append(('count', term))
+        return len(self)
+
+    def slice(self, start, end, sort=None, order=None, term=None):
+        self.calls.append(('slice', start, end, sort, order, term))
+        return self.values()[start:end]
+
+
+class PermissionFilteredListingNode(LazyListingNode):
+    permission_filtered = True
+
+    def count(self, term=None, principals=None):
+        self.calls.append(('count', term, principals))
+        return len(self)
+
+    def slice(self, start, end, sort=None, order=None, term=None,
+              principals=None):
+        self.calls.append(('slice', start, end, sort, order, term, principals))
+        return self.values()[start:end]
+
+
 class TestBrowserContents(TileTestCase):
     layer = testing.security
 
-    def create_dummy_model(self):
+    def create_dummy_model(self, factory=BaseNode):
         created = datetime(2011, 3, 14)
         delta = timedelta(1)
         modified = created + delta
-        model = BaseNode()
+        model = factory()
         for i in range(19):
             model[str(i)] = BaseNode()
             model[str(i)].properties.action_view = True
@@ -68,6 +107,271 @@ class TestBrowserContents(TileTestCase):
             res = contents.sorted_rows(None, None, 'created', 'asc')[-1]['title']
             self.checkOutput('...0 Title...', res)
 
+    def test_sliced_children(self):
+        tmpl = 'cone.app:browser/templates/table.pt'
+        contents = ContentsTile(tmpl, None, 'contents')
+        contents.model = self.create_dummy_model()
+
+        def names(children):
+            return [child.name for child in children]
+
+        # Sliced children equal slices of sorted children
+        with self.layer.authenticated('manager'):
+            contents.request = self.layer.new_request()
+            for sort in ['title', 'creator', 'created', 'modified', None]:
+                for order in ['asc', 'desc']:
+                    children = contents.sorted_children(sort, order)
+                    for start, end in [(0, 5), (5, 10), (15, 30), (0, None)]:
+                        self.assertEqual(
+                            names(contents.sliced_children(
+                                start, end, sort, order
+                            )),
+                            names(children[start:end])
+                        )
+
+        # Equal sort values keep the order of sorted children
+        for child in contents.model.values():
+            child.metadata.creator = 'admin'
+        with self.layer.authenticated('manager'):
+            contents.request = self.layer.new_request()
+            for order in ['asc', 'desc']:
+                self.assertEqual(
+                    names(contents.sliced_children(0, 5, 'creator', order)),
+                    names(contents.sorted_children('creator', order)[:5])
+                )
+
+        # Child sort index of model gets used if present
+        model = contents.model = self.create_dummy_model(factory=IndexedNode)
+        with self.layer.authenticated('manager'):
+            contents.request = self.layer.new_request()
+            self.assertEqual(
+                names(contents.sliced_children(0, 3, 'created', 'desc')),
+                ['0', '1', '2']
+            )
+            self.assertEqual(
+                names(contents.sliced_children(3, 6, 'created', 'asc')),
+                ['15', '14', '13']
+            )
+            # Children not permitted are skipped
+            self.assertEqual(
+                names(contents.sliced_children(17, 20, 'title', 'asc')),
+                ['1', '0']
+            )
+            self.assertEqual(
+                names(contents.sliced_children(17, None, 'title', 'desc')),
+                ['8', '9']
+            )
+            model['0'].metadata.created = datetime(2020, 1, 1)
+            node_modified(model['0'])
+            self.assertEqual(
+                names(contents.sliced_children(0, 3, 'created', 'asc')),
+                ['0', '18', '17']
+            )
+
+            # Index is not used if filter term given
+            contents.request = self.layer.new_request()
+            contents.request.params['term'] = '18 title'
+            self.assertEqual(
+                names(contents.sliced_children(0, 3, 'created', 'desc')),
+                ['18']
+            )
+
+        # Index is not used if listable children are customized
+        class CustomContentsTile(ContentsTile):
+
+            @property
+            def listable_children(self):
+                return [
+                    child for child in self.model.values()
+                    if child.name != '2'
+                ]
+
+        contents = CustomContentsTile(tmpl, None, 'contents')
+        contents.model = model
+        self.assertTrue(contents.children_overridden)
+        with self.layer.authenticated('manager'):
+            contents.request = self.layer.new_request()
+            self.assertEqual(
+                names(contents.sliced_children(0, 3, 'created', 'desc')),
+                ['1', '3', '4']
+            )
+
+    def test_sliced_children_mixed_datetimes(self):
+        # Datetimes with timezone offset are read as naive UTC datetimes and
+        # sort with naive datetimes written by previous versions
+        tmpl = 'cone.app:browser/templates/table.pt'
+        helper = DatetimeHelper()
+
+        def names(children):
+            return [child.name for child in children]
+
+        for factory in [BaseNode, IndexedNode]:
+            model = factory()
+            for name, created in [
+                ('a', '2011-03-14T10:00:00'),
+                ('b', '2011-03-14T12:00:00+01:00'),
+                ('c', '2011-03-14T09:00:00Z'),
+                ('d', '2011-03-14T10:30:00.000005'),
+            ]:
+                child = BaseNode()
+                child.metadata.title = name
+                child.metadata.created = helper.r_value(created)
+                model[name] = child
+            contents = ContentsTile(tmpl, None, 'contents')
+            contents.model = model
+            with self.layer.authenticated('manager'):
+                contents.request = self.layer.new_request()
+                self.assertEqual(
+                    names(contents.sorted_children('created', 'desc')),
+                    ['c', 'a', 'd', 'b']
+                )
+                self.assertEqual(
+                    names(contents.sliced_children(0, 3, 'created', 'asc')),
+                    ['b', 'd', 'a']
+                )
+
+    def test_filtered_children_fulltext_index(self):
+        tmpl = 'cone.app:browser/templates/table.pt'
+        contents = ContentsTile(tmpl, None, 'contents')
+        model = contents.model = self.create_dummy_model()
+
+        def filtered(term):
+            request = contents.request = self.layer.new_request()
+            request.params['term'] = term
+            return [child.name for child in contents.filtered_children]
+
+        with self.layer.authenticated('manager'):
+            expected = dict([
+                (term, filtered(term))
+                for term in ['1', '1 title', 'admin 1', 'inexistent']
+            ])
+            enable_fulltext_index(model)
+            try:
+                # Index gives same result as iterating children
+                for term, names in expected.items():
+                    self.assertEqual(filtered(term), names)
+                self.assertTrue(fulltext_index.built)
+
+                # Index is not used for not contained models
+                contents.model = self.create_dummy_model()
+                self.assertEqual(filtered('1 title'), ['1', '11'])
+                contents.model = model
+
+                # Modified nodes are found by new title only
+                model['1'].metadata.title = 'Changed'
+                node_modified(model['1'])
+                self.assertEqual(filtered('changed'), ['1'])
+                self.assertEqual(filtered('1 title'), ['11'])
+
+                # Stale index is used if data changes without notification
+                model['3'].metadata.title = 'Other'
+                self.assertEqual(filtered('other'), [])
+                fulltext_index.index(model['3'])
+                self.assertEqual(filtered('other'), ['3'])
+
+                # Matches are filtered by listable children
+                class CustomContentsTile(ContentsTile):
+
+                    @property
+                    def listable_children(self):
+                        return [
+                            child for child in self.model.values()
+                            if child.name != '11'
+                        ]
+
+                custom = CustomContentsTile(tmpl, None, 'contents')
+                custom.model = model
+                custom.request = self.layer.new_request()
+                custom.request.params['term'] = '1 title'
+                self.assertEqual(custom.filtered_children, [])
+                custom.request = self.layer.new_request()
+                custom.request.params['term'] = 'changed'
+                self.assertEqual(
+                    [child.name for child in custom.filtered_children],
+                    ['1']
+                )
+
+                # Usage of index can be disabled on tile
+                contents.use_fulltext_index = False
+                model['2'].metadata.title = 'Changed'
+                self.assertEqual(filtered('changed'), ['1', '2'])
+            finally:
+                disable_fulltext_index()
+
+    def test_lazy_listing(self):
+        tmpl = 'cone.app:browser/templates/table.pt'
+        contents = ContentsTile(tmpl, None, 'contents')
+        model = contents.model = self.create_dummy_model(
+            factory=LazyListingNode
+        )
+        model.calls = list()
+
+        with self.layer.authenticated('manager'):
+            request = contents.request = self.layer.new_request()
+            request.params['term'] = 'Title'
+            self.assertEqual(contents.item_count, 20)
+
+            # Order is passed as effective sort direction. Children not
+            # permitted are skipped, thus children are fetched from the
+            # beginning
+            children = contents.sliced_children(15, 30, 'created', 'desc')
+            self.assertEqual(
+                [child.name for child in children],
+                ['15', '16', '17', '18']
+            )
+            contents.sliced_children(0, 15, 'created', 'asc')
+            contents.sliced_children(0, 15, 'inexistent', 'asc')
+            self.assertEqual(model.calls, [
+                ('count', 'Title'),
+                ('slice', 0, 30, 'created', 'asc', 'Title'),
+                ('slice', 0, 15, 'created', 'desc', 'Title'),
+                ('slice', 0, 15, None, None, 'Title'),
+            ])
+
+            # Filtered children are not computed
+            self.assertFalse('_filtered_children' in request.environ)
+
+            # Pages get filled up with permitted children
+            model = contents.model = LazyListingNode()
+            model.calls = list()
+            for i in range(10):
+                model[str(i)] = NeverShownChild() if i % 2 else BaseNode()
+            children = contents.sliced_children(0, 3, 'created', 'desc')
+            self.assertEqual(
+                [child.name for child in children],
+                ['0', '2', '4']
+            )
+            children = contents.sliced_children(3, 6, 'created', 'desc')
+            self.assertEqual([child.name for child in children], ['6', '8'])
+            self.assertEqual(model.calls, [
+                ('slice', 0, 3, 'created', 'asc', 'Title'),
+                ('slice', 3, 6, 'created', 'asc', 'Title'),
+                ('slice', 0, 6, 'created', 'asc', 'Title'),
+                ('slice', 6, 9, 'created', 'asc', 'Title'),
+                ('slice', 9, 12, 'created', 'asc', 'Title'),
+            ])
+
+            # Item count is not filtered by permission
+            self.assertEqual(contents.item_count, 10)
+
+            # Lazy listing filtering by permission gets principals and
+            # requested slice
+            model = contents.model = PermissionFilteredListingNode()
+            model.calls = list()
+            for i in range(10):
+                model[str(i)] = BaseNode()
+            children = contents.sliced_children(3, 6, 'created', 'desc')
+            self.assertEqual(
+                [child.name for child in children],
+                ['3', '4', '5']
+            )
+            self.assertEqual(contents.item_count, 10)
+            principals = request.effective_principals
+            self.assertEqual(model.calls, [
+                ('slice', 3, 6, 'created', 'asc', 'Title', principals),
+                ('count', 'Title', principals),
+            ])
+
     def test_slice(self):
         tmpl = 'cone.app:browser/templates/table.pt'
         contents = ContentsTile(tmpl, None, 'contents')
@@ -1,16 +1,26 @@
 from cone.app import testing
 from cone.app.browser import render_main_template
+from cone.app.browser import layout
+from cone.app.browser.layout import enable_navigation_cache
+from cone.app.browser.layout import navigation_cache
+from cone.app.browser.layout import NavigationCache
 from cone.app.browser.layout import NavTree
 from cone.app.browser.layout import ProtectedContentTile
 from cone.app.model import AppRoot
 from cone.app.model import BaseNode
+from cone.app.model import FactoryNode
+from cone.app.model import node_modified
 from cone.app.security import DEFAULT_SETTINGS_ACL
+from cone.app.security import invalidate_acl_cache
 from cone.app.testing.mock import WorkflowNode
 from cone.tile import render_tile
 from cone.tile import Tile
 from cone.tile import tile
 from cone.tile.tests import TileTestCase
 from datetime import datetime
+from node.events import NodeModifiedEvent
+from odict import odict
+from zope.component.event import objectEventNotify
 import cone.app
 import cone.app.browser.login
 
@@ -197,6 +207,91 @@ class TestBrowserLayout(TileTestCase):
         <a href="http://example.com/child/1"...
         """, res)
 
+    def test_mainmenu_cache(self):
+        class Root(FactoryNode):
+            factories = odict([('1', BaseNode), ('2', BaseNode)])
+
+        root = Root()
+        request = self.layer.new_request()
+
+        layout.NAVIGATION_CACHE_TTL = 60
+        enable_navigation_cache()
+        try:
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'mainmenu')
+            self.assertTrue(res.find('href="http://example.com/1"') > -1)
+            self.assertEqual(len(navigation_cache.storage), 1)
+
+            # Cached menu items get used for same principals and top level path
+            root['1'].metadata.title = 'Changed'
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'mainmenu')
+            self.assertFalse(res.find('Changed') > -1)
+
+            # Cached menu items are keyed by principals and selected path
+            with self.layer.authenticated('manager'):
+                res = render_tile(root, request, 'mainmenu')
+            self.assertTrue(res.find('Changed') > -1)
+            with self.layer.authenticated('max'):
+                res = render_tile(root['1'], request, 'mainmenu')
+            self.assertTrue(res.find('<li class="active node-1">') > -1)
+            self.assertEqual(len(navigation_cache.storage), 3)
+
+            # Children of root are not loaded for computing the cache key
+            loaded = list()
+
+            class CountingNode(BaseNode):
+
+                def __init__(self, *args, **kw):
+                    loaded.append(self)
+                    super(CountingNode, self).__init__(*args, **kw)
+
+            counting_root = Root()
+            counting_root.factories = odict([('1', CountingNode)])
+            with self.layer.authenticated('max'):
+                render_tile(counting_root, request, 'mainmenu')
+            self.assertEqual(len(loaded), 1)
+            with self.layer.authenticated('max'):
+                render_tile(counting_root, request, 'mainmenu')
+            self.assertEqual(len(loaded), 1)
+
+            # Modification of children invalidates cached menu items
+            version = navigation_cache.version
+            root['2'].properties.skip_mainmenu = True
+            node_modified(root['2'])
+            self.assertEqual(navigation_cache.version, version + 1)
+            self.assertEqual(len(navigation_cache.storage), 0)
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'mainmenu')
+            self.assertFalse(res.find('href="http://example.com/2"') > -1)
+            self.assertTrue(res.find('Changed') > -1)
+            self.assertEqual(len(navigation_cache.storage), 1)
+
+            # Changing root factories changes cache key
+            root.factories['3'] = BaseNode
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'mainmenu')
+            self.assertTrue(res.find('href="http://example.com/3"') > -1)
+
+            # Cached menu items are keyed by locale
+            request = self.layer.new_request()
+            with self.layer.authenticated('max'):
+                mainmenu = layout.MainMenu()
+                mainmenu.model = root
+                mainmenu.request = request
+                key = mainmenu.cache_key
+                request.locale_name = 'de'
+                self.assertNotEqual(mainmenu.cache_key, key)
+
+            # Root identifier is stable and not reused for other roots
+            root_id = navigation_cache.root_id(root)
+            self.assertEqual(navigation_cache.root_id(root), root_id)
+            self.assertNotEqual(navigation_cache.root_id(Root()), root_id)
+            self.assertNotEqual(navigation_cache.root_id(Root()), root_id)
+        finally:
+            layout.NAVIGATION_CACHE_TTL = 0
+            navigation_cache.invalidate()
+
     def test_navtree(self):
         root = BaseNode()
         request = self.layer.new_request()
@@ -352,6 +447,112 @@ class TestBrowserLayout(TileTestCase):
         with self.layer.authenticated('manager'):
             self.assertEqual(len(navtree.navtree()['children']), 2)
 
+    def test_NavigationCache(self):
+        cache = NavigationCache()
+
+        # Cache disabled
+        self.assertFalse(cache.enabled)
+        self.assertEqual(cache.cached(('a',), lambda: 'A'), 'A')
+        self.assertEqual(len(cache.storage), 0)
+
+        layout.NAVIGATION_CACHE_TTL = 60
+        try:
+            self.assertTrue(cache.enabled)
+            self.assertEqual(cache.cached(('a',), lambda: 'A'), 'A')
+            self.assertEqual(cache.cached(('a',), lambda: 'B'), 'A')
+
+            # ACL cache version is part of cache key
+            invalidate_acl_cache()
+            self.assertEqual(cache.cached(('a',), lambda: 'B'), 'B')
+
+            # Least recently used entries get dropped if cache is full
+            cache.invalidate()
+            max_size = layout.NAVIGATION_CACHE_MAX_SIZE
+            layout.NAVIGATION_CACHE_MAX_SIZE = 2
+            try:
+                cache.set('a', 'A')
+                cache.set('b', 'B')
+                self.assertEqual(cache.get('a'), 'A')
+                cache.set('c', 'C')
+                self.assertEqual(list(cache.storage.keys()), ['a', 'c'])
+            finally:
+                layout.NAVIGATION_CACHE_MAX_SIZE = max_size
+
+            # Expired entries
+            layout.NAVIGATION_CACHE_TTL = -1
+            cache.set('a', 'A')
+            self.assertEqual(cache.get('a'), None)
+        finally:
+            layout.NAVIGATION_CACHE_TTL = 0
+
+    def test_navtree_cache(self):
+        root = BaseNode()
+        root['1'] = BaseNode()
+        root['1'].properties.in_navtree = True
+        root['1'].metadata.title = 'Title 1'
+        request = self.layer.new_request()
+
+        layout.NAVIGATION_CACHE_TTL = 60
+        enable_navigation_cache()
+        try:
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'navtree')
+            self.assertTrue(res.find('Title 1') > -1)
+            self.assertEqual(len(navigation_cache.storage), 1)
+
+            # Cached fragment gets used
+            root['1'].metadata.title = 'Changed'
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'navtree')
+            self.assertFalse(res.find('Changed') > -1)
+
+            # Cached fragments are keyed by principals and current path
+            with self.layer.authenticated('manager'):
+                res = render_tile(root, request, 'navtree')
+            self.assertTrue(res.find('Changed') > -1)
+            with self.layer.authenticated('max'):
+                res = render_tile(root['1'], request, 'navtree')
+            self.assertTrue(res.find('Changed') > -1)
+            self.assertEqual(len(navigation_cache.storage), 3)
+
+            # Modification events invalidate the cache
+            objectEventNotify(NodeModifiedEvent(root['1']))
+            self.assertEqual(len(navigation_cache.storage), 0)
+
+            # Adding nodes invalidates the cache
+            with self.layer.authenticated('max'):
+                render_tile(root, request, 'navtree')
+            root['2'] = BaseNode()
+            root['2'].properties.in_navtree = True
+            self.assertEqual(len(navigation_cache.storage), 0)
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'navtree')
+            self.assertTrue(res.find('ajax:target="http://example.com/2"') > -1)
+
+            # Deleting nodes invalidates the cache
+            del root['2']
+            self.assertEqual(len(navigation_cache.storage), 0)
+            with self.layer.authenticated('max'):
+                res = render_tile(root, request, 'navtree')
+            self.assertFalse(res.find('ajax:target="http://example.com/2"') > -1)
+
+            # Detaching nodes, as done on cut and paste, invalidates the cache
+            root.detach('1')
+            self.assertEqual(len(navigation_cache.storage), 0)
+
+            # Lazy loading children of factory nodes does not invalidate
+            # the cache
+            class Factory(FactoryNode):
+                factories = odict([('child', BaseNode)])
+
+            factory = Factory()
+            navigation_cache.set(('navtree',), 'fragment')
+            factory['child']
+            self.assertEqual(len(navigation_cache.storage), 1)
+        finally:
+            layout.NAVIGATION_CACHE_TTL = 0
+            navigation_cache.invalidate()
+
     def test_personaltools(self):
         root = BaseNode()
         request = self.layer.new_request()
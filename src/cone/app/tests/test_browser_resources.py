@@ -1,17 +1,33 @@
 from cone.app import testing
+from cone.app.browser import static_resources as app_static_resources
+from cone.app.browser.resources import accepted_encoding
+from cone.app.browser.resources import compress_data
+from cone.app.browser.resources import CompressedStaticView
 from cone.app.browser.resources import cone_css
 from cone.app.browser.resources import cone_js
+from cone.app.browser.resources import etag_matches
 from cone.app.browser.resources import is_remote_resource
+from cone.app.browser.resources import merged_bundles
+from cone.app.browser.resources import MergedAssetBundles
 from cone.app.browser.resources import MergedAssets
+from cone.app.browser.resources import minified_name
 from cone.app.browser.resources import print_css
+from cone.app.browser.resources import read_file_asset
+from cone.app.browser.resources import read_url_asset
 from cone.app.browser.resources import Resources
+from cone.app.browser.resources import rewrite_css_urls
 from cone.app.model import Properties
 from cone.app.testing.mock import static_resources
 from cone.tile import render_tile
 from cone.tile.tests import TileTestCase
+from io import BytesIO
 import cone.app
+import gzip
+import json
 import os
 import pkg_resources
+import shutil
+import tempfile
 
 
 class TestBrowserResources(TileTestCase):
@@ -23,6 +39,260 @@ class TestBrowserResources(TileTestCase):
         self.assertTrue(is_remote_resource('//foo'))
         self.assertFalse(is_remote_resource('foo'))
 
+    def test_compress_data(self):
+        data = b'a' * 1024
+        variants = compress_data(data)
+        self.assertTrue('gzip' in variants)
+        self.assertTrue(len(variants['gzip']) < len(data))
+        self.assertEqual(gzip.GzipFile(
+            fileobj=BytesIO(variants['gzip'])
+        ).read(), data)
+        # compressed data is deterministic
+        self.assertEqual(compress_data(data), variants)
+        # variants not smaller than original data get skipped
+        self.assertFalse('gzip' in compress_data(b'a'))
+
+    def test_accepted_encoding(self):
+        request = self.layer.new_request()
+        self.assertEqual(accepted_encoding(request, ['gzip']), None)
+        request.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.assertEqual(accepted_encoding(request, ['gzip']), 'gzip')
+        self.assertEqual(accepted_encoding(request, ['br', 'gzip']), 'gzip')
+        self.assertEqual(accepted_encoding(request, []), None)
+        request.headers['Accept-Encoding'] = 'gzip, deflate, br'
+        self.assertEqual(accepted_encoding(request, ['br', 'gzip']), 'br')
+        request.headers['Accept-Encoding'] = 'gzip;q=0, br;q=0.5'
+        self.assertEqual(accepted_encoding(request, ['gzip']), None)
+        self.assertEqual(accepted_encoding(request, ['br', 'gzip']), 'br')
+        request.headers['Accept-Encoding'] = '*'
+        self.assertEqual(accepted_encoding(request, ['gzip']), 'gzip')
+        request.headers['Accept-Encoding'] = 'identity'
+        self.assertEqual(accepted_encoding(request, ['gzip']), None)
+
+    def test_CompressedStaticView(self):
+        self.assertTrue(isinstance(app_static_resources, CompressedStaticView))
+        self.assertEqual(app_static_resources.package_name, 'cone.app.browser')
+
+        view = CompressedStaticView('cone.app.browser:static', use_subpath=True)
+        model = cone.app.root
+
+        # uncompressed if no encoding accepted
+        request = self.layer.new_request()
+        request.subpath = ('styles.css',)
+        res = view(model, request)
+        self.assertEqual(res.content_encoding, None)
+        self.assertEqual(res.vary, ('Accept-Encoding',))
+        data = res.body
+        self.assertEqual(view.compressed, {})
+
+        # compressed variant gets created and cached
+        request = self.layer.new_request()
+        request.subpath = ('styles.css',)
+        request.headers['Accept-Encoding'] = 'gzip'
+        res = view(model, request)
+        self.assertEqual(res.content_encoding, 'gzip')
+        self.assertEqual(res.content_type, 'text/css')
+        self.assertEqual(res.content_length, len(res.body))
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(res.body)).read(), data)
+        self.assertEqual(len(view.compressed), 1)
+        key = list(view.compressed.keys())[0]
+        self.assertEqual(key[0], ('styles.css',))
+
+        res = view(model, request)
+        self.assertEqual(res.content_encoding, 'gzip')
+        self.assertEqual(len(view.compressed), 1)
+
+        # non compressible content types are delivered as is
+        request = self.layer.new_request()
+        request.subpath = ('favicon.ico',)
+        request.headers['Accept-Encoding'] = 'gzip'
+        res = view(model, request)
+        self.assertEqual(res.content_encoding, None)
+        self.assertEqual(res.vary, None)
+        res.app_iter.close()
+
+        # small files are delivered as is
+        view = CompressedStaticView(
+            'cone.app.testing:static',
+            use_subpath=True
+        )
+        request = self.layer.new_request()
+        request.subpath = ('style1.css',)
+        request.headers['Accept-Encoding'] = 'gzip'
+        res = view(model, request)
+        self.assertEqual(res.content_encoding, None)
+        self.assertEqual(view.compressed, {})
+        res.app_iter.close()
+
+    def test_minified_name(self):
+        self.assertEqual(minified_name('foo.js'), 'foo.min.js')
+        self.assertEqual(minified_name('a/foo.css'), 'a/foo.min.css')
+        self.assertEqual(minified_name('foo.min.js'), None)
+
+    def test_read_file_asset(self):
+        static = app_static_resources
+        data = read_file_asset(static, 'jquery-1.9.1.js')
+        self.assertTrue(len(data) > 0)
+        minified = read_file_asset(static, 'jquery-1.9.1.js', minified=True)
+        self.assertTrue(len(minified) < len(data))
+        # falls back to original asset if no minified variant exists
+        self.assertEqual(
+            read_file_asset(static, 'cookie_functions.js', minified=True),
+            read_file_asset(static, 'cookie_functions.js')
+        )
+
+    def test_read_url_asset(self):
+        app = self.layer.app
+        data = read_url_asset(app, 'static/bootstrap/css/bootstrap.css')
+        minified = read_url_asset(
+            app,
+            'static/bootstrap/css/bootstrap.css',
+            minified=True
+        )
+        self.assertTrue(len(minified) < len(data))
+        self.assertTrue(len(read_url_asset(app, '++resource++bdajax/bdajax.js')))
+        self.assertEqual(read_url_asset(app, 'static/inexistent.js'), None)
+
+    def test_rewrite_css_urls(self):
+        css = (
+            '.a { background: url(../img/a.png); }\n'
+            '.b { background: url("b.png"); }\n'
+            ".c { background: url( 'c/c.png' ); }\n"
+            '.d { background: url(/d.png); }\n'
+            '.e { background: url(http://example.com/e.png); }\n'
+            '.f { background: url(data:image/png;base64,AAAA); }\n'
+            '.g { src: url(../fonts/g.eot?#iefix); }'
+        )
+        self.assertEqual(rewrite_css_urls(css, 'static/lib/css'), (
+            '.a { background: url(static/lib/img/a.png); }\n'
+            '.b { background: url("static/lib/css/b.png"); }\n'
+            ".c { background: url('static/lib/css/c/c.png'); }\n"
+            '.d { background: url(/d.png); }\n'
+            '.e { background: url(http://example.com/e.png); }\n'
+            '.f { background: url(data:image/png;base64,AAAA); }\n'
+            '.g { src: url(static/lib/fonts/g.eot?#iefix); }'
+        ))
+
+    def test_production_mode(self):
+        self.assertEqual(cone.app.cfg.assets_mode, 'development')
+        self.assertEqual(merged_bundles.bundled, set())
+        development_js = merged_bundles.lookup('cone.js').data
+
+        request = self.layer.new_request()
+        resources = Resources()
+        resources.model = cone.app.root
+        resources.request = request
+        self.assertTrue(
+            'http://example.com/static/public.js' in resources.js
+        )
+
+        tempdir = tempfile.mkdtemp()
+        manifest_path = os.path.join(tempdir, 'manifest.json')
+        try:
+            cone.app.cfg.assets_mode = 'production'
+            merged_bundles.build(self.layer.app)
+
+            # minified merged assets
+            production_js = merged_bundles.lookup('cone.js').data
+            self.assertTrue(len(production_js) < len(development_js))
+
+            # application relative resources get bundled
+            self.assertTrue(merged_bundles.is_bundled('static/public.js'))
+            self.assertTrue(merged_bundles.is_bundled('static/protected.js'))
+            self.assertTrue(merged_bundles.is_bundled(
+                '++resource++bdajax/bdajax.js'
+            ))
+            self.assertTrue(merged_bundles.is_bundled(
+                'static/bootstrap/css/bootstrap.css'
+            ))
+            self.assertFalse(merged_bundles.is_bundled('static/inexistent.js'))
+
+            public_js = merged_bundles.lookup('cone.js')
+            protected_js = merged_bundles.lookup('cone.js', protected=True)
+            self.assertTrue(public_js.data.find(b'bdajax') > -1)
+            self.assertNotEqual(public_js.hash, protected_js.hash)
+
+            # CSS urls are rewritten relative to application root
+            css = merged_bundles.lookup('cone.css').data
+            self.assertTrue(css.find(b'url(static/bootstrap/fonts/') > -1)
+
+            # resources tile skips bundled resources
+            cone.app.cfg.js.public.append('https://remote.foo/public.js')
+            try:
+                js = resources.js
+            finally:
+                cone.app.cfg.js.public.remove('https://remote.foo/public.js')
+            self.assertTrue('https://remote.foo/public.js' in js)
+            self.assertFalse('http://example.com/static/public.js' in js)
+            self.assertFalse(
+                'http://example.com/++resource++bdajax/bdajax.js' in js
+            )
+            self.assertFalse(
+                'http://example.com/static/styles.css' in resources.css
+            )
+            self.assertEqual(
+                resources.merged_js_url,
+                'http://example.com/cone.js?v={}'.format(public_js.hash)
+            )
+            with self.layer.authenticated('max'):
+                self.assertEqual(
+                    resources.merged_js_url,
+                    'http://example.com/cone.js?v={}'.format(protected_js.hash)
+                )
+            res = render_tile(cone.app.root, request, 'resources')
+            self.assertTrue(res.find(resources.merged_js_url) > -1)
+            self.assertFalse(res.find('static/public.js') > -1)
+
+            # JSON manifest
+            merged_bundles.write_manifest(manifest_path)
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self.assertEqual(sorted(manifest.keys()), ['protected', 'public'])
+            self.assertEqual(
+                manifest['public']['cone.js'],
+                'cone.js?v={}'.format(public_js.hash)
+            )
+            self.assertEqual(
+                manifest['protected']['cone.js'],
+                'cone.js?v={}'.format(protected_js.hash)
+            )
+
+            # Bundle URLs are read from JSON manifest if configured
+            merged_bundles.manifest_path = manifest_path
+            self.assertEqual(
+                resources.merged_js_url,
+                'http://example.com/cone.js?v={}'.format(public_js.hash)
+            )
+            manifest['public']['cone.js'] = 'cone.js?v=other'
+            del manifest['public']['cone.css']
+            with open(manifest_path, 'w') as f:
+                f.write(json.dumps(manifest) + '\n')
+            self.assertEqual(
+                resources.merged_js_url,
+                'http://example.com/cone.js?v=other'
+            )
+
+            # Bundles missing in JSON manifest fall back to built bundles
+            self.assertEqual(
+                resources.merged_css_url,
+                'http://example.com/cone.css?v={}'.format(
+                    merged_bundles.lookup('cone.css').hash
+                )
+            )
+
+            # Built bundles are used if JSON manifest not exists
+            os.remove(manifest_path)
+            self.assertEqual(
+                resources.merged_js_url,
+                'http://example.com/cone.js?v={}'.format(public_js.hash)
+            )
+        finally:
+            merged_bundles.manifest_path = None
+            shutil.rmtree(tempdir)
+            cone.app.cfg.assets_mode = 'development'
+            merged_bundles.build()
+        self.assertEqual(merged_bundles.bundled, set())
+
     def test_MergedAssets(self):
         request = self.layer.new_request()
         assets = MergedAssets(request)
@@ -61,12 +331,136 @@ class TestBrowserResources(TileTestCase):
         expected = '.print1 { display: none; }\n\n.print2 { display: none; }\n\n'
         self.assertEqual(res, expected)
 
+    def test_MergedAssetBundles(self):
+        merged = Properties()
+        merged.js = Properties()
+        merged.js.public = [(static_resources, 'script1.js')]
+        merged.js.protected = [(static_resources, 'script2.js')]
+        merged.css = Properties()
+        merged.css.public = [(static_resources, 'style1.css')]
+        merged.css.protected = [(static_resources, 'style2.css')]
+        merged.print_css = Properties()
+        merged.print_css.public = [(static_resources, 'print1.css')]
+        merged.print_css.protected = list()
+
+        orgin_merged = cone.app.cfg.merged
+        cone.app.cfg.merged = merged
+        try:
+            bundles = MergedAssetBundles()
+            self.assertFalse(bundles.built)
+
+            # bundles get built lazily on first lookup
+            public = bundles.lookup('cone.js')
+            self.assertTrue(bundles.built)
+            self.assertFalse(public.protected)
+            self.assertEqual(public.content_type, 'application/javascript')
+            self.assertEqual(public.data, b'console.log("script1");\n\n')
+            self.assertEqual(len(public.hash), 32)
+            self.assertEqual(public.etag, public.hash)
+            self.assertEqual(public.etag_for(), public.hash)
+            self.assertEqual(
+                public.etag_for('gzip'),
+                '{}-gzip'.format(public.hash)
+            )
+            self.assertEqual(public.data_for(), public.data)
+
+            protected = bundles.lookup('cone.js', protected=True)
+            self.assertTrue(protected.protected)
+            self.assertEqual(
+                protected.data,
+                b'console.log("script1");\n\nconsole.log("script2");\n\n'
+            )
+            self.assertNotEqual(public.hash, protected.hash)
+
+            # equal content results in equal hash
+            public = bundles.lookup('print.css')
+            protected = bundles.lookup('print.css', protected=True)
+            self.assertEqual(public.hash, protected.hash)
+
+            # bundle data gets not re-read on subsequent lookups
+            merged.js.public = list()
+            self.assertEqual(
+                bundles.lookup('cone.js').data,
+                b'console.log("script1");\n\n'
+            )
+            bundles.clear()
+            self.assertFalse(bundles.built)
+            self.assertEqual(bundles.lookup('cone.js').data, b'')
+
+            request = self.layer.new_request()
+            self.assertFalse(bundles.for_request(request, 'cone.css').protected)
+            with self.layer.authenticated('max'):
+                bundle = bundles.for_request(request, 'cone.css')
+            self.assertTrue(bundle.protected)
+        finally:
+            cone.app.cfg.merged = orgin_merged
+
+    def test_etag_matches(self):
+        request = self.layer.new_request()
+        self.assertFalse(etag_matches(request, 'abc'))
+        request.headers['If-None-Match'] = '"abc"'
+        self.assertTrue(etag_matches(request, 'abc'))
+        self.assertFalse(etag_matches(request, 'def'))
+        request.headers['If-None-Match'] = '"def", W/"abc"'
+        self.assertTrue(etag_matches(request, 'abc'))
+        request.headers['If-None-Match'] = '*'
+        self.assertTrue(etag_matches(request, 'abc'))
+
     def test_cone_js(self):
         model = cone.app.root
         request = self.layer.new_request()
         res = cone_js(model, request)
         self.assertEqual(res.headers['Content-Type'], 'application/javascript')
 
+        bundle = merged_bundles.lookup('cone.js')
+        self.assertEqual(res.body, bundle.data)
+        self.assertEqual(res.headers['ETag'], '"{}"'.format(bundle.hash))
+        self.assertEqual(res.headers['Cache-Control'], 'public, no-cache')
+
+        request = self.layer.new_request()
+        request.params['v'] = bundle.hash
+        res = cone_js(model, request)
+        self.assertEqual(
+            res.headers['Cache-Control'],
+            'public, max-age=31536000, immutable'
+        )
+
+        request = self.layer.new_request()
+        request.headers['If-None-Match'] = '"{}"'.format(bundle.hash)
+        res = cone_js(model, request)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.body, b'')
+
+        with self.layer.authenticated('max'):
+            request = self.layer.new_request()
+            res = cone_js(model, request)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Cache-Control'], 'private, no-cache')
+
+        # precompressed bundle
+        self.assertTrue('gzip' in bundle.encodings)
+        request = self.layer.new_request()
+        request.headers['Accept-Encoding'] = 'gzip'
+        res = cone_js(model, request)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(res.headers['ETag'], '"{}-gzip"'.format(bundle.hash))
+        self.assertEqual(res.body, bundle.encodings['gzip'])
+        self.assertEqual(
+            gzip.GzipFile(fileobj=BytesIO(res.body)).read(),
+            bundle.data
+        )
+
+        request = self.layer.new_request()
+        request.headers['Accept-Encoding'] = 'gzip'
+        request.headers['If-None-Match'] = '"{}"'.format(bundle.hash)
+        res = cone_js(model, request)
+        self.assertEqual(res.status_code, 200)
+
+        request.headers['If-None-Match'] = '"{}-gzip"'.format(bundle.hash)
+        res = cone_js(model, request)
+        self.assertEqual(res.status_code, 304)
+
     def test_cone_css(self):
         model = cone.app.root
         request = self.layer.new_request()
@@ -112,6 +506,26 @@ class TestBrowserResources(TileTestCase):
             'https://remote.foo/resource.js'
         )
 
+        self.assertEqual(
+            resources.merged_js_url,
+            'http://example.com/cone.js?v={}'.format(
+                merged_bundles.lookup('cone.js').hash
+            )
+        )
+        self.assertEqual(
+            resources.merged_css_url,
+            'http://example.com/cone.css?v={}'.format(
+                merged_bundles.lookup('cone.css').hash
+            )
+        )
+        with self.layer.authenticated('max'):
+            self.assertEqual(
+                resources.merged_print_css_url,
+                'http://example.com/print.css?v={}'.format(
+                    merged_bundles.lookup('print.css', protected=True).hash
+                )
+            )
+
         res = resources.resources(resources.js)
         self.assertEqual(res, [
             'http://example.com/public.js',
@@ -182,10 +596,10 @@ class TestBrowserResources(TileTestCase):
         # Merged Assets
         assets = cone.app.cfg.merged.js.public
         self.checkOutput("""
-        [(<pyramid.static.static_view object at ...>, 'jquery-1.9.1.js'),
-        (<pyramid.static.static_view object at ...>, 'jquery.migrate-1.2.1.js'),
-        (<pyramid.static.static_view object at ...>, 'jqueryui/jquery-ui-1.10.3.custom.js'),
-        (<pyramid.static.static_view object at ...>, 'bootstrap/js/bootstrap.js')...]
+        [(<cone.app.browser.resources.CompressedStaticView object at ...>, 'jquery-1.9.1.js'),
+        (<cone.app.browser.resources.CompressedStaticView object at ...>, 'jquery.migrate-1.2.1.js'),
+        (<cone.app.browser.resources.CompressedStaticView object at ...>, 'jqueryui/jquery-ui-1.10.3.custom.js'),
+        (<cone.app.browser.resources.CompressedStaticView object at ...>, 'bootstrap/js/bootstrap.js')...]
         """, str(assets))
 
         static = assets[0][0]
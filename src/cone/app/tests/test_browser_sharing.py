@@ -1,3 +1,4 @@
+from cone.app import security
 from cone.app import testing
 from cone.app.browser.ajax import ajax_tile
 from cone.app.browser.sharing import sharing
@@ -166,6 +167,7 @@ class TestBrowserSharing(TileTestCase):
         request.params['bdajax.selector'] = 'NONE'
 
         # Nothing happens if success
+        version = security.acl_cache.version
         with self.layer.authenticated('manager'):
             res = ajax_tile(child, request)
         self.assertEqual(res, {
@@ -175,6 +177,9 @@ class TestBrowserSharing(TileTestCase):
             'selector': 'NONE'
         })
 
+        # ACL cache has been invalidated
+        self.assertEqual(security.acl_cache.version, version + 1)
+
         # Principal roles have changed
         self.assertEqual(len(child.principal_roles), 2)
         self.assertEqual(
@@ -236,6 +241,7 @@ class TestBrowserSharing(TileTestCase):
         request.params['bdajax.selector'] = 'NONE'
 
         # Nothing happens if success
+        version = security.acl_cache.version
         with self.layer.authenticated('manager'):
             res = ajax_tile(child, request)
         self.assertEqual(res, {
@@ -245,6 +251,9 @@ class TestBrowserSharing(TileTestCase):
             'selector': 'NONE'
         })
 
+        # ACL cache has been invalidated
+        self.assertEqual(security.acl_cache.version, version + 1)
+
         # Principal roles has changed
         self.assertEqual(child.principal_roles, {
             'viewer': ['admin'],
@@ -3,13 +3,16 @@ from cone.app.browser.actions import ViewLink
 from cone.app.browser.table import RowData
 from cone.app.browser.table import Table
 from cone.app.browser.table import TableBatch
+from cone.app.browser.table import TableRenderContext
 from cone.app.browser.table import TableSlice
+from cone.app.interfaces import ILazyListing
 from cone.app.model import BaseNode
 from cone.tile import render_tile
 from cone.tile import tile
 from cone.tile.tests import TileTestCase
 from datetime import datetime
 from pyramid.httpexceptions import HTTPForbidden
+from zope.interface import implementer
 
 
 class DummyTable(Table):
@@ -33,6 +36,40 @@ class DummyTable(Table):
         return rows[start:end]
 
 
+@implementer(ILazyListing)
+class LazyListingNode(BaseNode):
+    calls = None
+
+    def count(self, term=None):
+        self.calls.append(('count', term))
+        return 100
+
+    def slice(self, start, end, sort=None, order=None, term=None):
+        self.calls.append(('slice', start, end, sort, order, term))
+        return [BaseNode(name=str(i)) for i in range(start, end)]
+
+
+class PermissionFilteredListingNode(LazyListingNode):
+    permission_filtered = True
+
+    def count(self, term=None, principals=None):
+        self.calls.append(('count', term, principals))
+        return 10
+
+    def slice(self, start, end, sort=None, order=None, term=None,
+              principals=None):
+        self.calls.append(('slice', start, end, sort, order, term, principals))
+        return [BaseNode(name=str(i)) for i in range(start, end)]
+
+
+class LazyTable(Table):
+
+    def row_data(self, node):
+        row_data = RowData()
+        row_data['name'] = node.name
+        return row_data
+
+
 class TestBrowserTable(TileTestCase):
     layer = testing.security
 
@@ -56,6 +93,91 @@ class TestBrowserTable(TileTestCase):
         expected = 'Abstract table does not implement ``sorted_rows``.'
         self.assertEqual(str(err), expected)
 
+        err = self.expectError(
+            NotImplementedError,
+            table.row_data,
+            None
+        )
+        expected = 'Abstract table does not implement ``row_data``.'
+        self.assertEqual(str(err), expected)
+
+    def test_lazy_listing(self):
+        # If model provides ``ILazyListing``, paging, sorting and filtering is
+        # delegated to the model
+        model = LazyListingNode()
+        model.calls = list()
+        request = self.layer.new_request()
+        request.params['term'] = 'foo'
+
+        table = LazyTable('cone.app:browser/templates/table.pt', None, 'table')
+        table.model = model
+        table.request = request
+
+        self.assertTrue(table.lazy_listing)
+        self.assertEqual(table.item_count, 100)
+        rows = table.sorted_rows(10, 13, 'title', 'asc')
+        self.assertEqual([row['name'] for row in rows], ['10', '11', '12'])
+        self.assertEqual(model.calls, [
+            ('count', 'foo'),
+            ('slice', 10, 13, 'title', 'asc', 'foo')
+        ])
+        self.assertFalse(table.permission_filtered)
+
+        # If lazy listing filters by permission, effective principals of the
+        # request get passed to ``count`` and ``slice``
+        model = PermissionFilteredListingNode()
+        model.calls = list()
+        table.model = model
+        self.assertTrue(table.permission_filtered)
+        with self.layer.authenticated('manager'):
+            principals = request.effective_principals
+            self.assertTrue('manager' in principals)
+            self.assertEqual(table.item_count, 10)
+            table.sorted_rows(0, 2, 'title', 'asc')
+        self.assertEqual(model.calls, [
+            ('count', 'foo', principals),
+            ('slice', 0, 2, 'title', 'asc', 'foo', principals)
+        ])
+
+    def test_render_context(self):
+        model = LazyListingNode()
+        model.calls = list()
+        request = self.layer.new_request()
+        request.params['b_page'] = '2'
+        request.params['size'] = '5'
+        request.params['foo'] = 'bar'
+
+        table = LazyTable('cone.app:browser/templates/table.pt', None, 'table')
+        table.query_whitelist = ['foo']
+        table.model = model
+        table.request = request
+
+        # Outside rendering, a new render context is created on each access
+        render_context = table.render_context
+        self.assertTrue(isinstance(render_context, TableRenderContext))
+        self.assertFalse(render_context is table.render_context)
+        self.assertEqual(render_context.slicesize, 5)
+        self.assertEqual(render_context.current_page, '2')
+        self.assertEqual(render_context.slice, (10, 15))
+        self.assertEqual(render_context.whitelist_params, {'foo': 'bar'})
+        self.assertEqual(render_context.item_count, 100)
+        self.assertEqual(render_context.item_count, 100)
+        self.assertEqual(model.calls, [('count', None)])
+        table_slice = render_context.table_slice
+        self.assertTrue(table_slice is render_context.table_slice)
+
+        # While rendering, render context is shared and item count is
+        # computed once
+        model.calls = list()
+        with self.layer.authenticated('max'):
+            res = table(model, request)
+        self.assertTrue(res.find('href="http://example.com/?b_page=3') > -1)
+        self.assertEqual(model.calls, [
+            ('slice', 10, 15, None, None, None),
+            ('count', None)
+        ])
+        self.assertEqual(table._render_context_memo, None)
+
     def test_TableBatch(self):
         model = BaseNode()
         request = self.layer.new_request()
@@ -7,6 +7,7 @@ from cone.app.browser.utils import make_query
 from cone.app.browser.utils import make_url
 from cone.app.browser.utils import node_icon
 from cone.app.browser.utils import node_path
+from cone.app.browser.utils import NODE_PATH_CACHE_KEY
 from cone.app.browser.utils import request_property
 from cone.app.model import BaseNode
 from cone.app.model import node_info
@@ -28,6 +29,61 @@ class TestBrowserUtils(TileTestCase):
         root['child'] = BaseNode()
         self.assertEqual(node_path(root['child']), [u'child'])
 
+    def test_node_path_cache(self):
+        root = BaseNode(name='root')
+        folder = root['folder'] = BaseNode()
+        child = folder[u'\xfc'] = BaseNode()
+        request = self.layer.new_request()
+
+        # Paths get cached on request
+        self.assertEqual(
+            node_path(child, request),
+            [u'root', u'folder', u'\xfc']
+        )
+        storage = request.environ[NODE_PATH_CACHE_KEY]
+        self.assertEqual(len(storage), 3)
+        self.assertEqual(
+            make_url(request, node=child),
+            'http://example.com/root/folder/%C3%BC'
+        )
+        self.assertEqual(len(storage), 3)
+
+        # Returned paths are copies
+        node_path(child, request).append('foo')
+        self.assertEqual(
+            node_path(child, request),
+            [u'root', u'folder', u'\xfc']
+        )
+
+        # Renamed ancestors invalidate cached paths of descendants
+        folder.__name__ = 'renamed'
+        self.assertEqual(
+            node_path(child, request),
+            [u'root', u'renamed', u'\xfc']
+        )
+        self.assertEqual(
+            make_url(request, node=child, resource='view'),
+            'http://example.com/root/renamed/%C3%BC/view'
+        )
+
+        # Moved nodes
+        other = root['other'] = BaseNode()
+        other['moved'] = folder.detach(u'\xfc')
+        self.assertEqual(
+            node_path(child, request),
+            [u'root', u'other', u'moved']
+        )
+        self.assertEqual(
+            make_url(request, node=child),
+            'http://example.com/root/other/moved'
+        )
+
+        # Without request paths are not cached
+        self.assertEqual(
+            node_path(child, request=object()),
+            [u'root', u'other', u'moved']
+        )
+
     def test_make_query(self):
         self.assertEqual(make_query(foo=None), None)
         self.assertEqual(make_query(foo=[]), None)
@@ -0,0 +1,63 @@
+from chameleon.template import BaseTemplate
+from chameleon.zpt.template import PageTemplateFile
+from cone.app import testing
+from cone.app.browser.warmup import configure_template_cache
+from cone.app.browser.warmup import package_templates
+from cone.app.browser.warmup import tile_templates
+from cone.app.browser.warmup import warmup_templates
+from cone.tile.tests import TileTestCase
+from pyramid_chameleon.interfaces import ITemplateRenderer
+import os
+import shutil
+import tempfile
+
+
+class TestBrowserWarmup(TileTestCase):
+    layer = testing.security
+
+    def test_package_templates(self):
+        specs = package_templates('cone.app')
+        self.assertTrue('cone.app:browser/templates/navtree.pt' in specs)
+        self.assertTrue('cone.app:browser/templates/table.pt' in specs)
+        self.assertEqual(specs, sorted(specs))
+
+    def test_tile_templates(self):
+        paths = tile_templates(self.layer.registry)
+        self.assertTrue('cone.app.browser:templates/navtree.pt' in paths)
+        self.assertTrue('cone.app.browser:templates/mainmenu.pt' in paths)
+
+    def test_warmup_templates(self):
+        registry = self.layer.registry
+        timings = warmup_templates(registry, ['cone.app', 'inexistent'])
+        spec = 'cone.app.browser:templates/navtree.pt'
+        self.assertTrue(spec in timings)
+        self.assertTrue('cone.app:browser/templates/batch.pt' in timings)
+        self.assertTrue(timings[spec] >= 0)
+
+        # Renderers are registered and templates compiled
+        renderer = registry.queryUtility(ITemplateRenderer, name=spec)
+        self.assertTrue(renderer.template._cooked)
+
+    def test_configure_template_cache(self):
+        loader = BaseTemplate.loader
+        tempdir = tempfile.mkdtemp()
+        try:
+            cache_dir = os.path.join(tempdir, 'cache')
+            configure_template_cache(cache_dir)
+            self.assertTrue(os.path.isdir(cache_dir))
+            self.assertFalse(BaseTemplate.loader is loader)
+
+            # Compiled templates are written to cache directory
+            template_path = os.path.join(tempdir, 'template.pt')
+            with open(template_path, 'w') as f:
+                f.write('<div>${value}</div>')
+            template = PageTemplateFile(template_path)
+            self.assertEqual(template(value='Value'), '<div>Value</div>')
+            modules = [
+                name for name in os.listdir(cache_dir)
+                if name.endswith('.py')
+            ]
+            self.assertEqual(len(modules), 1)
+        finally:
+            BaseTemplate.loader = loader
+            shutil.rmtree(tempdir)
@@ -0,0 +1,181 @@
+from cone.app import testing
+from cone.app.fileugm import ChangeTrackingOdict
+from cone.app.fileugm import Ugm
+from node.tests import NodeTestCase
+import os
+import shutil
+import tempfile
+
+
+class TestFileUgm(NodeTestCase):
+    layer = testing.security
+
+    def setUp(self):
+        super(TestFileUgm, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestFileUgm, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    def create_ugm(self, compact_threshold=1000):
+        return Ugm(
+            name='ugm',
+            users_file=self.path('users'),
+            groups_file=self.path('groups'),
+            roles_file=self.path('roles'),
+            data_directory=self.path('data'),
+            compact_threshold=compact_threshold
+        )
+
+    def path(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def read(self, name):
+        with open(self.path(name)) as f:
+            return f.read()
+
+    def test_ChangeTrackingOdict(self):
+        data = ChangeTrackingOdict([('a', 1)])
+        data.changed.clear()
+        data['b'] = 2
+        del data['a']
+        self.assertEqual(data.changed, set(['a', 'b']))
+        self.assertEqual(list(data.items()), [('b', 2)])
+        data.changed.clear()
+        data.clear()
+        self.assertEqual(data.changed, set(['b']))
+
+    def test_journal(self):
+        ugm = self.create_ugm()
+        ugm.users.create('user1', fullname='User 1')
+        ugm.users.create('user2', fullname='User 2')
+        ugm.groups.create('group1')
+        ugm()
+
+        # Changes get appended to journal files
+        self.assertEqual(self.read('users.journal'), '+user1:\n+user2:\n')
+        self.assertEqual(self.read('groups.journal'), '+group1:\n')
+        self.assertFalse(os.path.exists(self.path('users')))
+        self.assertEqual(
+            self.read(os.path.join('data', 'users', 'user1')),
+            'fullname:User 1\n'
+        )
+
+        ugm.groups['group1'].add('user1')
+        ugm.users['user1'].add_role('manager')
+        ugm()
+        self.assertEqual(
+            self.read('groups.journal'),
+            '+group1:\n+group1:user1\n'
+        )
+        self.assertEqual(self.read('roles.journal'), '+user1::manager\n')
+
+        # Only changed entries are written
+        ugm.users.passwd('user2', None, 'secret')
+        self.assertEqual(len(self.read('users.journal').split('\n')), 4)
+        self.assertTrue(
+            self.read('users.journal').split('\n')[2].startswith('+user2:')
+        )
+
+        # Unchanged principal attributes are not written
+        os.remove(self.path(os.path.join('data', 'users', 'user1')))
+        ugm.users['user2'].attrs['fullname'] = 'Second User'
+        ugm()
+        self.assertFalse(
+            os.path.exists(self.path(os.path.join('data', 'users', 'user1')))
+        )
+        self.assertEqual(
+            self.read(os.path.join('data', 'users', 'user2')),
+            'fullname:Second User\n'
+        )
+
+        # Deleted entries
+        del ugm.users['user2']
+        ugm()
+        self.assertTrue(self.read('users.journal').endswith('-user2\n'))
+        self.assertFalse(
+            os.path.exists(self.path(os.path.join('data', 'users', 'user2')))
+        )
+
+        # Journal gets replayed on read
+        ugm = self.create_ugm()
+        self.assertEqual(list(ugm.users.keys()), ['user1'])
+        self.assertEqual(ugm.groups['group1'].member_ids, ['user1'])
+        self.assertEqual(ugm.users['user1'].roles, ['manager'])
+
+    def test_compaction(self):
+        ugm = self.create_ugm(compact_threshold=2)
+        ugm.users.create('user1')
+        ugm.users.create('user2')
+        ugm()
+        self.assertEqual(self.read('users.journal'), '+user1:\n+user2:\n')
+
+        # Threshold exceeded, storage file gets written and journal truncated
+        ugm.users.create('user3')
+        ugm()
+        self.assertEqual(self.read('users'), 'user1:\nuser2:\nuser3:\n')
+        self.assertEqual(self.read('users.journal'), '')
+
+        ugm.users.passwd('user1', None, 'secret')
+        del ugm.users['user2']
+        ugm()
+        self.assertEqual(len(self.read('users.journal').split('\n')), 3)
+        ugm.users.compact()
+        self.assertEqual(self.read('users.journal'), '')
+        self.assertEqual(
+            self.read('users').split('\n')[1:],
+            ['user3:', '']
+        )
+
+        ugm = self.create_ugm()
+        self.assertEqual(list(ugm.users.keys()), ['user1', 'user3'])
+        self.assertTrue(ugm.users.authenticate('user1', 'secret'))
+
+    def test_invalidate(self):
+        ugm1 = self.create_ugm(compact_threshold=3)
+        ugm1.users.create('user1', fullname='User 1')
+        ugm1.users.create('user2', fullname='User 2')
+        ugm1()
+
+        ugm2 = self.create_ugm(compact_threshold=3)
+        self.assertEqual(list(ugm2.users.keys()), ['user1', 'user2'])
+
+        # Appended journal entries are applied
+        ugm1.users['user1'].add_role('editor')
+        del ugm1.users['user2']
+        ugm1.users['user1'].attrs['fullname'] = 'First User'
+        ugm1()
+        ugm2.invalidate()
+        self.assertEqual(list(ugm2.users.keys()), ['user1'])
+        self.assertEqual(ugm2.users['user1'].roles, ['editor'])
+        self.assertEqual(
+            ugm2.users['user1'].attrs['fullname'],
+            'First User'
+        )
+
+        # Local changes are kept when writing after changes of other process
+        ugm1.users.create('user3')
+        ugm1()
+        ugm2.users.create('user4')
+        ugm2()
+        self.assertEqual(
+            sorted(ugm2.users.keys()),
+            ['user1', 'user3', 'user4']
+        )
+        ugm1.invalidate()
+        self.assertEqual(
+            sorted(ugm1.users.keys()),
+            ['user1', 'user3', 'user4']
+        )
+
+        # Compacted storage file gets reloaded
+        ugm1.users.create('user5')
+        ugm1()
+        ugm1.users.compact()
+        self.assertEqual(self.read('users.journal'), '')
+        ugm2.invalidate('users')
+        self.assertEqual(
+            sorted(ugm2.users.keys()),
+            ['user1', 'user3', 'user4', 'user5']
+        )
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
+from cone.app import model
 from cone.app import testing
+from cone.app.interfaces import IChildSortIndex
 from cone.app.interfaces import ILayout
 from cone.app.interfaces import IMetadata
 from cone.app.interfaces import INodeInfo
@@ -7,18 +9,23 @@ from cone.app.interfaces import IProperties
 from cone.app.model import AdapterNode
 from cone.app.model import AppNode
 from cone.app.model import BaseNode
+from cone.app.model import ChildSortIndex
+from cone.app.model import config_properties_cache
 from cone.app.model import ConfigProperties
 from cone.app.model import FactoryNode
+from cone.app.model import flush_properties
 from cone.app.model import get_node_info
 from cone.app.model import Layout
 from cone.app.model import Metadata
 from cone.app.model import node_info
 from cone.app.model import NodeInfo
 from cone.app.model import Properties
+from cone.app.model import properties_writer
 from cone.app.model import ProtectedProperties
 from cone.app.model import register_node_info
 from cone.app.model import UUIDAsName
 from cone.app.model import UUIDAttributeAware
+from cone.app.model import xml_properties_cache
 from cone.app.model import XMLProperties
 from datetime import datetime
 from node.behaviors import Adopt
@@ -31,9 +38,12 @@ from node.tests import NodeTestCase
 from odict import odict
 from plumber import plumbing
 from pyramid.security import ALL_PERMISSIONS
+import copy
 import os
+import pickle
 import shutil
 import tempfile
+import threading
 import uuid
 
 
@@ -327,6 +337,108 @@ class TestModel(NodeTestCase):
         self.assertFalse(copy.uuid == node.uuid)
         self.assertFalse(copy[copy.keys()[0]] == child.uuid)
 
+    def test_ChildSortIndex(self):
+        @plumbing(ChildSortIndex)
+        class IndexedNode(BaseNode):
+            pass
+
+        node = IndexedNode()
+        self.assertTrue(IChildSortIndex.providedBy(node))
+        for name, title, created in [
+            ('a', 'Charlie', datetime(2020, 1, 3)),
+            ('b', 'alpha', datetime(2020, 1, 1)),
+            ('c', 'Bravo', None),
+        ]:
+            child = node[name] = BaseNode()
+            child.metadata.title = title
+            child.metadata.creator = 'admin'
+            child.metadata.created = created
+
+        # Index gets built on first access
+        self.assertFalse(hasattr(node, '_child_sort_index'))
+        self.assertEqual(list(node.sorted_child_keys('title')), ['b', 'c', 'a'])
+        self.assertEqual(
+            list(node.sorted_child_keys('title', reverse=True)),
+            ['a', 'c', 'b']
+        )
+        # Equal sort values are ordered by key
+        self.assertEqual(
+            list(node.sorted_child_keys('creator')),
+            ['a', 'b', 'c']
+        )
+        # Missing dates are sorted first
+        self.assertEqual(
+            list(node.sorted_child_keys('created')),
+            ['c', 'b', 'a']
+        )
+
+        # Added children get indexed
+        child = node['d'] = BaseNode()
+        child.metadata.title = 'Delta'
+        node.reindex_child('d')
+        self.assertEqual(
+            list(node.sorted_child_keys('title')),
+            ['b', 'c', 'a', 'd']
+        )
+
+        # Modified children must be reindexed
+        node['b'].metadata.title = 'Echo'
+        self.assertEqual(
+            list(node.sorted_child_keys('title')),
+            ['b', 'c', 'a', 'd']
+        )
+        node.reindex_child('b')
+        self.assertEqual(
+            list(node.sorted_child_keys('title')),
+            ['c', 'a', 'd', 'b']
+        )
+
+        # Deleted children get unindexed
+        del node['a']
+        self.assertEqual(list(node.sorted_child_keys('title')), ['c', 'd', 'b'])
+        self.assertEqual(len(node._child_sort_index['created']), 3)
+        node.unindex_child('inexistent')
+
+        # Rebuild index
+        node._child_sort_index['title'] = []
+        node.rebuild_child_sort_index()
+        self.assertEqual(list(node.sorted_child_keys('title')), ['c', 'd', 'b'])
+
+        # Sorted keys are not affected by changes while iterating
+        keys = node.sorted_child_keys('title', reverse=True)
+        self.assertEqual(next(keys), 'b')
+        del node['d']
+        child = BaseNode()
+        child.metadata.title = 'Alpha'
+        node['e'] = child
+        self.assertEqual(list(keys), ['d', 'c'])
+        self.assertEqual(
+            list(node.sorted_child_keys('title')),
+            ['e', 'c', 'b']
+        )
+
+        # Concurrent index changes are serialized
+        def change(name):
+            for i in range(50):
+                node[name] = BaseNode()
+                node[name].metadata.title = name
+                node.reindex_child(name)
+                del node[name]
+
+        threads = [
+            threading.Thread(target=change, args=('t{}'.format(i),))
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            list(node.sorted_child_keys('title')),
+            ['e', 'c', 'b']
+        )
+        self.assertEqual(len(node._child_sort_index['created']), 3)
+
     def test_Properties(self):
         # ``Properties`` object can be used for any kind of mapping.
         props = Properties()
@@ -340,6 +452,76 @@ class TestModel(NodeTestCase):
         self.assertTrue('bar' in props)
         self.assertEqual(sorted(props.keys()), ['bar', 'foo'])
 
+    def test_Properties_fields(self):
+        # Declared fields are compiled to descriptors
+        self.assertTrue(isinstance(Properties.__dict__['in_navtree'], property))
+        self.assertTrue(isinstance(Metadata.__dict__['title'], property))
+        props = Properties()
+        self.assertTrue(props.in_navtree is None)
+        props.in_navtree = True
+        self.assertTrue(props.in_navtree)
+        self.assertEqual(list(props.keys()), ['in_navtree'])
+
+        # Instances have no __dict__
+        self.expect_error(
+            AttributeError,
+            object.__getattribute__,
+            props,
+            '__dict__'
+        )
+
+        # Subclasses may declare additional fields
+        class CustomProperties(Properties):
+            fields = ('custom',)
+
+        props = CustomProperties()
+        props.custom = 'value'
+        self.assertTrue(
+            isinstance(CustomProperties.__dict__['custom'], property)
+        )
+        self.assertEqual(props.custom, 'value')
+        self.assertEqual(props.icon, None)
+
+        # Explicitly defined attributes win over fields
+        class DefaultIconProperties(Properties):
+            icon = 'default-icon'
+
+        self.assertEqual(DefaultIconProperties().icon, 'default-icon')
+
+        # Also if inherited from intermediate subclasses
+        class InheritedIconProperties(DefaultIconProperties):
+            pass
+
+        self.assertEqual(InheritedIconProperties().icon, 'default-icon')
+
+        class ComputedMetadata(Metadata):
+
+            @property
+            def title(self):
+                return 'Computed'
+
+        class InheritedMetadata(ComputedMetadata):
+            fields = ('custom',)
+
+        self.assertEqual(InheritedMetadata().title, 'Computed')
+        self.assertEqual(InheritedMetadata().description, None)
+
+        # Fields of classes overriding __getattr__ delegate to it
+        class UpperProperties(Properties):
+
+            def __getattr__(self, name):
+                return name.upper()
+
+        props = UpperProperties()
+        self.assertEqual(props.icon, 'ICON')
+        self.assertEqual(props.other, 'OTHER')
+
+        # Properties can be pickled and copied
+        metadata = Metadata()
+        metadata.title = 'Title'
+        self.assertEqual(pickle.loads(pickle.dumps(metadata)).title, 'Title')
+        self.assertEqual(copy.deepcopy(metadata).title, 'Title')
+
     def test_ProtectedProperties(self):
         # Protected properties checks against permission for properties
         context = BaseNode()
@@ -592,6 +774,174 @@ class TestModel(NodeTestCase):
         # Cleanup
         shutil.rmtree(tempdir)
 
+    def test_XMLProperties_cache(self):
+        tempdir = tempfile.mkdtemp()
+        path = os.path.join(tempdir, 'props.xml')
+        try:
+            props = XMLProperties(path)
+            props.keywords = ['a', 'b']
+            props.dictlike = odict([('a', 'foo')])
+            props()
+
+            # Parsed files are cached by path and file state
+            xml_properties_cache.invalidate()
+            props = XMLProperties(path)
+            parsed = xml_properties_cache.storage[path][1]
+            self.assertEqual(props._keys(), ['keywords', 'dictlike'])
+            self.assertTrue(XMLProperties(path) is not props)
+            self.assertTrue(xml_properties_cache.storage[path][1] is parsed)
+
+            # Mutable values are not shared with the cache
+            props.keywords.append('c')
+            props.dictlike['b'] = 'bar'
+            self.assertEqual(parsed['keywords'], ['a', 'b'])
+            self.assertEqual(parsed['dictlike'], odict([('a', 'foo')]))
+
+            # Changed file is parsed again
+            props()
+            props = XMLProperties(path)
+            self.assertEqual(props.keywords, ['a', 'b', 'c'])
+            self.assertFalse(xml_properties_cache.storage[path][1] is parsed)
+        finally:
+            xml_properties_cache.invalidate()
+            shutil.rmtree(tempdir)
+
+    def test_ConfigProperties_cache(self):
+        tempdir = tempfile.mkdtemp()
+        path = os.path.join(tempdir, 'props.cfg')
+        try:
+            props = ConfigProperties(path, data={'foo': u'foo'})
+            props()
+
+            # Parsed config files are shared among instances
+            config_properties_cache.invalidate()
+            props = ConfigProperties(path)
+            self.assertEqual(props.foo, u'foo')
+            shared = config_properties_cache.storage[path][1]
+            other = ConfigProperties(path)
+            self.assertEqual(other.foo, u'foo')
+            self.assertTrue(other._read_config() is shared)
+
+            # Config gets copied on write
+            other.foo = u'changed'
+            self.assertEqual(other.foo, u'changed')
+            self.assertFalse(other._read_config() is shared)
+            self.assertEqual(props.foo, u'foo')
+            self.assertEqual(ConfigProperties(path).foo, u'foo')
+            self.assertFalse(props.config() is shared)
+            self.assertEqual(shared.get('properties', 'foo'), u'foo')
+
+            # Deleting copies as well
+            props = ConfigProperties(path)
+            del props['foo']
+            self.assertTrue(props.foo is None)
+            self.assertEqual(shared.get('properties', 'foo'), u'foo')
+
+            # Initial data is not applied to shared config
+            props = ConfigProperties(path, data={'bar': u'bar'})
+            self.assertEqual(props.bar, u'bar')
+            self.assertFalse(shared.has_option('properties', 'bar'))
+
+            # Changed file is read again
+            other()
+            props = ConfigProperties(path)
+            self.assertEqual(props.foo, u'changed')
+            self.assertFalse(props._read_config() is shared)
+
+            # External changes are recognized
+            with open(path, 'w') as f:
+                f.write('[properties]\nfoo = external\nbar = bar\n')
+            props = ConfigProperties(path)
+            self.assertEqual(props.foo, u'external')
+            self.assertEqual(props.bar, u'bar')
+        finally:
+            config_properties_cache.invalidate()
+            shutil.rmtree(tempdir)
+
+    def test_PropertiesWriter(self):
+        tempdir = tempfile.mkdtemp()
+        xml_path = os.path.join(tempdir, 'props.xml')
+        cfg_path = os.path.join(tempdir, 'props.cfg')
+        model.PROPERTIES_WRITE_DELAY = 60
+        try:
+            # Writes are deferred
+            props = XMLProperties(xml_path)
+            props.foo = u'foo'
+            props()
+            cfg = ConfigProperties(cfg_path)
+            cfg.foo = u'foo'
+            cfg()
+            self.assertEqual(os.listdir(tempdir), [])
+            self.assertEqual(
+                sorted(properties_writer.pending.keys()),
+                [cfg_path, xml_path]
+            )
+
+            # Multiple writes are coalesced
+            props.bar = u'bar'
+            props()
+            self.assertEqual(len(properties_writer.pending), 2)
+
+            # Pending data is read by new instances
+            self.assertEqual(XMLProperties(xml_path).bar, u'bar')
+            self.assertEqual(ConfigProperties(cfg_path).foo, u'foo')
+
+            # Write pending data
+            flush_properties()
+            self.assertEqual(properties_writer.pending, odict())
+            self.assertEqual(
+                sorted(os.listdir(tempdir)),
+                ['props.cfg', 'props.xml']
+            )
+            self.assertEqual(XMLProperties(xml_path)._keys(), ['foo', 'bar'])
+            self.assertEqual(ConfigProperties(cfg_path).foo, u'foo')
+
+            # Pending data is written after delay
+            model.PROPERTIES_WRITE_DELAY = 0.2
+            props.baz = u'baz'
+            props()
+            timer = properties_writer._timer
+            self.assertTrue(timer.daemon)
+            timer.join()
+            self.assertEqual(properties_writer.pending, odict())
+            self.assertEqual(XMLProperties(xml_path).baz, u'baz')
+
+            # Write failures are logged and kept pending, remaining data gets
+            # written
+            with open(cfg_path, 'rb') as f:
+                cfg_data = f.read()
+            model.PROPERTIES_WRITE_DELAY = 60
+            failing_dir = os.path.join(tempdir, 'inexistent')
+            failing_path = os.path.join(failing_dir, 'props.cfg')
+            failing = ConfigProperties(failing_path)
+            failing.foo = u'foo'
+            failing()
+            cfg()
+            properties_writer.flush()
+            self.assertEqual(list(properties_writer.pending), [failing_path])
+            with open(cfg_path, 'rb') as f:
+                self.assertEqual(f.read(), cfg_data)
+
+            # Failed writes get retried after delay
+            timer = properties_writer._timer
+            self.assertTrue(timer.is_alive())
+
+            # Explicit flush raises write failures
+            self.expect_error(EnvironmentError, flush_properties)
+            self.assertEqual(list(properties_writer.pending), [failing_path])
+            self.assertEqual(ConfigProperties(failing_path).foo, u'foo')
+
+            # Pending data gets written once possible
+            os.mkdir(failing_dir)
+            flush_properties()
+            self.assertEqual(properties_writer.pending, odict())
+            self.assertEqual(properties_writer._timer, None)
+            self.assertTrue(os.path.exists(failing_path))
+        finally:
+            model.PROPERTIES_WRITE_DELAY = 0
+            flush_properties()
+            shutil.rmtree(tempdir)
+
     def test_ConfigProperties(self):
         # A Properties implementation exists for Config files used by python
         # configparser
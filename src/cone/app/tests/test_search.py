@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+from cone.app import testing
+from cone.app.model import BaseNode
+from cone.app.search import disable_fulltext_index
+from cone.app.search import enable_fulltext_index
+from cone.app.search import FulltextIndex
+from cone.app.search import fulltext_index
+from cone.app.search import ngrams
+from cone.app.search import node_by_path
+from node.events import NodeModifiedEvent
+from node.tests import NodeTestCase
+from zope.component.event import objectEventNotify
+import threading
+
+
+def create_tree():
+    root = BaseNode(name='root')
+    for name, title, creator in [
+        ('folder', 'Documents', 'admin'),
+        ('news', 'Latest News', 'editor'),
+    ]:
+        node = root[name] = BaseNode()
+        node.metadata.title = title
+        node.metadata.creator = creator
+    for name, title in [
+        ('doc1', u'Annual Report'),
+        ('doc2', u'Report Draft'),
+        ('doc3', u'Überblick'),
+    ]:
+        node = root['folder'][name] = BaseNode()
+        node.metadata.title = title
+        node.metadata.creator = 'editor'
+    return root
+
+
+class TestSearch(NodeTestCase):
+    layer = testing.security
+
+    def test_ngrams(self):
+        self.assertEqual(ngrams(u'report'), set([
+            u'rep', u'epo', u'por', u'ort'
+        ]))
+        self.assertEqual(ngrams(u'ab'), set())
+
+    def test_node_by_path(self):
+        root = create_tree()
+        self.assertTrue(node_by_path(root, ()) is root)
+        self.assertEqual(
+            node_by_path(root, ('folder', 'doc1')).name,
+            'doc1'
+        )
+        self.assertEqual(node_by_path(root, ('folder', 'inexistent')), None)
+
+    def test_FulltextIndex(self):
+        root = create_tree()
+        index = FulltextIndex()
+        index.build(root)
+        self.assertTrue(index.built)
+        self.assertEqual(len(index.docs), 5)
+        self.assertEqual(index.path_for(root['folder']['doc1']), (
+            'folder', 'doc1'
+        ))
+        self.assertEqual(index.path_for(root), ())
+        self.assertEqual(index.path_for(BaseNode(name='other')), None)
+
+        # Search for substring in metadata
+        self.assertEqual(
+            index.search('report'),
+            set([('folder', 'doc1'), ('folder', 'doc2')])
+        )
+        self.assertEqual(index.search('PORT DR'), set([('folder', 'doc2')]))
+        self.assertEqual(index.search(u'überb'), set([('folder', 'doc3')]))
+        self.assertEqual(index.search('inexistent'), set())
+
+        # Search in fields
+        self.assertEqual(
+            index.search('editor', fields=['creator'], parent=()),
+            set([('news',)])
+        )
+        self.assertEqual(index.search('editor', fields=['title']), set())
+
+        # Terms shorter than n-gram size
+        self.assertEqual(
+            index.search('e', fields=['title'], parent=('folder',)),
+            set([('folder', 'doc1'), ('folder', 'doc2'), ('folder', 'doc3')])
+        )
+        self.assertEqual(index.search('dr'), set([('folder', 'doc2')]))
+
+        # Search for all words
+        self.assertEqual(
+            index.search_words('report annual'),
+            set([('folder', 'doc1')])
+        )
+        self.assertEqual(index.search_words('report inexistent'), set())
+        self.assertEqual(index.search_words(''), set())
+
+        # Sorted search result
+        self.assertEqual(index.search_words('report', sort_on='title'), [
+            ('folder', 'doc1'), ('folder', 'doc2')
+        ])
+        self.assertEqual(index.search_words('inexistent', sort_on='title'), [])
+
+        # Concurrent unindexing does not break sorting
+        def unindex():
+            index.unindex(root['folder']['doc2'])
+            index.index(root['folder']['doc2'])
+
+        threads = [threading.Thread(target=unindex) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for i in range(100):
+            self.assertEqual(
+                len(index.search_words('report', sort_on='title')),
+                2
+            )
+        for thread in threads:
+            thread.join()
+
+        # Reindex node
+        root['news'].metadata.title = 'Old News'
+        index.index(root['news'])
+        self.assertEqual(index.search('latest'), set())
+        self.assertEqual(index.search('old news'), set([('news',)]))
+        self.assertEqual(index.doc(('news',))['title'], 'old news')
+
+        # Unindex node and descendants
+        index.unindex(root['folder'])
+        self.assertEqual(list(index.docs.keys()), [('news',)])
+        self.assertEqual(index.search('report'), set())
+        self.assertFalse('rep' in index.postings)
+        self.assertEqual(list(index.children.keys()), [()])
+
+        # Index recursive
+        index.index(root['folder'], recursive=True)
+        self.assertEqual(len(index.docs), 5)
+
+        # Index gets built lazy
+        index = FulltextIndex()
+        index.root = root
+        self.assertFalse(index.built)
+        self.assertEqual(len(index.search('report')), 2)
+        self.assertTrue(index.built)
+
+    def test_lifecycle_events(self):
+        root = create_tree()
+        enable_fulltext_index(root)
+        try:
+            self.assertTrue(fulltext_index.root is root)
+            self.assertFalse(fulltext_index.built)
+
+            # Events are ignored as long as index is not built
+            root['other'] = BaseNode()
+            self.assertEqual(fulltext_index.docs, {})
+
+            self.assertEqual(
+                fulltext_index.search('report'),
+                set([('folder', 'doc1'), ('folder', 'doc2')])
+            )
+
+            # Added nodes get indexed including children
+            folder = BaseNode()
+            folder['doc'] = BaseNode()
+            folder['doc'].metadata.title = 'Report Archive'
+            root['archive'] = folder
+            self.assertEqual(
+                fulltext_index.search('report archive'),
+                set([('archive', 'doc')])
+            )
+
+            # Nodes outside the tree are not indexed
+            other = BaseNode(name='other')
+            other['doc'] = BaseNode()
+            self.assertEqual(fulltext_index.path_for(other['doc']), None)
+            self.assertEqual(len(fulltext_index.docs), 8)
+
+            # Modified nodes get reindexed
+            root['news'].metadata.title = 'Old News'
+            objectEventNotify(NodeModifiedEvent(root['news']))
+            self.assertEqual(
+                fulltext_index.search('old news'),
+                set([('news',)])
+            )
+
+            # Removed nodes get unindexed
+            del root['archive']
+            self.assertEqual(fulltext_index.search('report archive'), set())
+            self.assertEqual(len(fulltext_index.docs), 6)
+
+            # Detached nodes get unindexed
+            root.detach('folder')
+            self.assertEqual(fulltext_index.search('report'), set())
+            self.assertEqual(len(fulltext_index.docs), 2)
+        finally:
+            disable_fulltext_index()
+        self.assertEqual(fulltext_index.root, None)
+        self.assertEqual(fulltext_index.docs, {})
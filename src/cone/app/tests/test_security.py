@@ -3,15 +3,22 @@ from cone.app import testing
 from cone.app.interfaces import IOwnerSupport
 from cone.app.interfaces import IPrincipalACL
 from cone.app.model import BaseNode
+from cone.app.security import acl_cache
 from cone.app.security import acl_registry
 from cone.app.security import authenticate
 from cone.app.security import authenticated_user
 from cone.app.security import DEFAULT_ACL
+from cone.app.security import filter_permitted
 from cone.app.security import groups_callback
+from cone.app.security import has_permission
+from cone.app.security import invalidate_acl_cache
+from cone.app.security import invalidate_roles_cache
 from cone.app.security import logger
 from cone.app.security import OwnerSupport
+from cone.app.security import PermissionChecker
 from cone.app.security import principal_by_id
 from cone.app.security import PrincipalACL
+from cone.app.security import roles_cache
 from cone.app.security import search_for_principals
 from cone.app.ugm import ugm_backend
 from node.ext.ugm.interfaces import IGroup
@@ -25,6 +32,9 @@ from pyramid.interfaces import IAuthenticationPolicy
 from pyramid.security import ACLAllowed
 from pyramid.security import ACLDenied
 from pyramid.security import ALL_PERMISSIONS
+from pyramid.security import Allow
+from pyramid.security import Deny
+from pyramid.security import Everyone
 from pyramid.threadlocal import get_current_registry
 from zope.component.globalregistry import BaseGlobalComponents
 import logging
@@ -415,6 +425,315 @@ class SecurityTest(NodeTestCase):
             ('Deny', 'system.Everyone', ALL_PERMISSIONS)
         )
 
+    def test_ACLCache(self):
+        class CountingPrincipalACL(PrincipalACL):
+            computed = 0
+
+            @default
+            @property
+            def aggregated_roles(self):
+                CountingPrincipalACL.computed += 1
+                return {'someuser': set(['editor'])}
+
+            @default
+            @instance_property
+            def principal_roles(self):
+                return dict()
+
+        @plumbing(CountingPrincipalACL, OwnerSupport)
+        class CachedNode(BaseNode):
+            role_inheritance = True
+
+        def find_rule(acl, who):
+            for rule in acl:
+                if rule[1] == who:
+                    return rule
+
+        # ACL cache is disabled by default
+        self.assertEqual(security.ACL_CACHE, None)
+        self.layer.new_request()
+        node = CachedNode(name='node')
+        node.__acl__
+        node.__acl__
+        self.assertEqual(CountingPrincipalACL.computed, 2)
+        self.assertEqual(acl_cache.storage(), None)
+
+        # Request scoped ACL cache
+        security.ACL_CACHE = 'request'
+        try:
+            CountingPrincipalACL.computed = 0
+            request = self.layer.new_request()
+            acl = node.__acl__
+            self.assertTrue(node.__acl__ is acl)
+            self.assertEqual(CountingPrincipalACL.computed, 1)
+            self.assertEqual(len(request.environ[security.ACL_CACHE_KEY][1]), 2)
+
+            # Equal node by class and path shares cache entry
+            other = CachedNode(name='node')
+            self.assertTrue(other.__acl__ is acl)
+            self.assertEqual(CountingPrincipalACL.computed, 1)
+
+            # New request computes ACL again
+            self.layer.new_request()
+            self.assertFalse(node.__acl__ is acl)
+            self.assertEqual(CountingPrincipalACL.computed, 2)
+
+            # Invalidation bumps version and recomputes ACL
+            version = acl_cache.version
+            invalidate_acl_cache()
+            self.assertEqual(acl_cache.version, version + 1)
+            node.__acl__
+            self.assertEqual(CountingPrincipalACL.computed, 3)
+
+            # Owner is considered in cache key
+            node.owner = 'sepp'
+            self.assertEqual(find_rule(node.__acl__, 'sepp')[1], 'sepp')
+            node.owner = 'max'
+            self.assertEqual(find_rule(node.__acl__, 'sepp'), None)
+            self.assertEqual(find_rule(node.__acl__, 'max')[1], 'max')
+        finally:
+            security.ACL_CACHE = None
+
+        # Process wide ACL cache
+        security.ACL_CACHE = 'process'
+        try:
+            CountingPrincipalACL.computed = 0
+            self.layer.new_request()
+            acl = node.__acl__
+            self.layer.new_request()
+            self.assertTrue(node.__acl__ is acl)
+            self.assertEqual(CountingPrincipalACL.computed, 1)
+
+            invalidate_acl_cache()
+            self.assertEqual(acl_cache.process_cache, {})
+            self.assertFalse(node.__acl__ is acl)
+            self.assertEqual(CountingPrincipalACL.computed, 2)
+
+            # Cache size is bounded
+            max_size = security.ACL_CACHE_MAX_SIZE
+            security.ACL_CACHE_MAX_SIZE = 2
+            try:
+                CachedNode(name='a').__acl__
+                self.assertEqual(len(acl_cache.process_cache), 2)
+                CachedNode(name='b').__acl__
+                self.assertEqual(len(acl_cache.process_cache), 2)
+            finally:
+                security.ACL_CACHE_MAX_SIZE = max_size
+
+            # Process wide entries expire after timeout
+            invalidate_acl_cache()
+            CountingPrincipalACL.computed = 0
+            ttl = security.ACL_CACHE_TTL
+            security.ACL_CACHE_TTL = 0
+            try:
+                acl = node.__acl__
+                self.assertFalse(node.__acl__ is acl)
+                self.assertEqual(CountingPrincipalACL.computed, 2)
+            finally:
+                security.ACL_CACHE_TTL = ttl
+        finally:
+            security.ACL_CACHE = None
+            invalidate_acl_cache()
+
+    def test_filter_permitted(self):
+        class CountingNode(BaseNode):
+            evaluated = list()
+            acl = None
+
+            @property
+            def __acl__(self):
+                CountingNode.evaluated.append(self.name)
+                if self.acl is not None:
+                    return self.acl
+                return []
+
+        root = CountingNode(name='root')
+        root.acl = [
+            (Allow, 'role:editor', ['view', 'edit']),
+            (Allow, Everyone, 'login'),
+            (Deny, Everyone, ALL_PERMISSIONS),
+        ]
+        root['folder'] = CountingNode()
+        folder = root['folder']
+        for name in ['a', 'b', 'c']:
+            folder[name] = CountingNode()
+        folder['b'].acl = [(Deny, 'role:editor', ['view'])]
+        folder['c'].acl = [(Allow, 'sepp', ['view'])]
+
+        with self.layer.authenticated('editor'):
+            request = self.layer.new_request()
+            checker = PermissionChecker(request, 'view')
+            self.assertTrue('role:editor' in checker.principals)
+            self.assertTrue(checker(folder['a']))
+            self.assertFalse(checker(folder['b']))
+            self.assertTrue(checker(folder['c']))
+            # ACL's of folder and root get evaluated only once
+            self.assertEqual(
+                CountingNode.evaluated,
+                ['a', 'folder', 'root', 'b', 'c']
+            )
+            self.assertTrue(checker(folder['a']))
+            self.assertEqual(len(CountingNode.evaluated), 5)
+
+            children = filter_permitted(request, 'view', folder.values())
+            self.assertEqual([node.name for node in children], ['a', 'c'])
+            self.assertEqual(
+                filter_permitted(request, 'edit', folder.values()),
+                [folder['a'], folder['b'], folder['c']]
+            )
+            self.assertEqual(
+                filter_permitted(request, 'login', [folder['b']]),
+                [folder['b']]
+            )
+            self.assertEqual(
+                filter_permitted(request, 'delete', folder.values()),
+                []
+            )
+
+            # Result matches ``request.has_permission``
+            for node in [root, folder] + list(folder.values()):
+                for permission in ['view', 'edit', 'login', 'delete']:
+                    self.assertEqual(
+                        PermissionChecker(request, permission)(node),
+                        bool(request.has_permission(permission, node))
+                    )
+
+        with self.layer.authenticated('sepp'):
+            request = self.layer.new_request()
+            children = filter_permitted(request, 'view', folder.values())
+            self.assertEqual([node.name for node in children], ['c'])
+
+        request = self.layer.new_request()
+        children = filter_permitted(request, 'view', folder.values())
+        self.assertEqual(children, [])
+
+    def test_has_permission(self):
+        class CountingRequest(object):
+            checks = 0
+
+            def __init__(self, request):
+                self.environ = request.environ
+                self.request = request
+
+            def has_permission(self, permission, context):
+                self.checks += 1
+                return self.request.has_permission(permission, context)
+
+        root = BaseNode(name='root')
+        root['a'] = BaseNode()
+        root['b'] = BaseNode()
+
+        with self.layer.authenticated('editor'):
+            request = CountingRequest(self.layer.new_request())
+            for i in range(3):
+                for node in root.values():
+                    self.assertTrue(has_permission(request, 'edit', node))
+                    self.assertFalse(has_permission(request, 'manage', node))
+            self.assertEqual(request.checks, 4)
+            version, storage = request.environ[security.PERMISSION_CACHE_KEY]
+            self.assertEqual(version, acl_cache.version)
+            self.assertEqual(len(storage), 4)
+
+            # Memoized results are discarded on ACL cache invalidation
+            invalidate_acl_cache()
+            self.assertTrue(has_permission(request, 'edit', root['a']))
+            self.assertEqual(request.checks, 5)
+
+        # Identity change by test layer discards memoized results
+        self.assertFalse(
+            security.PERMISSION_CACHE_KEY in request.environ
+        )
+        self.assertFalse(has_permission(request, 'edit', root['a']))
+        self.assertEqual(request.checks, 6)
+
+        # New request starts with empty memo
+        request = CountingRequest(self.layer.new_request())
+        self.assertFalse(has_permission(request, 'edit', root['a']))
+        self.assertEqual(request.checks, 1)
+
+    def test_RolesCache(self):
+        def new_request():
+            # test layer passes request roles cache to new requests
+            request = self.layer.new_request()
+            request.environ.pop(security.ROLES_CACHE_KEY, None)
+            return request
+
+        # Roles cache is disabled by default
+        self.assertEqual(security.ROLES_CACHE_TTL, 0)
+        self.assertEqual(
+            groups_callback('editor', new_request()),
+            ['role:editor']
+        )
+        self.assertEqual(roles_cache.stats['size'], 0)
+
+        security.ROLES_CACHE_TTL = 60
+        ugm = ugm_backend.ugm
+        try:
+            invalidate_roles_cache()
+            roles_cache.hits = roles_cache.misses = 0
+
+            self.assertEqual(
+                sorted(groups_callback('max', new_request())),
+                ['group:group1', 'role:editor']
+            )
+            self.assertEqual(roles_cache.stats, {
+                'hits': 0,
+                'misses': 1,
+                'size': 1
+            })
+
+            # Cached roles get used by subsequent requests
+            ugm_backend.ugm = None
+            request = new_request()
+            self.assertEqual(
+                sorted(groups_callback('max', request)),
+                ['group:group1', 'role:editor']
+            )
+            self.assertEqual(
+                sorted(request.environ[security.ROLES_CACHE_KEY]),
+                ['group:group1', 'role:editor']
+            )
+            self.assertEqual(roles_cache.hits, 1)
+
+            # Returned roles are copies
+            groups_callback('max', new_request()).append('foo')
+            self.assertEqual(
+                sorted(groups_callback('max', new_request())),
+                ['group:group1', 'role:editor']
+            )
+
+            # Expired entries are ignored
+            roles_cache.storage['max'] = (0, ('role:manager',))
+            ugm_backend.ugm = ugm
+            self.assertEqual(
+                sorted(groups_callback('max', new_request())),
+                ['group:group1', 'role:editor']
+            )
+
+            # Invalidate single user
+            groups_callback('editor', new_request())
+            self.assertEqual(sorted(roles_cache.storage), ['editor', 'max'])
+            invalidate_roles_cache('max')
+            self.assertEqual(sorted(roles_cache.storage), ['editor'])
+
+            # Invalidate all users
+            invalidate_roles_cache()
+            self.assertEqual(roles_cache.storage, {})
+
+            # Cache size is bounded
+            max_size = security.ROLES_CACHE_MAX_SIZE
+            security.ROLES_CACHE_MAX_SIZE = 1
+            try:
+                roles_cache.set('viewer', ['role:viewer'])
+                roles_cache.set('editor', ['role:editor'])
+                self.assertEqual(sorted(roles_cache.storage), ['editor'])
+            finally:
+                security.ROLES_CACHE_MAX_SIZE = max_size
+        finally:
+            ugm_backend.ugm = ugm
+            security.ROLES_CACHE_TTL = 0
+            invalidate_roles_cache()
+
     def test_authentication_logging(self):
         # If an authentication plugin raises an error when calling
         # ``authenticate``, an error message is logged
@@ -453,6 +772,12 @@ class SecurityTest(NodeTestCase):
         ...security.py, ..., "'object' object has no attribute 'users'">
         """, str(handler.record))
 
+        # Principal lookup by id fails silently
+        handler.record = None
+        self.assertEqual(principal_by_id('foo'), None)
+        self.assertEqual(principal_by_id('group:foo'), None)
+        self.assertEqual(handler.record, None)
+
         # Cleanup
         logger.setLevel(logging.INFO)
         logger.removeHandler(handler)
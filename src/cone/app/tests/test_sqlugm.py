@@ -0,0 +1,277 @@
+from cone.app import sqlugm
+from cone.app import testing
+from cone.app.sqlugm import check_password
+from cone.app.sqlugm import ConnectionPool
+from cone.app.sqlugm import glob_pattern
+from cone.app.sqlugm import hash_password
+from cone.app.sqlugm import migrate_file_ugm
+from cone.app.sqlugm import migrate_main
+from cone.app.sqlugm import Ugm
+from node.ext.ugm.file import Ugm as FileUgm
+from node.tests import NodeTestCase
+import os
+import shutil
+import tempfile
+import threading
+
+
+class TestSQLUgm(NodeTestCase):
+    layer = testing.security
+
+    def setUp(self):
+        super(TestSQLUgm, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestSQLUgm, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    def create_ugm(self):
+        return Ugm(
+            name='ugm',
+            database=os.path.join(self.tempdir, 'ugm.db')
+        )
+
+    def test_password(self):
+        hashed = hash_password(u'secret')
+        self.assertTrue(check_password('secret', hashed))
+        self.assertFalse(check_password('other', hashed))
+
+    def test_glob_pattern(self):
+        self.assertEqual(glob_pattern('*'), '*')
+        self.assertEqual(glob_pattern('**'), None)
+        self.assertEqual(glob_pattern('foo'), 'foo')
+        self.assertEqual(glob_pattern('*foo'), '*foo')
+        self.assertEqual(glob_pattern('foo*'), 'foo*')
+        self.assertEqual(glob_pattern('*f?o*'), '*f[?]o*')
+        self.assertEqual(glob_pattern('f*[o'), 'f[*][[]o')
+
+    def test_ConnectionPool(self):
+        pool = ConnectionPool(os.path.join(self.tempdir, 'test.db'))
+        connection = pool.connection
+        self.assertTrue(pool.connection is connection)
+
+        # Each thread gets its own connection
+        connections = list()
+
+        def get_connection():
+            connections.append(pool.connection)
+            pool.close()
+
+        thread = threading.Thread(target=get_connection)
+        thread.start()
+        thread.join()
+        self.assertFalse(connections[0] is connection)
+
+        # Connections are not shared with forked processes
+        pool._pid = -1
+        self.assertFalse(pool.connection is connection)
+        pool.close()
+        connection.close()
+
+    def test_principals(self):
+        ugm = self.create_ugm()
+        users = ugm.users
+        groups = ugm.groups
+        self.assertEqual(ugm.fts, True)
+        self.assertEqual(list(ugm.keys()), ['users', 'groups'])
+
+        user = users.create('alice', fullname='Alice Smith')
+        users.create('bob', fullname='Bob Miller')
+        self.assertEqual(users.keys(), ['alice', 'bob'])
+        self.assertEqual(len(users), 2)
+        self.assertTrue(users['alice'] is user)
+        self.assertEqual(user.attrs['fullname'], 'Alice Smith')
+        self.assertEqual(user.attrs['id'], 'alice')
+        self.expect_error(KeyError, lambda: users['inexistent'])
+
+        # Lookup multiple principals at once
+        self.assertEqual(
+            users.get_many(['alice', 'inexistent', 'bob']),
+            {'alice': user, 'bob': users['bob']}
+        )
+        chunk_size = sqlugm.QUERY_CHUNK_SIZE
+        sqlugm.QUERY_CHUNK_SIZE = 1
+        try:
+            self.assertEqual(
+                sorted(users.get_many(['bob', 'alice'])),
+                ['alice', 'bob']
+            )
+        finally:
+            sqlugm.QUERY_CHUNK_SIZE = chunk_size
+        self.assertEqual(groups.get_many(['alice']), {})
+
+        group = groups.create('admins', title='Admins')
+        group.add('alice')
+        self.expect_error(KeyError, group.add, 'inexistent')
+        self.assertEqual(group.member_ids, ['alice'])
+        self.assertEqual(group.users, [user])
+        self.assertTrue(group['alice'] is user)
+        self.assertEqual(user.group_ids, ['admins'])
+        self.assertEqual(user.groups, [group])
+
+        # Roles
+        user.add_role('manager')
+        group.add_role('editor')
+        self.assertEqual(user.roles, ['manager'])
+        self.assertEqual(group.roles, ['editor'])
+        self.expect_error(ValueError, user.add_role, 'manager')
+        user.remove_role('manager')
+        self.assertEqual(user.roles, [])
+        self.expect_error(ValueError, user.remove_role, 'manager')
+
+        # Passwords
+        users.passwd('alice', None, 'secret')
+        self.assertTrue(users.authenticate('alice', 'secret'))
+        self.assertFalse(users.authenticate('alice', 'other'))
+        self.assertFalse(users.authenticate('bob', 'secret'))
+        self.assertFalse(users.authenticate('inexistent', 'secret'))
+        self.expect_error(ValueError, users.passwd, 'alice', 'other', 'new')
+        self.expect_error(ValueError, users.passwd, 'inexistent', None, 'new')
+        self.assertEqual(users.id_for_login('alice'), 'alice')
+
+        # Attributes get written on call
+        user.attrs['fullname'] = 'Alice Jones'
+        del users['bob'].attrs['fullname']
+        ugm()
+        other = self.create_ugm()
+        self.assertEqual(
+            other.users['alice'].attrs['fullname'],
+            'Alice Jones'
+        )
+        self.assertEqual(list(other.users['bob'].attrs.keys()), [])
+
+        # Invalidate
+        user.attrs['fullname'] = 'Changed'
+        ugm.invalidate()
+        self.assertEqual(users['alice'].attrs['fullname'], 'Alice Jones')
+
+        # Delete principals
+        del group['alice']
+        self.assertEqual(group.member_ids, [])
+        self.expect_error(KeyError, group.__delitem__, 'alice')
+        group.add('alice')
+        del users['alice']
+        self.assertEqual(users.keys(), ['bob'])
+        self.assertEqual(group.member_ids, [])
+        del groups['admins']
+        self.assertEqual(groups.keys(), [])
+        self.expect_error(KeyError, groups.__delitem__, 'admins')
+
+    def test_search(self):
+        ugm = self.create_ugm()
+        users = ugm.users
+        users.create('alice', fullname='Alice Smith', email='alice@example.com')
+        users.create('bob', fullname='Bob Smith', email='bob@example.com')
+        users.create('carol', fullname='Carol', email='')
+
+        self.assertEqual(users.search(), ['alice', 'bob', 'carol'])
+        self.assertEqual(
+            users.search(criteria={'id': '*o*'}),
+            ['bob', 'carol']
+        )
+        self.assertEqual(users.search(criteria={'id': 'al*'}), ['alice'])
+        self.assertEqual(users.search(criteria={'id': '**'}), [])
+        self.assertEqual(
+            users.search(criteria={'fullname': '*Smith'}),
+            ['alice', 'bob']
+        )
+        self.assertEqual(users.search(criteria={'fullname': '*smith'}), [])
+        self.assertEqual(
+            users.search(criteria={'email': '*'}),
+            ['alice', 'bob']
+        )
+        self.assertEqual(
+            users.search(criteria={'fullname': '*Smith', 'id': 'b*'}),
+            ['bob']
+        )
+        self.assertEqual(
+            users.search(
+                criteria={'fullname': 'Carol', 'id': 'b*'},
+                or_search=True
+            ),
+            ['bob', 'carol']
+        )
+        self.assertEqual(
+            users.search(
+                criteria={'id': 'alice'},
+                attrlist=['id', 'fullname', 'inexistent'],
+                exact_match=True
+            ),
+            [('alice', {
+                'id': 'alice',
+                'fullname': 'Alice Smith',
+                'inexistent': ''
+            })]
+        )
+        err = self.expect_error(
+            ValueError,
+            users.search,
+            criteria={'fullname': '*Smith'},
+            exact_match=True
+        )
+        self.assertEqual(str(err), 'Exact match asked but result not unique')
+        err = self.expect_error(
+            ValueError,
+            users.search,
+            criteria={'id': 'inexistent'},
+            exact_match=True
+        )
+        self.assertEqual(
+            str(err),
+            'Exact match asked but result length is zero'
+        )
+
+        # Full text index is kept in sync
+        users['alice'].attrs['fullname'] = 'Alice Jones'
+        users['alice']()
+        self.assertEqual(users.search(criteria={'fullname': '*Smi*'}), ['bob'])
+        del users['bob']
+        self.assertEqual(users.search(criteria={'fullname': '*Smi*'}), [])
+
+        # Fallback without full text index
+        ugm.fts = False
+        self.assertEqual(
+            users.search(criteria={'fullname': 'Alice*'}),
+            ['alice']
+        )
+
+    def test_migrate_file_ugm(self):
+        source = FileUgm(
+            name='ugm',
+            users_file=os.path.join(self.tempdir, 'users'),
+            groups_file=os.path.join(self.tempdir, 'groups'),
+            roles_file=os.path.join(self.tempdir, 'roles'),
+            data_directory=os.path.join(self.tempdir, 'data')
+        )
+        source.users.create('alice', fullname='Alice')
+        source.users.create('bob')
+        source.groups.create('admins', title='Admins')
+        source()
+        source.groups['admins'].add('alice')
+        source.users['alice'].add_role('manager')
+        source.groups['admins'].add_role('editor')
+        source()
+        source.users.passwd('alice', None, 'secret')
+
+        database = os.path.join(self.tempdir, 'ugm.db')
+        migrate_main([
+            '--users-file', source.users_file,
+            '--groups-file', source.groups_file,
+            '--roles-file', source.roles_file,
+            '--datadir', source.data_directory,
+            database
+        ])
+        target = Ugm(name='ugm', database=database)
+        self.assertEqual(target.users.keys(), ['alice', 'bob'])
+        self.assertEqual(target.groups.keys(), ['admins'])
+        self.assertEqual(target.users['alice'].attrs['fullname'], 'Alice')
+        self.assertEqual(target.groups['admins'].attrs['title'], 'Admins')
+        self.assertEqual(target.groups['admins'].member_ids, ['alice'])
+        self.assertEqual(target.users['alice'].roles, ['manager'])
+        self.assertEqual(target.groups['admins'].roles, ['editor'])
+        self.assertTrue(target.users.authenticate('alice', 'secret'))
+
+        # Migration can be repeated
+        self.assertEqual(migrate_file_ugm(source, target), 3)
+        self.assertEqual(target.users.keys(), ['alice', 'bob'])
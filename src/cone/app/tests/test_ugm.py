@@ -1,11 +1,23 @@
+from cone.app import security
 from cone.app import testing
+from cone.app import ugm as ugm_module
+from cone.app.fileugm import Ugm as JournalFileUgm
+from cone.app.sqlugm import Ugm as SQLiteUgm
 from cone.app.ugm import BCFileUGMFactory
 from cone.app.ugm import FileUGMFactory
+from cone.app.ugm import invalidate_principal_cache
+from cone.app.ugm import JournalFileUGMFactory
+from cone.app.ugm import principal_cache
 from cone.app.ugm import principal_data
+from cone.app.ugm import principals_by_ids
+from cone.app.ugm import SQLiteUGMFactory
 from cone.app.ugm import ugm_backend
 from cone.app.ugm import UGMFactory
 from node.ext.ugm.file import Ugm as FileUgm
 from node.tests import NodeTestCase
+import os
+import shutil
+import tempfile
 
 
 def restore_ugm_backend(fn):
@@ -119,6 +131,108 @@ class TestUgm(NodeTestCase):
         self.assertEqual(ugm.roles_file, 'roles')
         self.assertEqual(ugm.data_directory, 'userdata')
 
+    @restore_ugm_backend
+    def test_JournalFileUGMFactory(self):
+        self.assertTrue(ugm_backend.registry['journal'] is JournalFileUGMFactory)
+
+        ugm_backend.load('journal', {
+            'ugm.users_file': 'users',
+            'ugm.groups_file': 'groups',
+            'ugm.roles_file': 'roles',
+            'ugm.datadir': 'userdata',
+            'ugm.journal_compact_threshold': '10'
+        })
+        ugm_backend.initialize()
+        ugm = ugm_backend.ugm
+
+        self.assertTrue(isinstance(ugm, JournalFileUgm))
+        self.assertEqual(ugm.users_file, 'users')
+        self.assertEqual(ugm.data_directory, 'userdata')
+        self.assertEqual(ugm.compact_threshold, 10)
+
+    @restore_ugm_backend
+    def test_SQLiteUGMFactory(self):
+        self.assertTrue(ugm_backend.registry['sqlite'] is SQLiteUGMFactory)
+
+        tempdir = tempfile.mkdtemp()
+        try:
+            database = os.path.join(tempdir, 'ugm.db')
+            ugm_backend.load('sqlite', {'ugm.sqlite_database': database})
+            ugm_backend.initialize()
+            ugm = ugm_backend.ugm
+            self.assertTrue(isinstance(ugm, SQLiteUgm))
+            self.assertEqual(ugm.database, database)
+            ugm.pool.close()
+        finally:
+            shutil.rmtree(tempdir)
+
+    @restore_ugm_backend
+    def test_principals_changed(self):
+        # UGM backends invalidate cached roles and principals on changes
+        security.ROLES_CACHE_TTL = 60
+        ugm_module.PRINCIPAL_CACHE_TTL = 60
+        tempdir = tempfile.mkdtemp()
+
+        def callback(name):
+            request = self.layer.new_request()
+            # roles are kept in environ of new test requests
+            request.environ.pop(security.ROLES_CACHE_KEY, None)
+            return sorted(security.groups_callback(name, request))
+
+        def check_backend(ugm, commit):
+            users = ugm.users
+            groups = ugm.groups
+            user = users.create('sepp')
+            group = groups.create('group')
+            group.add_role('admin')
+            commit(ugm)
+
+            self.assertEqual(callback('sepp'), [])
+            self.assertEqual(list(principals_by_ids(['sepp'])), ['sepp'])
+            self.assertTrue('sepp' in principal_cache.storage)
+
+            user.add_role('editor')
+            commit(ugm)
+            self.assertEqual(callback('sepp'), ['role:editor'])
+            self.assertFalse('sepp' in principal_cache.storage)
+
+            group.add('sepp')
+            commit(ugm)
+            self.assertEqual(
+                callback('sepp'),
+                ['group:group', 'role:admin', 'role:editor']
+            )
+
+            del group['sepp']
+            user.remove_role('editor')
+            commit(ugm)
+            self.assertEqual(callback('sepp'), [])
+
+        try:
+            ugm_backend.load('journal', {
+                'ugm.users_file': os.path.join(tempdir, 'users'),
+                'ugm.groups_file': os.path.join(tempdir, 'groups'),
+                'ugm.roles_file': os.path.join(tempdir, 'roles'),
+                'ugm.datadir': os.path.join(tempdir, 'data')
+            })
+            ugm_backend.initialize()
+            check_backend(ugm_backend.ugm, lambda ugm: ugm())
+
+            ugm_backend.load('sqlite', {
+                'ugm.sqlite_database': os.path.join(tempdir, 'ugm.db')
+            })
+            ugm_backend.initialize()
+            try:
+                check_backend(ugm_backend.ugm, lambda ugm: None)
+            finally:
+                ugm_backend.ugm.pool.close()
+        finally:
+            security.ROLES_CACHE_TTL = 0
+            ugm_module.PRINCIPAL_CACHE_TTL = 0
+            security.invalidate_roles_cache()
+            invalidate_principal_cache()
+            shutil.rmtree(tempdir)
+
     def test_principal_data(self):
         # Fetch principal data
         self.assertEqual(principal_data('manager').items(), [
@@ -136,3 +250,119 @@ class TestUgm(NodeTestCase):
         # XXX: check logs
 
         ugm_backend.ugm = orgin_ugm
+
+    def test_principals_by_ids(self):
+        principals = principals_by_ids([
+            'manager', 'group:group1', 'inexistent', 'group:inexistent'
+        ])
+        self.assertEqual(
+            sorted(principals.keys()),
+            ['group:group1', 'manager']
+        )
+        self.assertEqual(principals['manager'].name, 'manager')
+        self.assertEqual(principals['group:group1'].name, 'group1')
+
+        # Principal cache is disabled by default
+        self.assertEqual(ugm_module.PRINCIPAL_CACHE_TTL, 0)
+        self.assertEqual(len(principal_cache.storage), 0)
+
+        # Principals are looked up at once if container provides ``get_many``
+        class BulkPrincipals(object):
+            def __init__(self):
+                self.calls = list()
+
+            def get_many(self, ids):
+                self.calls.append(ids)
+                return dict([(id, id.upper()) for id in ids if id != 'c'])
+
+        class BulkUgm(object):
+            users = BulkPrincipals()
+            groups = BulkPrincipals()
+
+        orgin_ugm = ugm_backend.ugm
+        ugm = ugm_backend.ugm = BulkUgm()
+        try:
+            principals = principals_by_ids(['a', 'group:b', 'c', 'd'])
+        finally:
+            ugm_backend.ugm = orgin_ugm
+        self.assertEqual(
+            principals,
+            {'a': 'A', 'group:b': 'B', 'd': 'D'}
+        )
+        self.assertEqual(ugm.users.calls, [['a', 'c', 'd']])
+        self.assertEqual(ugm.groups.calls, [['b']])
+
+    def test_PrincipalCache(self):
+        orgin_ugm = ugm_backend.ugm
+        ugm_module.PRINCIPAL_CACHE_TTL = 60
+        try:
+            invalidate_principal_cache()
+            principals = principals_by_ids(['manager', 'group:group1'])
+            self.assertEqual(
+                list(principal_cache.storage.keys()),
+                ['manager', 'group:group1']
+            )
+
+            # Cached principals are not looked up from UGM
+            class FailingPrincipals(object):
+                def get(self, name):
+                    raise Exception('UGM not available')
+
+            class FailingUgm(object):
+                users = FailingPrincipals()
+                groups = FailingPrincipals()
+
+            principal_cache.ugm = ugm_backend.ugm = FailingUgm()
+            principal_cache.storage.update([
+                ('manager', (float('inf'), principals['manager'])),
+                ('group:group1', (float('inf'), principals['group:group1']))
+            ])
+            cached = principals_by_ids(['manager', 'group:group1', 'editor'])
+            self.assertEqual(
+                sorted(cached.keys()),
+                ['group:group1', 'manager']
+            )
+            self.assertTrue(cached['manager'] is principals['manager'])
+            self.assertEqual(
+                principal_data('manager')['fullname'],
+                'Manager User'
+            )
+
+            # Changing UGM instance clears cache
+            ugm_backend.ugm = orgin_ugm
+            self.assertEqual(principal_cache.get('manager'), None)
+            self.assertEqual(len(principal_cache.storage), 0)
+
+            # Expired entries are ignored
+            principals_by_ids(['manager'])
+            principal_cache.storage['manager'] = (0, None)
+            self.assertEqual(principal_cache.get('manager'), None)
+            self.assertFalse('manager' in principal_cache.storage)
+
+            # Least recently used principals are removed if cache size is
+            # exceeded
+            max_size = ugm_module.PRINCIPAL_CACHE_MAX_SIZE
+            ugm_module.PRINCIPAL_CACHE_MAX_SIZE = 2
+            try:
+                principals_by_ids(['manager', 'editor'])
+                principal_cache.get('manager')
+                principals_by_ids(['viewer'])
+                self.assertEqual(
+                    list(principal_cache.storage.keys()),
+                    ['manager', 'viewer']
+                )
+            finally:
+                ugm_module.PRINCIPAL_CACHE_MAX_SIZE = max_size
+
+            # Invalidate
+            invalidate_principal_cache('manager')
+            self.assertEqual(
+                list(principal_cache.storage.keys()),
+                ['viewer']
+            )
+            invalidate_principal_cache()
+            self.assertEqual(len(principal_cache.storage), 0)
+        finally:
+            ugm_backend.ugm = orgin_ugm
+            ugm_module.PRINCIPAL_CACHE_TTL = 0
+            invalidate_principal_cache()
@@ -5,12 +5,27 @@ from cone.app.model import Properties
 from cone.app.utils import add_creation_metadata
 from cone.app.utils import app_config
 from cone.app.utils import DatetimeHelper
+from cone.app.utils import file_stat
 from cone.app.utils import safe_decode
 from cone.app.utils import safe_encode
+from cone.app.utils import StartupProfiler
 from cone.app.utils import timestamp
 from cone.app.utils import update_creation_metadata
+from cone.app.utils import write_file_atomic
 from datetime import datetime
+from datetime import timedelta
 from node.tests import NodeTestCase
+import json
+import os
+import shutil
+import tempfile
+
+
+try:
+    from datetime import timezone
+except ImportError:  # pragma: no cover
+    # python 2
+    timezone = None
 
 
 class TestUtils(NodeTestCase):
@@ -39,7 +54,10 @@ class TestUtils(NodeTestCase):
 
         dt = datetime(2010, 1, 1, 10, 15, 10, 5)
         self.assertEqual(dt.isoformat(), '2010-01-01T10:15:10.000005')
-        self.assertEqual(helper.dt_to_iso(dt), '2010-01-01T10:15:10')
+        self.assertEqual(
+            helper.dt_to_iso(dt),
+            '2010-01-01T10:15:10.000005'
+        )
 
         self.assertEqual(
             helper.dt_from_iso('2010-01-01T10:15:00'),
@@ -50,6 +68,62 @@ class TestUtils(NodeTestCase):
             datetime(2010, 1, 1, 10, 15)
         )
 
+        # Microseconds
+        self.assertEqual(
+            helper.dt_from_iso('2010-01-01T10:15:10.000005'),
+            datetime(2010, 1, 1, 10, 15, 10, 5)
+        )
+        self.assertEqual(
+            helper.dt_from_iso('2010-01-01T10:15:10.5'),
+            datetime(2010, 1, 1, 10, 15, 10, 500000)
+        )
+        for value in [
+            datetime(2010, 1, 1, 10, 15),
+            datetime(2010, 1, 1, 10, 15, 10, 5),
+        ]:
+            self.assertEqual(helper.r_value(helper.w_value(value)), value)
+
+        # Timezone offsets get converted to naive UTC
+        value = helper.dt_from_iso('2010-01-01T10:15:10+02:00')
+        self.assertEqual(value, datetime(2010, 1, 1, 8, 15, 10))
+        self.assertEqual(value.tzinfo, None)
+        self.assertEqual(
+            helper.dt_from_iso('2010-01-01T10:15:10.000005-0130'),
+            datetime(2010, 1, 1, 11, 45, 10, 5)
+        )
+        self.assertEqual(
+            helper.dt_from_iso('2010-01-01T10:15:10Z'),
+            datetime(2010, 1, 1, 10, 15, 10)
+        )
+        if timezone is not None:
+            utc = timezone.utc
+            for value, expected in [
+                (
+                    datetime(2010, 1, 1, 10, 15, 10, 5, tzinfo=utc),
+                    datetime(2010, 1, 1, 10, 15, 10, 5)
+                ), (
+                    datetime(2010, 1, 1, tzinfo=timezone(timedelta(hours=-5))),
+                    datetime(2010, 1, 1, 5)
+                ),
+            ]:
+                self.assertEqual(
+                    helper.r_value(helper.w_value(value)),
+                    expected
+                )
+
+        # Invalid values
+        for value in [
+            '2010-01-01',
+            '2010-01-01 10:15:00',
+            '2010-13-01T10:15:00',
+            '2010-01-01T10:15:00.1234567',
+            '2010-01-01T10:15:00+2',
+            '0001-01-01T00:00:00+01:00',
+            'x2010-01-01T10:15:00',
+        ]:
+            self.expect_error(ValueError, helper.dt_from_iso, value)
+            self.assertEqual(helper.r_value(value), value)
+
         self.assertEqual(helper.r_value(u'äöü'), u'äöü')
         self.assertEqual(helper.r_value(b'\xc3\xa4\xc3\xb6\xc3\xbc'), u'äöü')
         self.assertEqual(
@@ -57,16 +131,95 @@ class TestUtils(NodeTestCase):
             datetime(2010, 1, 1, 10, 15)
         )
 
+        # Bulk read
+        self.assertEqual(
+            helper.r_values([
+                u'äöü',
+                b'\xc3\xa4',
+                '2010-01-01T10:15:00',
+                '',
+                1
+            ]),
+            [u'äöü', u'ä', datetime(2010, 1, 1, 10, 15), u'', u'1']
+        )
+
         self.assertEqual(helper.w_value(b'abc'), u'abc')
         self.assertEqual(helper.w_value(u'abc'), u'abc')
         self.assertEqual(helper.w_value(u'äöü'), u'äöü')
-        self.assertEqual(helper.w_value(dt), u'2010-01-01T10:15:10')
+        self.assertEqual(
+            helper.w_value(dt),
+            u'2010-01-01T10:15:10.000005'
+        )
         self.assertEqual(helper.w_value(0), u'0')
         self.assertEqual(helper.w_value(0.0), u'0.0')
         self.assertEqual(helper.w_value(None), u'None')
         self.assertEqual(helper.w_value(True), u'True')
         self.assertEqual(helper.w_value(False), u'False')
 
+    def test_StartupProfiler(self):
+        profiler = StartupProfiler()
+        self.assertEqual(profiler.phases, [])
+        self.assertEqual(profiler.total, 0)
+
+        with profiler.phase('zcml', target='cone.app'):
+            pass
+        with profiler.phase('merged_bundles', deferred=True):
+            pass
+        self.assertEqual(
+            [(p['name'], p['target'], p['deferred']) for p in profiler.phases],
+            [('zcml', 'cone.app', False), ('merged_bundles', None, True)]
+        )
+
+        # Phase gets recorded if an error occurs
+        with self.assertRaises(ValueError):
+            with profiler.phase('failing'):
+                raise ValueError()
+        self.assertEqual(profiler.phases[-1]['name'], 'failing')
+        self.assertEqual(
+            profiler.total,
+            sum([p['duration'] for p in profiler.phases])
+        )
+
+        profiler.log()
+
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'startup.json')
+            profiler.dump(path)
+            with open(path) as f:
+                data = json.load(f)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual(sorted(data.keys()), ['phases', 'total'])
+        self.assertEqual(len(data['phases']), 3)
+
+    def test_write_file_atomic(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'file.txt')
+            self.assertEqual(file_stat(path), None)
+
+            write_file_atomic(path, b'first')
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'first')
+            stat = file_stat(path)
+            self.assertEqual(stat[1], 5)
+
+            # File gets replaced, no temporary files are left
+            write_file_atomic(path, b'second')
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'second')
+            self.assertNotEqual(file_stat(path), stat)
+            self.assertEqual(os.listdir(tempdir), ['file.txt'])
+
+            # Temporary file is removed if writing fails
+            self.expect_error(TypeError, write_file_atomic, path, object())
+            self.assertEqual(os.listdir(tempdir), ['file.txt'])
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'second')
+        finally:
+            shutil.rmtree(tempdir)
+
     def test_timestamp(self):
         self.check_output("""
         datetime.datetime(..., ..., ..., ..., ..., ..., ...)
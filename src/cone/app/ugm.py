@@ -1,5 +1,11 @@
+from collections import OrderedDict
+from cone.app.fileugm import JOURNAL_COMPACT_THRESHOLD
+from cone.app.fileugm import Ugm as JournalFileUgm
+from cone.app.sqlugm import Ugm as SQLiteUgm
 from node.ext.ugm.file import Ugm as FileUgm
 import logging
+import threading
+import time
 
 
 logger = logging.getLogger('cone.app')
@@ -88,14 +94,194 @@ class BCFileUGMFactory(FileUGMFactory):
         self.datadir = settings.get('node.ext.ugm.datadir')
 
 
-def principal_data(principal_id):
-    data = dict()
+@ugm_backend('journal')
+class JournalFileUGMFactory(FileUGMFactory):
+    """UGM backend factory for file based UGM implementation which persists
+    changes to append-only journal files.
+    """
+
+    def __init__(self, settings):
+        super(JournalFileUGMFactory, self).__init__(settings)
+        self.compact_threshold = int(settings.get(
+            'ugm.journal_compact_threshold',
+            JOURNAL_COMPACT_THRESHOLD
+        ))
+
+    def __call__(self):
+        ugm = JournalFileUgm(
+            name='ugm',
+            users_file=self.users_file,
+            groups_file=self.groups_file,
+            roles_file=self.roles_file,
+            data_directory=self.datadir,
+            compact_threshold=self.compact_threshold
+        )
+        ugm.on_change = principals_changed
+        return ugm
+
+
+@ugm_backend('sqlite')
+class SQLiteUGMFactory(UGMFactory):
+    """UGM backend factory for SQLite based UGM implementation.
+    """
+
+    def __init__(self, settings):
+        self.database = settings.get('ugm.sqlite_database')
+
+    def __call__(self):
+        ugm = SQLiteUgm(name='ugm', database=self.database)
+        ugm.on_change = principals_changed
+        return ugm
+
+
+# Timeout in seconds of principal cache. ``0`` disables the cache
+PRINCIPAL_CACHE_TTL = 0
+PRINCIPAL_CACHE_MAX_SIZE = 1000
+
+
+class PrincipalCache(object):
+    """LRU cache with timeout for principals looked up from UGM backend.
+
+    Entries are keyed by principal id, group ids are prefixed with ``group:``.
+    The cache gets cleared if the UGM backend instance changes.
+    """
+
+    def __init__(self):
+        self.ugm = None
+        self.storage = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_ugm(self):
+        ugm = ugm_backend.ugm
+        if ugm is not self.ugm:
+            self.ugm = ugm
+            self.storage = OrderedDict()
+
+    def get(self, principal_id):
+        """Return cached principal or ``None``.
+        """
+        if not PRINCIPAL_CACHE_TTL:
+            return None
+        with self._lock:
+            self._check_ugm()
+            entry = self.storage.pop(principal_id, None)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self.storage[principal_id] = entry
+            return entry[1]
+
+    def set(self, principal_id, principal):
+        """Cache principal.
+        """
+        if not PRINCIPAL_CACHE_TTL:
+            return
+        with self._lock:
+            self._check_ugm()
+            storage = self.storage
+            storage.pop(principal_id, None)
+            while storage and len(storage) >= PRINCIPAL_CACHE_MAX_SIZE:
+                storage.popitem(last=False)
+            expires = time.time() + PRINCIPAL_CACHE_TTL
+            storage[principal_id] = (expires, principal)
+
+    def invalidate(self, principal_id=None):
+        """Invalidate cached principal by id or all principals.
+        """
+        with self._lock:
+            if principal_id is None:
+                self.storage = OrderedDict()
+            else:
+                self.storage.pop(principal_id, None)
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_principal_cache(principal_id=None):
+    """Invalidate cached principal by id or all cached principals.
+    """
+    principal_cache.invalidate(principal_id=principal_id)
+
+
+def principals_changed():
+    """Invalidate cached principals and roles. Gets called by UGM backends
+    after users, groups, memberships or roles have been changed.
+    """
+    # security imports this module
+    from cone.app.security import invalidate_roles_cache
+    invalidate_principal_cache()
+    invalidate_roles_cache()
+
+
+def _lookup_principals(principals, ids, log_errors=True):
+    """Return dict of principals by id from users or groups container.
+
+    If the container provides ``get_many``, principals are looked up at once,
+    otherwise one by one.
+    """
+    get_many = getattr(principals, 'get_many', None)
+    if get_many is not None:
+        try:
+            return get_many(ids)
+        except Exception as e:
+            if log_errors:
+                logger.error(str(e))
+            return dict()
+    found = dict()
+    for id in ids:
+        try:
+            principal = principals.get(id)
+        except Exception as e:
+            if log_errors:
+                logger.error(str(e))
+            continue
+        if principal:
+            found[id] = principal
+    return found
+
+
+def principals_by_ids(principal_ids, log_errors=True):
+    """Return dict of principals by id. Principal ids of groups are prefixed
+    with ``group:``. Principals not found are omitted.
+
+    Cached principals are taken from the principal cache, only the remaining
+    ones are looked up from the UGM backend. Lookup errors are logged unless
+    ``log_errors`` is ``False``.
+    """
+    principals = dict()
+    user_ids = list()
+    group_ids = list()
+    for principal_id in principal_ids:
+        principal = principal_cache.get(principal_id)
+        if principal is not None:
+            principals[principal_id] = principal
+        elif principal_id.startswith('group:'):
+            group_ids.append(principal_id[6:])
+        else:
+            user_ids.append(principal_id)
     ugm = ugm_backend.ugm
-    try:
-        user = ugm.users.get(principal_id)
-        if not user:
-            return data
-        data = user.attrs
-    except Exception as e:
-        logger.error(str(e))
-    return data
+    for name, prefix, ids in [('users', '', user_ids),
+                              ('groups', 'group:', group_ids)]:
+        if not ids:
+            continue
+        try:
+            container = getattr(ugm, name)
+        except Exception as e:
+            if log_errors:
+                logger.error(str(e))
+            continue
+        found = _lookup_principals(container, ids, log_errors=log_errors)
+        for id, principal in found.items():
+            principal_id = prefix + id
+            principals[principal_id] = principal
+            principal_cache.set(principal_id, principal)
+    return principals
+
+
+def principal_data(principal_id):
+    if not principal_id or principal_id.startswith('group:'):
+        return dict()
+    user = principals_by_ids([principal_id]).get(principal_id)
+    if not user:
+        return dict()
+    return user.attrs
@@ -1,7 +1,14 @@
 from cone.app import compat
+from contextlib import contextmanager
 from datetime import datetime
+from datetime import timedelta
+import json
 import logging
+import os
+import re
 import sys
+import tempfile
+import time
 import traceback
 
 
@@ -34,6 +41,146 @@ def format_traceback():
     return ''.join(traceback.format_exception(etype, value, tb))
 
 
+def file_stat(path):
+    """Return tuple identifying the current state of file at path or ``None``
+    if file not exists.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+
+# os.rename is not atomic on windows if target exists
+_replace = getattr(os, 'replace', os.rename)
+
+
+def write_file_atomic(path, data):
+    """Write data to a temporary file next to path and replace path with it.
+
+    Readers either see the old or the new file contents, never a partially
+    written file.
+
+    :param path: Path of the file to write.
+    :param data: Bytes to write.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.{}.'.format(name), dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class StartupProfiler(object):
+    """Records durations of application startup phases.
+    """
+
+    def __init__(self):
+        self.phases = list()
+
+    @contextmanager
+    def phase(self, name, target=None, deferred=False):
+        """Context manager measuring a startup phase.
+
+        :param name: Name of the phase.
+        :param target: Optional target of the phase, e.g. the plugin name.
+        :param deferred: Flag whether phase was deferred to first request.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append({
+                'name': name,
+                'target': target,
+                'deferred': deferred,
+                'duration': time.time() - start
+            })
+
+    @property
+    def total(self):
+        return sum([phase['duration'] for phase in self.phases])
+
+    def log(self):
+        """Log durations of recorded phases.
+        """
+        for phase in self.phases:
+            name = phase['name']
+            if phase['target']:
+                name = '{} ({})'.format(name, phase['target'])
+            if phase['deferred']:
+                name = '{} [deferred]'.format(name)
+            logger.info('Startup phase {} took {:.3f}s'.format(
+                name,
+                phase['duration']
+            ))
+        logger.info('Startup took {:.3f}s'.format(self.total))
+
+    def dump(self, path):
+        """Write recorded phases as JSON to path.
+        """
+        with open(path, 'w') as f:
+            json.dump({
+                'total': self.total,
+                'phases': self.phases
+            }, f, indent=2)
+
+
+ISO_DATETIME_PATTERN = re.compile(
+    r'([0-9]{4})-([0-9]{2})-([0-9]{2})T([0-9]{2}):([0-9]{2}):([0-9]{2})'
+    r'(?:\.([0-9]{1,6}))?(?:(Z)|([+-])([0-9]{2}):?([0-9]{2}))?$'
+)
+
+# not available in python 2
+_fromisoformat = getattr(datetime, 'fromisoformat', None)
+
+
+def parse_iso_datetime(value):
+    """Return ``datetime`` parsed from ISO 8601 formatted string or ``None``
+    if value is not an ISO datetime.
+
+    Microseconds and timezone offsets are supported. Values with timezone
+    offset are converted to naive UTC datetimes, thus they compare with naive
+    values.
+    """
+    match = ISO_DATETIME_PATTERN.match(value)
+    if match is None:
+        return None
+    if _fromisoformat is not None:
+        try:
+            dt = _fromisoformat(value)
+            offset = dt.utcoffset()
+            if offset is None:
+                return dt
+            return dt.replace(tzinfo=None) - offset
+        except (ValueError, OverflowError):
+            # format not supported by python < 3.11 or out of range values
+            pass
+    year, month, day, hour, minute, second, fraction, utc, sign, \
+        tz_hour, tz_minute = match.groups()
+    try:
+        dt = datetime(
+            int(year), int(month), int(day),
+            int(hour), int(minute), int(second),
+            int(fraction.ljust(6, '0')) if fraction else 0
+        )
+        if sign:
+            offset = timedelta(hours=int(tz_hour), minutes=int(tz_minute))
+            dt = dt + offset if sign == '-' else dt - offset
+        return dt
+    except (ValueError, OverflowError):
+        # out of range values
+        return None
+
+
 class DatetimeHelper(object):
 
     def w_value(self, val):
@@ -46,21 +193,42 @@ class DatetimeHelper(object):
         return compat.UNICODE_TYPE(val)
 
     def r_value(self, val):
-        try:
-            return self.dt_from_iso(val)
-        except (ValueError, TypeError):
-            if isinstance(val, bytes):
-                return val.decode('utf-8')
+        if isinstance(val, bytes):
+            val = val.decode('utf-8')
+        elif not isinstance(val, compat.STR_TYPE):
             return compat.UNICODE_TYPE(val)
+        dt = parse_iso_datetime(val)
+        if dt is not None:
+            return dt
+        return compat.UNICODE_TYPE(val)
+
+    def r_values(self, vals):
+        """Read list of values at once.
+        """
+        parse = parse_iso_datetime
+        text = compat.UNICODE_TYPE
+        result = list()
+        append = result.append
+        for val in vals:
+            if isinstance(val, bytes):
+                val = val.decode('utf-8')
+            elif not isinstance(val, compat.STR_TYPE):
+                append(text(val))
+                continue
+            dt = parse(val)
+            append(text(val) if dt is None else dt)
+        return result
 
     def dt_from_iso(self, str):
-        return datetime.strptime(str, '%Y-%m-%dT%H:%M:%S')
+        dt = parse_iso_datetime(str)
+        if dt is None:
+            raise ValueError(
+                'Invalid ISO datetime: {}'.format(str)
+            )
+        return dt
 
     def dt_to_iso(self, dt):
-        iso = dt.isoformat()
-        if iso.find('.') != -1:
-            iso = iso[:iso.rfind('.')]
-        return iso
+        return dt.isoformat()
 
 
 # XXX: move somewhere else, probably plumbing behavior for node
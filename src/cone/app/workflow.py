@@ -1,4 +1,5 @@
 from cone.app.interfaces import IWorkflowState
+from cone.app.security import invalidate_acl_cache
 from plumber import Behavior
 from plumber import default
 from plumber import override
@@ -30,6 +31,7 @@ def persist_state(node, info):
     """
     node.state = info.transition[u'to_state']
     node()
+    invalidate_acl_cache()
 
 
 def permission_checker(permission, node, request):